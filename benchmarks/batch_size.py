@@ -0,0 +1,83 @@
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import iter_video_frames
+from trackers import TrackPlayer,TrackBall
+from pipeline import StreamPipeline
+
+#Measure detection throughput (fps) of both trackers for different batch sizes
+#Usage: python benchmarks/batch_size.py [video_path] [number_of_frames]
+#       python benchmarks/batch_size.py --fake [number_of_frames] (synthetic video and fake detectors, no weights needed:
+#       only the cost of the code around the models, and of the whole StreamPipeline, is measured)
+BATCH_SIZES = [1,4,8,16]
+
+def load_frames(video_path,frame_count):
+    """
+    Load the first frame_count frames of the video
+    """
+    frames = []
+    for frame in iter_video_frames(video_path):
+        frames.append(frame)
+        if len(frames) == frame_count:
+            break
+
+    return frames
+
+def measure_fps(detect,frames):
+    """
+    Run detect over the frames and return the throughput in frames per second
+    """
+    start_time = time.perf_counter()
+    detect(frames)
+    total_time = time.perf_counter()-start_time
+
+    return len(frames)/total_time
+
+def measure_stream_fps(video_path,keypoints,frame_count,batch_size):
+    """
+    Run the StreamPipeline with the fake detectors over the video and return the throughput in frames per second
+    """
+    from fakes import FakePlayerTracker,FakeBallTracker,FakeLineDetector
+
+    stream_pipeline = StreamPipeline(FakeLineDetector(keypoints),FakePlayerTracker(),FakeBallTracker(),batch_size=batch_size)
+    output_path = os.path.join(os.path.dirname(video_path),"output","batch_size.avi")
+    os.makedirs(os.path.dirname(output_path),exist_ok=True)
+    start_time = time.perf_counter()
+    stream_pipeline.run(video_path,output_path)
+
+    return frame_count/(time.perf_counter()-start_time)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the detection throughput for different batch sizes")
+    parser.add_argument("video_path",nargs="?",default="input_images/input_video.mp4")
+    parser.add_argument("frame_count",nargs="?",type=int,default=64)
+    parser.add_argument("--fake",action="store_true",help="Use a synthetic video and the fake detectors of benchmarks/fakes.py")
+    args = parser.parse_args()
+
+    if args.fake:
+        from synthetic import get_synthetic_video
+        from fakes import FakePlayerTracker,FakeBallTracker
+        video_path,keypoints = get_synthetic_video(os.path.join(os.path.dirname(os.path.abspath(__file__)),"videos"),1280,720,args.frame_count)
+        create_player_tracker,ball_tracker = FakePlayerTracker,FakeBallTracker()
+    else:
+        video_path = args.video_path
+        create_player_tracker,ball_tracker = lambda: TrackPlayer(model_path="models/yolov8x.pt"),TrackBall(model_path="models/yolov8_tennisball_best.pt")
+    frames = load_frames(video_path,args.frame_count)
+    ball_tracker.warm_up(frames[0])
+
+    print(f"{'batch size':>10} | {'player fps':>10} | {'ball fps':>10}" + (f" | {'stream fps':>10}" if args.fake else ""))
+    for batch_size in BATCH_SIZES:
+        #New tracker per run so every run starts from an empty track state
+        player_tracker = create_player_tracker()
+        player_tracker.warm_up(frames[0])
+        player_fps = measure_fps(lambda x: player_tracker.detect_frames(x,batch_size=batch_size),frames)
+        ball_fps = measure_fps(lambda x: ball_tracker.detect_frames(x,batch_size=batch_size),frames)
+        row = f"{batch_size:>10} | {player_fps:>10.2f} | {ball_fps:>10.2f}"
+        if args.fake:
+            row += f" | {measure_stream_fps(video_path,keypoints,len(frames),batch_size):>10.2f}"
+        print(row)
+
+if __name__ == "__main__":
+    main()
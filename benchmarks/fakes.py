@@ -0,0 +1,142 @@
+import sys
+import os
+import numpy as np
+import cv2 as cv
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trackers import TrackPlayer,TrackBall
+from synthetic import PLAYER_COLOUR,OFFICIAL_COLOUR,BALL_COLOUR
+
+#Deterministic stand-ins for the models, so that every stage around them can be measured without weights.
+#They find the coloured blobs of the synthetic videos instead of running a network
+COLOUR_TOLERANCE = 60
+MIN_BLOB_AREA = 12
+MIN_TRACK_IOU = 0.3
+
+class FakeDetector:
+    """
+    Same interface as the detector backends of trackers.backends, detects the blobs of some colours
+    """
+    def __init__(self,colours,names,class_id):
+        """
+        Args:
+            colours (list): (BGR colour of the blobs, confidence of their detections)
+            names (dict): Class id -> name
+            class_id (int): Class of the detections
+        """
+        self.colour_ranges = [(np.clip(np.array(colour)-COLOUR_TOLERANCE,0,255).astype(np.uint8),
+                               np.clip(np.array(colour)+COLOUR_TOLERANCE,0,255).astype(np.uint8),
+                               confidence) for colour,confidence in colours]
+        self.names = names
+        self.class_id = class_id
+
+    def predict(self,frames,classes=None,**params):
+        """
+        Args:
+            frames (list): List of frames as an array
+            classes (list): Only detect these classes, other parameters are ignored
+        Returns:
+            detections (list): One (n,6) array of [x1,y1,x2,y2,conf,cls] per frame
+        """
+        results = []
+        for frame in frames:
+            detections = [np.zeros((0,6),np.float32)]
+            if classes is None or self.class_id in classes:
+                for lower,upper,confidence in self.colour_ranges:
+                    _,_,stats,_ = cv.connectedComponentsWithStats(cv.inRange(frame,lower,upper))
+                    stats = stats[1:][stats[1:,4] >= MIN_BLOB_AREA]
+                    detections.append(np.column_stack([stats[:,0],stats[:,1],stats[:,0]+stats[:,2],stats[:,1]+stats[:,3],
+                                                       np.full(len(stats),confidence),np.full(len(stats),self.class_id)]).astype(np.float32))
+            results.append(np.concatenate(detections))
+
+        return results
+
+class IouTracker:
+    """
+    Greedy IoU tracker standing in for BoT-SORT: each detection takes the id of the overlapping track
+    of the previous frame, or a new id (the most confident detections first, so the players get ids 1 and 2)
+    """
+    def __init__(self,min_iou=MIN_TRACK_IOU):
+        self.min_iou = min_iou
+        self.tracks = {} #Track id -> last [x1,y1,x2,y2]
+        self.next_id = 1
+
+    def update(self,detections):
+        """
+        Args:
+            detections (array): (n,6) array of [x1,y1,x2,y2,conf,cls]
+        Returns:
+            tracks (array): (n,8) array of [x1,y1,x2,y2,track_id,score,cls,idx] like the ultralytics trackers
+        """
+        tracks = []
+        matched_ids = set()
+        for i in np.argsort(-detections[:,4],kind="stable"):
+            detection = detections[i]
+            best_id,best_iou = None,self.min_iou
+            for track_id,bbox in self.tracks.items():
+                iou = get_iou(detection[:4],bbox)
+                if track_id not in matched_ids and iou >= best_iou:
+                    best_id,best_iou = track_id,iou
+            if best_id is None:
+                best_id = self.next_id
+                self.next_id += 1
+            matched_ids.add(best_id)
+            tracks.append([*detection[:4],best_id,detection[4],detection[5],i])
+
+        self.tracks = {int(track[4]):track[:4] for track in tracks}
+        return np.array(sorted(tracks,key=lambda track: track[7]),np.float32).reshape(-1,8)
+
+def get_iou(bbox,other_bbox):
+    """
+    Returns:
+        float: Intersection over union of two [x1,y1,x2,y2] boxes
+    """
+    width = min(bbox[2],other_bbox[2]) - max(bbox[0],other_bbox[0])
+    height = min(bbox[3],other_bbox[3]) - max(bbox[1],other_bbox[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width*height
+    return intersection/((bbox[2]-bbox[0])*(bbox[3]-bbox[1]) + (other_bbox[2]-other_bbox[0])*(other_bbox[3]-other_bbox[1]) - intersection)
+
+class FakePlayerTracker(TrackPlayer):
+    """
+    TrackPlayer with a FakeDetector and an IouTracker, everything else (batching, keyframes, court crop, roles) is the real code
+    """
+    def __init__(self,**kwargs):
+        super().__init__(model_path="fake_players",**kwargs)
+        self._model = FakeDetector([(PLAYER_COLOUR,0.9),(OFFICIAL_COLOUR,0.7)],{0:"person",32:"sports ball"},0)
+
+    def create_tracker(self,tracker_config):
+        return IouTracker()
+
+    def update_tracks(self,detections,frame):
+        if len(detections) == 0:
+            return {}
+        if self.tracker is None:
+            self.tracker = self.create_tracker(self.tracker_config)
+
+        return {int(track[4]):track[:4].tolist() for track in self.tracker.update(detections)
+                if self.class_names[int(track[6])] == "person"}
+
+class FakeBallTracker(TrackBall):
+    """
+    TrackBall with a FakeDetector
+    """
+    def __init__(self,**kwargs):
+        super().__init__(model_path="fake_ball",**kwargs)
+        self._model = FakeDetector([(BALL_COLOUR,0.8)],{0:"tennis ball"},0)
+
+class FakeLineDetector:
+    """
+    Gives back the known court keypoints of the synthetic video, same interface as LineDetector
+    """
+    def __init__(self,keypoints):
+        self.keypoints = np.array(keypoints,np.float32)
+
+    def predict_batch(self,images):
+        return [self.keypoints.copy() for _ in images]
+
+    def predict(self,image):
+        return self.predict_batch([image])[0]
+
+    def warm_up(self,frame):
+        pass
@@ -0,0 +1,292 @@
+import sys
+import os
+import io
+import json
+import time
+import platform
+import argparse
+import subprocess
+import contextlib
+from datetime import datetime,timezone
+import numpy as np
+import cv2 as cv
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import read_video,iter_video_frames,iter_batches,save_video,get_court_layout,FramePool
+from trackers import RoleClassifier,BallInterpolator,TrackPlayer,TrackBall
+from trackers.ball_interpolator import interpolate_positions
+from minimap import DrawMinimap
+from renderer import FrameRenderer
+from pipeline import StreamPipeline
+from tracks import TrackStore,get_dicts_nbytes
+from synthetic import get_synthetic_video
+from fakes import FakePlayerTracker,FakeBallTracker,FakeLineDetector
+
+#Benchmark of every stage of the pipeline on a synthetic court video, with fake detectors so that no weights are needed.
+#Each run is added to benchmarks/results/<machine>.jsonl and compared with the previous run of the same settings
+#Usage: python benchmarks/suite.py [--frames 120] [--width 1280] [--height 720] [--repeats 5] [--models] [--only decode,render]
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+VIDEO_DIR = os.path.join(BENCHMARK_DIR,"videos")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR,"results")
+REGRESSION_THRESHOLD = 0.10 #A stage is flagged when it is this much slower than in the previous run
+
+class BenchmarkData:
+    """
+    Inputs of the stage benchmarks, computed once with the fake detectors (not timed)
+    """
+    def __init__(self,video_path,keypoints):
+        self.video_path = video_path
+        self.keypoints = keypoints
+        self.court_layout = get_court_layout(keypoints)
+        self.frames = read_video(video_path)
+
+        player_tracker = FakePlayerTracker()
+        ball_tracker = FakeBallTracker()
+        self.player_detections = player_tracker.detect_frames(self.frames)
+        self.ball_detections = ball_tracker.detect_frames(self.frames)
+        self.interpolated_ball = interpolate_positions(self.ball_detections)
+        self.players,self.others,self.roles = player_tracker.assign_and_filter_roles(self.court_layout,
+                                                                                    self.player_detections,
+                                                                                    RoleClassifier(player_tracker))
+        #The minimap prints the positions of the last frame
+        with contextlib.redirect_stdout(io.StringIO()):
+            minimap = DrawMinimap(self.frames[0])
+            self.player_minimap,self.ball_minimap = minimap.convert_bbox_to_minimap_coor(self.players,self.interpolated_ball,keypoints)
+
+def bench_decode(data):
+    for _ in iter_video_frames(data.video_path):
+        pass
+
+def bench_decode_pool(data):
+    frame_pool = FramePool(1)
+    for frame in iter_video_frames(data.video_path,frame_pool=frame_pool):
+        frame_pool.release(frame)
+
+def bench_fake_detection(data):
+    #The tracker code around the model: batching, conversion of the results, tracking
+    FakePlayerTracker().detect_frames(data.frames,batch_size=8)
+    FakeBallTracker().detect_frames(data.frames,batch_size=8)
+
+def bench_interpolation(data):
+    interpolate_positions(data.ball_detections)
+
+def bench_interpolation_stream(data):
+    ball_interpolator = BallInterpolator(max_latency=30,max_jump=100)
+    for ball_dict in data.ball_detections:
+        ball_interpolator.push(ball_dict)
+    ball_interpolator.flush()
+
+def bench_roles(data):
+    player_tracker = FakePlayerTracker()
+    player_tracker.assign_and_filter_roles(data.court_layout,data.player_detections,RoleClassifier(player_tracker))
+
+def bench_minimap(data):
+    minimap = DrawMinimap(data.frames[0])
+    minimap.convert_bbox_to_minimap_coor(data.players,data.interpolated_ball,data.keypoints)
+
+def bench_minimap_homography(data):
+    minimap = DrawMinimap(data.frames[0])
+    minimap.fit_homography(data.keypoints)
+    minimap.project_bbox_to_minimap_coor(data.players,data.interpolated_ball)
+
+def bench_render(data,frames):
+    renderer = FrameRenderer(data.keypoints,DrawMinimap(frames[0]))
+    for _ in renderer.render_video(frames,data.players,data.others,data.roles,data.interpolated_ball,data.player_minimap,data.ball_minimap):
+        pass
+
+def bench_encode(data,frames,output_path):
+    save_video(frames,output_path)
+
+def bench_stream(data,output_path,reuse_frames=True):
+    stream_pipeline = StreamPipeline(FakeLineDetector(data.keypoints),FakePlayerTracker(),FakeBallTracker(),batch_size=8,reuse_frames=reuse_frames)
+    stream_pipeline.run(data.video_path,output_path)
+
+def bench_keypoints_model(line_detector,frames,batch_size):
+    for batch in iter_batches(frames,batch_size):
+        line_detector.predict_batch(batch)
+
+def bench_model(tracker,frames,batch_size):
+    #Same models, new tracks
+    tracker.reset()
+    tracker.detect_frames(frames,batch_size=batch_size)
+
+def time_runs(function,repeats,prepare=None):
+    """
+    Run a benchmark several times
+    Args:
+        function (function): Benchmark, gets the result of prepare() if given
+        repeats (int): Number of runs
+        prepare (function): Builds the input of each run (not timed), e.g. fresh copies of frames that are drawn on
+    Returns:
+        times (list): Duration (s) of each run
+    """
+    times = []
+    for _ in range(repeats):
+        args = (prepare(),) if prepare is not None else ()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            function(*args)
+            times.append(time.perf_counter()-start_time)
+
+    return times
+
+def get_benchmarks(data,output_dir,models=None,batch_size=8):
+    """
+    Returns:
+        benchmarks (dict): Name -> (function, prepare function or None)
+    """
+    copy_frames = lambda: [frame.copy() for frame in data.frames]
+    benchmarks = {
+        "decode": (lambda: bench_decode(data),None),
+        "decode_pool": (lambda: bench_decode_pool(data),None),
+        "fake_detection": (lambda: bench_fake_detection(data),None),
+        "interpolation": (lambda: bench_interpolation(data),None),
+        "interpolation_stream": (lambda: bench_interpolation_stream(data),None),
+        "roles": (lambda: bench_roles(data),None),
+        "minimap": (lambda: bench_minimap(data),None),
+        "minimap_homography": (lambda: bench_minimap_homography(data),None),
+        "render": (lambda frames: bench_render(data,frames),copy_frames),
+        "encode": (lambda: bench_encode(data,data.frames,os.path.join(output_dir,"encode.avi")),None),
+        "stream_pipeline": (lambda: bench_stream(data,os.path.join(output_dir,"stream.avi")),None),
+        "stream_pipeline_no_pool": (lambda: bench_stream(data,os.path.join(output_dir,"stream.avi"),reuse_frames=False),None)
+    }
+
+    #Model stages only with --models, they need the weights (and are loaded and warmed up before timing)
+    if models is not None:
+        from court_line_detector import LineDetector
+        line_detector = LineDetector(models["keypoints"])
+        line_detector.warm_up(data.frames[0])
+        player_tracker = TrackPlayer(model_path=models["players"])
+        player_tracker.warm_up(data.frames[0])
+        ball_tracker = TrackBall(model_path=models["ball"])
+        ball_tracker.warm_up(data.frames[0])
+        benchmarks["keypoints_model"] = (lambda: bench_keypoints_model(line_detector,data.frames,batch_size),None)
+        benchmarks["player_model"] = (lambda: bench_model(player_tracker,data.frames,batch_size),None)
+        benchmarks["ball_model"] = (lambda: bench_model(ball_tracker,data.frames,batch_size),None)
+
+    return benchmarks
+
+def get_track_memory(detections):
+    """
+    Memory of the detections in the dictionaries of the trackers and in a TrackStore
+    Args:
+        detections (list): List of dictionaries with track id and bounding box coordinates, one per frame
+    Returns:
+        memory (dict): Number of detections, and bytes of both formats
+    """
+    store = TrackStore.from_dicts(detections)
+    memory = {"detections": len(store),"dicts_bytes": get_dicts_nbytes(detections),"store_bytes": store.nbytes()}
+    print(f"Player detections: {memory['detections']}, {memory['dicts_bytes']/max(1,len(store)):.0f} bytes each in dictionaries, "
+          f"{memory['store_bytes']/max(1,len(store)):.0f} in a TrackStore ({memory['dicts_bytes']/max(1,memory['store_bytes']):.1f}x smaller)")
+
+    return memory
+
+def get_commit():
+    """
+    Returns:
+        commit (str): Short hash of the checked out commit (with -dirty if there are local changes), None outside git
+    """
+    try:
+        commit = subprocess.run(["git","rev-parse","--short","HEAD"],cwd=BENCHMARK_DIR,capture_output=True,text=True,check=True).stdout.strip()
+        changes = subprocess.run(["git","status","--porcelain","--untracked-files=no"],cwd=BENCHMARK_DIR,capture_output=True,text=True,check=True).stdout
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+    return commit + "-dirty" if changes.strip() else commit
+
+def load_previous_results(results_path,config):
+    """
+    Returns:
+        previous_results (dict): Stage name -> (commit, result) of the last stored run of the stage with the same settings
+    """
+    previous_results = {}
+    if not os.path.exists(results_path):
+        return previous_results
+
+    with open(results_path,"r") as f:
+        for line in f:
+            run = json.loads(line)
+            if run["config"] == config:
+                for name,result in run["results"].items():
+                    previous_results[name] = (run["commit"],result)
+
+    return previous_results
+
+def compare_runs(run,previous_results,threshold=REGRESSION_THRESHOLD):
+    """
+    Print the frame rate of each stage next to its previous run. The fastest runs are compared,
+    they are less noisy than the medians on short stages
+    Returns:
+        regressions (list): Names of the stages slower than their previous run by more than threshold
+    """
+    regressions = []
+    print(f"{'stage':<22}{'fps':>10}{'median ms':>12}{'previous fps':>14}{'change':>9}  commit")
+    for name,result in run["results"].items():
+        line = f"{name:<22}{result['fps']:>10.1f}{result['median_s']*1000:>12.2f}"
+        if name in previous_results:
+            commit,previous_result = previous_results[name]
+            change = previous_result["min_s"]/result["min_s"]-1 #Positive when faster
+            line += f"{previous_result['fps']:>14.1f}{change:>+9.1%}  {commit}"
+            if change < -threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a synthetic video")
+    parser.add_argument("--frames",type=int,default=120,help="Number of frames of the synthetic video")
+    parser.add_argument("--width",type=int,default=1280,help="Frame width")
+    parser.add_argument("--height",type=int,default=720,help="Frame height")
+    parser.add_argument("--seed",type=int,default=0,help="Seed of the synthetic video")
+    parser.add_argument("--repeats",type=int,default=5,help="Number of runs of each stage")
+    parser.add_argument("--only",default=None,help="Comma separated stages to run (all by default)")
+    parser.add_argument("--models",action="store_true",help="Also benchmark the real models (needs the weights)")
+    parser.add_argument("--keypoints-model",default="models/keypoints_model.pth")
+    parser.add_argument("--player-model",default="models/yolov8x.pt")
+    parser.add_argument("--ball-model",default="models/yolov8_tennisball_best.pt")
+    parser.add_argument("--batch-size",type=int,default=8,help="Batch size of the model stages")
+    parser.add_argument("--no-save",action="store_true",help="Do not store the results")
+    parser.add_argument("--fail-on-regression",action="store_true",help="Exit with an error if a stage got slower than in the previous run")
+    args = parser.parse_args()
+
+    video_path,keypoints = get_synthetic_video(VIDEO_DIR,args.width,args.height,args.frames,args.seed)
+    data = BenchmarkData(video_path,keypoints)
+    models = {"keypoints":args.keypoints_model,"players":args.player_model,"ball":args.ball_model} if args.models else None
+    output_dir = os.path.join(VIDEO_DIR,"output")
+    os.makedirs(output_dir,exist_ok=True)
+    benchmarks = get_benchmarks(data,output_dir,models,args.batch_size)
+    if args.only is not None:
+        benchmarks = {name:benchmarks[name] for name in args.only.split(",")}
+
+    results = {}
+    for name,(function,prepare) in benchmarks.items():
+        times = time_runs(function,args.repeats,prepare)
+        median_time = float(np.median(times))
+        results[name] = {"median_s": median_time,"min_s": float(min(times)),"fps": len(data.frames)/median_time}
+
+    config = {"frames":args.frames,"width":args.width,"height":args.height,"seed":args.seed,"batch_size":args.batch_size}
+    run = {
+        "commit": get_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "opencv": cv.__version__,
+        "config": config,
+        "results": results,
+        "track_memory": get_track_memory(data.player_detections)
+    }
+
+    #One file per machine, results from different machines are not comparable
+    results_path = os.path.join(RESULTS_DIR,f"{platform.node() or 'local'}.jsonl")
+    regressions = compare_runs(run,load_previous_results(results_path,config))
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR,exist_ok=True)
+        with open(results_path,"a") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"Results added to {results_path}")
+
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import sys
+import os
+import json
+import numpy as np
+import cv2 as cv
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import constants
+
+#Synthetic broadcast view of a tennis court with coloured blobs for the people and the ball.
+#The colours are what the fake detectors in fakes.py look for
+SURROUND_COLOUR = (60,120,50)
+COURT_COLOUR = (150,110,60)
+LINE_COLOUR = (255,255,255)
+PLAYER_COLOUR = (40,40,220)
+OFFICIAL_COLOUR = (200,40,200) #Line judges, umpire and ball kid
+BALL_COLOUR = (40,230,230)
+
+COURT_LENGTH = constants.HALF_COURT_LENGTH*2
+#Corners of the doubles court in the frame, as fractions of the width and height (top left, top right, bottom left, bottom right)
+COURT_CORNERS = [(0.30,0.22),(0.70,0.22),(0.14,0.86),(0.86,0.86)]
+
+def get_court_points():
+    """
+    Returns:
+        points (array): (14,2) array of the court keypoints in metres, in the order of the keypoints model
+    """
+    width = constants.DOUBLES_LINE_WIDTH
+    alley = constants.DOUBLES_ALLEY_WIDTH
+    service = constants.NO_MANS_LAND_WIDTH
+    return np.array([
+        (0,0),(width,0),(0,COURT_LENGTH),(width,COURT_LENGTH), #Doubles corners
+        (alley,0),(alley,COURT_LENGTH),(width-alley,0),(width-alley,COURT_LENGTH), #Singles corners
+        (alley,service),(width-alley,service),(alley,COURT_LENGTH-service),(width-alley,COURT_LENGTH-service), #Service lines
+        (width/2,service),(width/2,COURT_LENGTH-service) #Centre service line
+    ],np.float32)
+
+#Pairs of keypoints joined by a line
+COURT_LINES = [(0,1),(2,3),(0,2),(1,3),(4,5),(6,7),(8,9),(10,11),(12,13)]
+
+class SyntheticCourt:
+    """
+    Deterministic rally on a court seen from behind a baseline: two players moving along their baselines,
+    two line judges, an umpire, a ball kid who walks in halfway through, and a ball flying between the players
+    that is hidden on some frames
+    """
+    def __init__(self,width=1280,height=720,frame_count=120,seed=0):
+        """
+        Args:
+            width (int): Frame width
+            height (int): Frame height
+            frame_count (int): Number of frames of the video
+            seed (int): Seed of the random parts (player speeds and ball gaps)
+        """
+        self.width = width
+        self.height = height
+        self.frame_count = frame_count
+        rng = np.random.default_rng(seed)
+        self.player_periods = rng.uniform(80,120,2)
+        self.player_phases = rng.uniform(0,2*np.pi,2)
+        self.ball_gaps = set(rng.choice(frame_count,frame_count//10,replace=False).tolist()) #Frames where the ball is hidden
+
+        corners = np.array(COURT_CORNERS,np.float32)*[width,height]
+        court_points = get_court_points()
+        self.homography = cv.getPerspectiveTransform(court_points[:4],corners.astype(np.float32))
+        self.keypoints = self.project(court_points)
+
+    def project(self,points):
+        """
+        Args:
+            points (array): (n,2) positions on the ground in metres
+        Returns:
+            points (array): (n,2) positions in the frame
+        """
+        return cv.perspectiveTransform(np.asarray(points,np.float32).reshape(-1,1,2),self.homography).reshape(-1,2)
+
+    def pixels_per_metre(self,point):
+        """
+        Scale of the frame at a position on the ground (from the width of one metre there)
+        """
+        left,right = self.project([point,(point[0]+1,point[1])])
+        return float(right[0]-left[0])
+
+    def get_people(self,frame_num):
+        """
+        Returns:
+            people (list): ([x,y] ground position in metres, colour) of everyone on the frame, the players first
+        """
+        width = constants.DOUBLES_LINE_WIDTH
+        t = 2*np.pi*frame_num/self.player_periods + self.player_phases
+        people = [
+            ((width/2 + 3.5*np.sin(t[0]),-0.6),PLAYER_COLOUR), #Player at the top
+            ((width/2 + 4.0*np.sin(t[1]),COURT_LENGTH+0.6),PLAYER_COLOUR), #Player at the bottom
+            ((-1.2,COURT_LENGTH+1.5),OFFICIAL_COLOUR), #Line judges
+            ((width+1.2,COURT_LENGTH+1.5),OFFICIAL_COLOUR),
+            ((width+3.0,COURT_LENGTH/2),OFFICIAL_COLOUR) #Umpire
+        ]
+        if frame_num >= self.frame_count//2:
+            people.append(((-3.0,COURT_LENGTH/2),OFFICIAL_COLOUR)) #Ball kid
+
+        return people
+
+    def get_person_bbox(self,position):
+        """
+        Returns:
+            bbox (list): [x1,y1,x2,y2] of a person standing at a ground position
+        """
+        foot_x,foot_y = self.project([position])[0]
+        height = constants.PLAYER_1_HEIGHT*self.pixels_per_metre(position)
+        return [foot_x-height/5,foot_y-height,foot_x+height/5,foot_y]
+
+    def get_ball_bbox(self,frame_num):
+        """
+        Returns:
+            bbox (list): [x1,y1,x2,y2] of the ball, None when it is hidden
+        """
+        if frame_num in self.ball_gaps:
+            return None
+
+        #The ball goes from one player to the other and back in 60 frames, 1m above the ground at the ends
+        (top,_),(bottom,_) = self.get_people(frame_num)[:2]
+        phase = (frame_num%60)/30
+        progress = phase if phase <= 1 else 2-phase
+        position = (top[0]+(bottom[0]-top[0])*progress,top[1]+(bottom[1]-top[1])*progress)
+        ball_height = 1 + 2*np.sin(np.pi*progress)
+
+        x,y = self.project([position])[0]
+        scale = self.pixels_per_metre(position)
+        y -= ball_height*scale
+        radius = max(3.0,0.2*scale)
+        return [x-radius,y-radius,x+radius,y+radius]
+
+    def draw_background(self):
+        """
+        Returns:
+            frame (array): Empty court
+        """
+        frame = np.full((self.height,self.width,3),SURROUND_COLOUR,np.uint8)
+        corners = self.keypoints[[0,1,3,2]].astype(np.int32)
+        cv.fillConvexPoly(frame,corners,COURT_COLOUR)
+        line_width = max(1,self.width//640)
+        for start,end in COURT_LINES:
+            cv.line(frame,tuple(self.keypoints[start].astype(int)),tuple(self.keypoints[end].astype(int)),LINE_COLOUR,line_width)
+
+        #Net, a bit wider than the court
+        net_left,net_right = self.project([(-0.9,COURT_LENGTH/2),(constants.DOUBLES_LINE_WIDTH+0.9,COURT_LENGTH/2)]).astype(int)
+        cv.line(frame,tuple(net_left),tuple(net_right),LINE_COLOUR,line_width*2)
+
+        return frame
+
+    def draw_frame(self,background,frame_num):
+        """
+        Returns:
+            frame (array): Frame frame_num of the video
+        """
+        frame = background.copy()
+        for position,colour in self.get_people(frame_num):
+            x1,y1,x2,y2 = [int(round(v)) for v in self.get_person_bbox(position)]
+            cv.rectangle(frame,(x1,y1),(x2,y2),colour,-1)
+
+        ball_bbox = self.get_ball_bbox(frame_num)
+        if ball_bbox is not None:
+            x1,y1,x2,y2 = ball_bbox
+            cv.circle(frame,(int((x1+x2)/2),int((y1+y2)/2)),int((x2-x1)/2),BALL_COLOUR,-1)
+
+        return frame
+
+    def write_video(self,video_path,fps=30):
+        """
+        Write the video and a <video_path>.json file with the court keypoints
+        Args:
+            video_path (str): Path of the video (.avi, MJPG like the output videos)
+            fps (int): Frame rate of the video
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(video_path)),exist_ok=True)
+        background = self.draw_background()
+        out = cv.VideoWriter(video_path,cv.VideoWriter_fourcc(*'MJPG'),fps,(self.width,self.height))
+        for frame_num in range(self.frame_count):
+            out.write(self.draw_frame(background,frame_num))
+        out.release()
+
+        with open(video_path + ".json","w") as f:
+            json.dump({"keypoints": self.keypoints.ravel().tolist(),"frame_count": self.frame_count},f)
+
+def get_synthetic_video(video_dir,width=1280,height=720,frame_count=120,seed=0):
+    """
+    Get a synthetic video, it is only generated the first time (same arguments give the same video)
+    Args:
+        video_dir (str): Directory of the generated videos
+        width (int): Frame width
+        height (int): Frame height
+        frame_count (int): Number of frames
+        seed (int): Seed of the random parts
+    Returns:
+        video_path (str): Path of the video
+        keypoints (list): Court keypoints [x1,y1,...,x14,y14]
+    """
+    video_path = os.path.join(video_dir,f"court_{width}x{height}_{frame_count}_{seed}.avi")
+    if not os.path.exists(video_path + ".json"):
+        SyntheticCourt(width,height,frame_count,seed).write_video(video_path)
+
+    with open(video_path + ".json","r") as f:
+        keypoints = json.load(f)["keypoints"]
+
+    return video_path,keypoints
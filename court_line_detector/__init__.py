@@ -1 +1,2 @@
-from .line_detector import LineDetector
\ No newline at end of file
+from .line_detector import LineDetector
+from .keypoint_tracker import KeypointTracker,get_segment_keypoints
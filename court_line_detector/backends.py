@@ -0,0 +1,137 @@
+import os
+import numpy as np
+
+#Number of outputs of the model (x,y of the 14 court keypoints)
+KEYPOINT_OUTPUTS = 14*2
+
+def replace_batch_norms(module):
+    """
+    Replace every batch norm of the module by the normalisation the original LineDetector actually computed:
+    it never called model.eval(), so its batch norms (training mode, one image per call) normalised each channel with
+    the mean and variance of that image. An instance norm with the same scale, shift and eps computes exactly that,
+    for each image of a batch separately, and is exported as is to ONNX and TorchScript
+    Args:
+        module (nn.Module): Model, changed in place
+    """
+    from torch import nn
+
+    for name,child in module.named_children():
+        if isinstance(child,nn.BatchNorm2d):
+            instance_norm = nn.InstanceNorm2d(child.num_features,eps=child.eps,affine=True)
+            instance_norm.weight.data.copy_(child.weight.data)
+            instance_norm.bias.data.copy_(child.bias.data)
+            setattr(module,name,instance_norm)
+        else:
+            replace_batch_norms(child)
+
+def build_resnet50(model_path):
+    """
+    Create NN based on resnet50 architecture, with the batch norms normalising each image with its own statistics
+    like the original LineDetector (see replace_batch_norms). The eager model and the exported graphs all use it
+    Args:
+        model_path (str): Model Path to load state_dict of pre-trained model
+    Returns:
+        model (nn.Module): Model in eval mode
+    """
+    import torch
+    from torch import nn
+    import torchvision.models as models
+
+    model = models.resnet50(weights=None)
+    model.fc = nn.Linear(in_features=model.fc.in_features,
+                         out_features=KEYPOINT_OUTPUTS)
+    model.load_state_dict(torch.load(model_path,map_location="cpu"))
+    replace_batch_norms(model)
+
+    return model.eval()
+
+class TorchBackend:
+    """
+    Eager PyTorch model loaded from its state_dict (.pth), predicts the same keypoints as the original LineDetector
+    (torchvision preprocessing, per image normalisation in place of the batch norms)
+    """
+    baseline = True #LineDetector preprocesses the images with the original torchvision transforms
+    def __init__(self,model_path,threads=None):
+        """
+        Args:
+            model_path (str): Path of the state_dict
+            threads (int): Number of CPU threads used by torch (torch default if None)
+        """
+        import torch
+        self.torch = torch
+        if threads is not None:
+            torch.set_num_threads(threads)
+        self.model = self.load(model_path)
+
+    def load(self,model_path):
+        return build_resnet50(model_path)
+
+    def __call__(self,batch):
+        """
+        Args:
+            batch (array): Preprocessed images of shape (N,3,224,224), float32
+        Returns:
+            predictions (array): Array of shape (N,28) with the keypoints in the 224x224 image
+        """
+        with self.torch.inference_mode():
+            return self.model(self.torch.from_numpy(batch)).cpu().numpy()
+
+class TorchScriptBackend(TorchBackend):
+    """
+    TorchScript graph exported by court_line_detector.export (.torchscript)
+    """
+    baseline = False
+
+    def load(self,model_path):
+        return self.torch.jit.load(model_path,map_location="cpu").eval()
+
+class OnnxBackend:
+    """
+    ONNX graph exported by court_line_detector.export (.onnx), run with ONNX Runtime
+    """
+    baseline = False
+    def __init__(self,model_path,threads=None):
+        """
+        Args:
+            model_path (str): Path of the ONNX graph
+            threads (int): Number of CPU threads used by ONNX Runtime (ONNX Runtime default if None)
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads is not None:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path,options,providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self,batch):
+        """
+        Args:
+            batch (array): Preprocessed images of shape (N,3,224,224), float32
+        Returns:
+            predictions (array): Array of shape (N,28) with the keypoints in the 224x224 image
+        """
+        return self.session.run(None,{self.input_name:batch})[0]
+
+#Backend used for each model file extension
+BACKENDS = {
+    ".pth": TorchBackend,
+    ".torchscript": TorchScriptBackend,
+    ".onnx": OnnxBackend
+}
+
+def load_backend(model_path,threads=None):
+    """
+    Load the keypoints model with the backend that matches its file extension
+    Args:
+        model_path (str): Path of the model (.pth, .torchscript or .onnx)
+        threads (int): Number of CPU threads used by the model (library default if None)
+    Returns:
+        backend (callable): Takes a preprocessed batch and returns the raw predictions as an array
+    """
+    extension = os.path.splitext(model_path)[1].lower()
+    if extension not in BACKENDS:
+        raise ValueError(f"Unsupported keypoints model format '{extension}', expected one of {list(BACKENDS)}")
+
+    return BACKENDS[extension](model_path,threads)
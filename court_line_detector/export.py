@@ -0,0 +1,148 @@
+"""
+Export the court keypoints model for faster CPU inference and check that it predicts the same keypoints
+
+Usage:
+    python -m court_line_detector.export models/keypoints_model.pth --format onnx --quantize --check input_images/tennismatch.jpg
+
+The exported model is deleted if its keypoints are further than --max-distance pixels from the .pth model on the checked images
+"""
+import os
+import argparse
+import time
+import numpy as np
+import cv2 as cv
+from .backends import build_resnet50
+from .line_detector import LineDetector,INPUT_SIZE
+
+EXPORT_FORMATS = ["onnx","torchscript"]
+#Images the exported model is checked on when none are given
+CHECK_IMAGES = ["input_images/tennismatch.jpg","input_images/tennismatch2.jpg"]
+#Max distance (pixels) between a keypoint of the exported model and of the .pth model for the export to be kept
+MAX_KEYPOINT_DISTANCE = 2.0
+
+class ParityError(Exception):
+    """
+    Raised when an exported model does not predict the same keypoints as the .pth model
+    """
+
+def export_line_detector(model_path,export_format="onnx",quantize=False,output_path=None,check_images=None,max_distance=MAX_KEYPOINT_DISTANCE,threads=None):
+    """
+    Export the eager model to a graph that LineDetector can load
+    Args:
+        model_path (str): Path of the state_dict of the pre-trained model (.pth)
+        export_format (str): "onnx" or "torchscript"
+        quantize (bool): Quantize the weights to int8 (dynamic quantization, activations stay float)
+        output_path (str): Path of the exported model, next to model_path if None
+        check_images (list): BGR frames the exported model is compared with the .pth model on (not checked if None)
+        max_distance (float): Max distance (pixels) between the keypoints of both models on check_images
+        threads (int): Number of CPU threads used by the exported model during the check
+    Returns:
+        output_path (str): Path of the exported model
+        report (dict): Parity report of check_parity() on check_images, None if not checked
+    Raises:
+        ParityError: The keypoints are too far from the .pth model, the exported model is deleted
+    """
+    output_path = export_graph(model_path,export_format,quantize,output_path)
+    if check_images is None:
+        return output_path,None
+
+    report = check_parity(model_path,output_path,check_images,threads)
+    if report["max_distance"] > max_distance:
+        os.remove(output_path)
+        raise ParityError(f"Keypoints of {output_path} are up to {report['max_distance']:.2f} px from the .pth model "
+                          f"(max {max_distance} px), the export was deleted")
+
+    return output_path,report
+
+def export_graph(model_path,export_format="onnx",quantize=False,output_path=None):
+    """
+    Write the graph of the eager model, see export_line_detector()
+    Returns:
+        output_path (str): Path of the exported model
+    """
+    import torch
+
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}', expected one of {EXPORT_FORMATS}")
+    if output_path is None:
+        output_path = os.path.splitext(model_path)[0] + ("_int8" if quantize else "") + f".{export_format}"
+
+    model = build_resnet50(model_path)
+    example = torch.zeros((1,3,INPUT_SIZE,INPUT_SIZE))
+
+    if export_format == "torchscript":
+        if quantize:
+            #Dynamic quantization only covers the linear layers in PyTorch, the convolutions stay float
+            model = torch.ao.quantization.quantize_dynamic(model,{torch.nn.Linear},dtype=torch.qint8)
+        with torch.inference_mode():
+            graph = torch.jit.freeze(torch.jit.trace(model,example))
+        graph.save(output_path)
+        return output_path
+
+    #Batch size is dynamic so that predict_batch can send several frames at once.
+    ##TorchScript based exporter: the graphs of the dynamo one (default since torch 2.9) are rejected by the ONNX Runtime quantizer
+    float_path = output_path if not quantize else os.path.splitext(output_path)[0] + "_float.onnx"
+    torch.onnx.export(model,
+                      example,
+                      float_path,
+                      input_names=["images"],
+                      output_names=["keypoints"],
+                      dynamic_axes={"images":{0:"batch"},"keypoints":{0:"batch"}},
+                      opset_version=17,
+                      dynamo=False)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic,QuantType
+        quantize_dynamic(float_path,output_path,weight_type=QuantType.QInt8)
+        os.remove(float_path)
+
+    return output_path
+
+def check_parity(model_path,detector_path,images,threads=None):
+    """
+    Compare the keypoints of a LineDetector (any backend) with the .pth model run the original way
+    Args:
+        model_path (str): Path of the state_dict of the pre-trained model (.pth)
+        detector_path (str): Path of the model loaded by the LineDetector being checked
+        images (list): List of BGR frames
+        threads (int): Number of CPU threads used by the LineDetector
+    Returns:
+        report (dict): Max and mean distance (pixels) between the keypoints, and the time per image of both
+    """
+    reference_detector = LineDetector(model_path)
+    start_time = time.perf_counter()
+    reference = np.array(reference_detector.predict_batch(images))
+    reference_time = (time.perf_counter()-start_time)/len(images)
+
+    detector = LineDetector(detector_path,threads=threads)
+    detector.predict_batch(images[:1]) #Warm up
+    start_time = time.perf_counter()
+    keypoints = np.array(detector.predict_batch(images))
+    detector_time = (time.perf_counter()-start_time)/len(images)
+
+    #Distance between each pair of keypoints
+    distances = np.linalg.norm((keypoints-reference).reshape(len(images),-1,2),axis=2)
+
+    return {
+        "max_distance": float(distances.max()),
+        "mean_distance": float(distances.mean()),
+        "reference_ms_per_image": reference_time*1000,
+        "detector_ms_per_image": detector_time*1000
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the court keypoints model")
+    parser.add_argument("model_path",help="State_dict of the pre-trained model (.pth)")
+    parser.add_argument("--format",choices=EXPORT_FORMATS,default="onnx",help="Format of the exported model")
+    parser.add_argument("--quantize",action="store_true",help="Quantize the weights to int8")
+    parser.add_argument("--output",default=None,help="Path of the exported model")
+    parser.add_argument("--check",nargs="*",default=CHECK_IMAGES,help="Images to compare the exported model with the eager model on")
+    parser.add_argument("--threads",type=int,default=None,help="Number of CPU threads used for the parity check")
+    parser.add_argument("--max-distance",type=float,default=MAX_KEYPOINT_DISTANCE,help="Max keypoint distance (pixels) to the eager model")
+    args = parser.parse_args()
+
+    images = [cv.imread(image_path) for image_path in args.check]
+    output_path,report = export_line_detector(args.model_path,args.format,args.quantize,args.output,images,args.max_distance,args.threads)
+    print(f"Exported {output_path}")
+    print(f"Keypoint distance to the eager model: max {report['max_distance']:.2f} px, mean {report['mean_distance']:.2f} px")
+    print(f"Eager model: {report['reference_ms_per_image']:.1f} ms/image, exported model: {report['detector_ms_per_image']:.1f} ms/image")
@@ -0,0 +1,96 @@
+import cv2 as cv
+import numpy as np
+
+#Mean absolute difference (grey levels) between the thumbnails of two frames above which the court is detected again
+COURT_CHANGE_THRESHOLD = 12.0
+#Size (w,h) of the thumbnails compared, small enough that players moving barely change them
+THUMBNAIL_SIZE = (64,36)
+
+class KeypointTracker:
+    """
+    Keep the court keypoints up to date when the camera moves (zoom, pans, replays).
+    Each frame is compared to the frame the keypoints were detected on with a cheap thumbnail difference,
+    the keypoints model only runs again when the scene has changed
+    """
+    def __init__(self,line_detector,change_threshold=COURT_CHANGE_THRESHOLD,thumbnail_size=THUMBNAIL_SIZE):
+        """
+        Args:
+            line_detector (LineDetector): Court keypoints detector
+            change_threshold (float): Mean absolute difference of the thumbnails above which the keypoints are detected again
+            thumbnail_size (tuple): Size (w,h) of the thumbnails compared
+        """
+        self.line_detector = line_detector
+        self.change_threshold = change_threshold
+        self.thumbnail_size = thumbnail_size
+        self.keypoints = None
+        self.reference_thumbnail = None
+        self.detection_count = 0
+
+    def get_thumbnail(self,frame):
+        """
+        Downsample the frame to a small grey image
+        (sampling a grid 4 times bigger first and averaging it is much faster than averaging the whole frame)
+        """
+        w,h = self.thumbnail_size
+        sampled = cv.resize(frame,(w*4,h*4),interpolation=cv.INTER_NEAREST)
+        thumbnail = cv.resize(sampled,(w,h),interpolation=cv.INTER_AREA)
+        return cv.cvtColor(thumbnail,cv.COLOR_BGR2GRAY).astype(np.float32)
+
+    def scene_change(self,thumbnail):
+        """
+        Returns:
+            change (float): Mean absolute difference between the thumbnail and the one the keypoints were detected on
+        """
+        return float(cv.norm(thumbnail,self.reference_thumbnail,cv.NORM_L1))/thumbnail.size
+
+    def update(self,frame):
+        """
+        Get the court keypoints of the next frame, detecting them again only if the scene changed
+        Args:
+            frame (array): Next frame of the video
+        Returns:
+            keypoints (list): List of keypoints of the court in the frame
+            redetected (bool): True if the keypoints were detected on this frame
+        """
+        thumbnail = self.get_thumbnail(frame)
+        if self.keypoints is not None and self.scene_change(thumbnail) <= self.change_threshold:
+            return self.keypoints,False
+
+        self.keypoints = self.line_detector.predict(frame)
+        self.reference_thumbnail = thumbnail
+        self.detection_count += 1
+
+        return self.keypoints,True
+
+    def detect_video(self,frames):
+        """
+        Get the court keypoints of every frame of the video
+        Args:
+            frames (iterable): Frames of the video
+        Returns:
+            court_segments (list): List of (first frame number, keypoints) for each range of frames with the same keypoints
+        """
+        court_segments = []
+        for frame_num, frame in enumerate(frames):
+            keypoints,redetected = self.update(frame)
+            if redetected:
+                court_segments.append((frame_num,keypoints))
+
+        return court_segments
+
+def get_segment_keypoints(court_segments,frame_num):
+    """
+    Get the court keypoints of a frame from the court segments
+    Args:
+        court_segments (list): List of (first frame number, keypoints), sorted by frame number
+        frame_num (int): Frame number
+    Returns:
+        keypoints (list): List of keypoints of the court in the frame
+    """
+    keypoints = court_segments[0][1]
+    for start_frame, segment_keypoints in court_segments:
+        if start_frame > frame_num:
+            break
+        keypoints = segment_keypoints
+
+    return keypoints
@@ -1,52 +1,108 @@
-import torch
-from torch import nn
-import torchvision
-import torchvision.transforms as transforms
-import torchvision.models as models
+import numpy as np
 import cv2 as cv
+from utils import timed
+from .backends import load_backend
+
+#Size of the images the model takes as input
+INPUT_SIZE = 224
+#Offical normalisation values for ImageNet trained models
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406],np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225],np.float32)
 
 class LineDetector:
-    def __init__(self,model_path):
+    def __init__(self,model_path,threads=None):
         """
-        Create NN based on resnet50 architecture
+        Load the court keypoints model (resnet50 architecture)
         Args:
-            model_path (str): Model Path to load state_dict of pre-trained model
+            model_path (str): Model Path, state_dict of the pre-trained model (.pth)
+                              or a graph exported by court_line_detector.export (.torchscript, .onnx)
+            threads (int): Number of CPU threads used by the model (library default if None)
         """
-        self.model = models.resnet50(pretrained=False)
-        self.model.fc = nn.Linear(in_features=self.model.fc.in_features,
-                                  out_features=14*2)
-        self.model.load_state_dict(torch.load(model_path,map_location="cpu"))
-        self.transform = transforms.Compose([
+        self.model = load_backend(model_path,threads)
+        self.transform = self.create_baseline_transform() if self.model.baseline else None
+
+        #(pixel/255 - mean)/std as a single multiply and subtract
+        self.scale = 1/(255.0*IMAGENET_STD)
+        self.offset = IMAGENET_MEAN/IMAGENET_STD
+
+    def create_baseline_transform(self):
+        """
+        Returns:
+            transform (Compose): Original torchvision preprocessing (PIL bilinear resize), used with the .pth model
+        """
+        import torchvision.transforms as transforms
+
+        return transforms.Compose([
             transforms.ToPILImage(),
-            transforms.Resize((224,224)),
+            transforms.Resize((INPUT_SIZE,INPUT_SIZE)),
             transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]) #Offical normalisation values for ImageNet trained models
+            transforms.Normalize(mean=IMAGENET_MEAN.tolist(), std=IMAGENET_STD.tolist())
         ])
 
-    def predict(self,image):
+    def preprocess(self,images):
         """
-        Predict the first image/frame only since its a still video
+        Resize and normalise the images, with the original torchvision transforms for the .pth model
+        and with OpenCV and NumPy for the exported graphs
         Args:
-            image (any): 1 frame of the video
+            images (list): List of BGR frames
         Returns:
-            keypoints (list): Returns list of keypoints of the image
+            batch (array): Array of shape (N,3,224,224), float32
         """
-        img_rgb = cv.cvtColor(image,cv.COLOR_BGR2RGB)
-        img_tensor = self.transform(img_rgb).unsqueeze(0)
+        if self.transform is not None:
+            return np.stack([self.transform(cv.cvtColor(image,cv.COLOR_BGR2RGB)).numpy() for image in images])
 
-        #Make a prediction to predict the keypoints of the court
-        with torch.no_grad():
-            predictions = self.model(img_tensor)
-        
-        #Get the keypoints of the image
-        keypoints = predictions.squeeze().cpu().numpy()
-        original_h,original_w,_ = img_rgb.shape
+        batch = np.empty((len(images),3,INPUT_SIZE,INPUT_SIZE),np.float32)
+        for i, image in enumerate(images):
+            #Resizing first means only the small image has to be converted
+            resized = cv.resize(image,(INPUT_SIZE,INPUT_SIZE),interpolation=cv.INTER_AREA)
+            img_rgb = cv.cvtColor(resized,cv.COLOR_BGR2RGB)
+            batch[i] = (img_rgb*self.scale - self.offset).transpose(2,0,1)
+
+        return batch
 
-        #Scale keypoints based on the original image size
-        keypoints[::2] *= original_w/225.0
-        keypoints[1::2] *= original_h/225.0
+    @timed("keypoints")
+    def predict_batch(self,images):
+        """
+        Predict the keypoints of several images in one call
+        Args:
+            images (list): List of frames of the video
+        Returns:
+            keypoints (list): Returns the list of keypoints of each image
+        """
+        if len(images) == 0:
+            return []
+
+        predictions = np.asarray(self.model(self.preprocess(images)),np.float32)
+
+        keypoints = []
+        for image, prediction in zip(images,predictions):
+            prediction = prediction.copy()
+            original_h,original_w = image.shape[:2]
+
+            #Scale keypoints based on the original image size
+            prediction[::2] *= original_w/225.0
+            prediction[1::2] *= original_h/225.0
+            keypoints.append(prediction)
 
         return keypoints
+
+    def warm_up(self,frame):
+        """
+        Run the model once so that the first real prediction is not slowed down
+        Args:
+            frame (array): Frame of the same size as the video
+        """
+        self.predict(frame)
+
+    def predict(self,image):
+        """
+        Predict the first image/frame only since its a still video
+        Args:
+            image (any): 1 frame of the video
+        Returns:
+            keypoints (list): Returns list of keypoints of the image
+        """
+        return self.predict_batch([image])[0]
     
     def draw_keypoints(self,image,keypoints):
         """
@@ -0,0 +1 @@
+from .detection_cache import DetectionCache,hash_file,hash_model
\ No newline at end of file
@@ -0,0 +1,269 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+#Columns of a chunk file: frame offset in the chunk, then the raw model output [x1,y1,x2,y2,conf,cls]
+DETECTION_COLUMNS = 6
+
+def hash_file(file_path,cache_dir=None):
+    """
+    Hash the content of a file. If cache_dir is given the digest is remembered there (keyed on path, size
+    and modification time) so that long videos are not read again on every run
+    Args:
+        file_path (str): Path to the file
+        cache_dir (str): Directory where digests are remembered
+    Returns:
+        digest (str): Hex digest of the file content
+    """
+    stat = os.stat(file_path)
+    file_key = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    digests = {}
+    digests_path = None
+    if cache_dir is not None:
+        digests_path = os.path.join(cache_dir,"file_digests.json")
+        if os.path.exists(digests_path):
+            with open(digests_path,"r") as f:
+                digests = json.load(f)
+        if file_key in digests:
+            return digests[file_key]
+
+    file_hash = hashlib.blake2b(digest_size=20)
+    with open(file_path,"rb") as f:
+        for block in iter(lambda: f.read(1<<20),b""):
+            file_hash.update(block)
+    digest = file_hash.hexdigest()
+
+    if digests_path is not None:
+        digests[file_key] = digest
+        os.makedirs(cache_dir,exist_ok=True)
+        temp_path = f"{digests_path}.{os.getpid()}.tmp"
+        with open(temp_path,"w") as f:
+            json.dump(digests,f)
+        os.replace(temp_path,digests_path)
+
+    return digest
+
+def get_model_files(model_path):
+    """
+    Files that make up a model. An OpenVINO model (.xml) keeps its weights in the .bin of the same name and its class
+    names in the metadata.yaml next to it, the other formats are a single file
+    Args:
+        model_path (str): Path of the model (the .xml of an OpenVINO model)
+    Returns:
+        model_files (list): Paths of the files of the model that exist
+    """
+    model_files = [model_path]
+    if os.path.splitext(model_path)[1].lower() == ".xml":
+        for file_path in (os.path.splitext(model_path)[0]+".bin",os.path.join(os.path.dirname(model_path),"metadata.yaml")):
+            if os.path.exists(file_path):
+                model_files.append(file_path)
+
+    return model_files
+
+def hash_model(model_path,cache_dir=None):
+    """
+    Hash the content of every file of a model, so that re-exported weights are never mistaken for the old ones
+    Args:
+        model_path (str): Path of the model (the .xml of an OpenVINO model)
+        cache_dir (str): Directory where digests are remembered (see hash_file)
+    Returns:
+        digest (str): Hex digest of the model, the digest of the file itself for single file models
+    """
+    model_files = get_model_files(model_path)
+    if len(model_files) == 1:
+        return hash_file(model_path,cache_dir)
+
+    digests = [f"{os.path.basename(file_path)}:{hash_file(file_path,cache_dir)}" for file_path in model_files]
+    return hashlib.blake2b("|".join(digests).encode(),digest_size=20).hexdigest()
+
+class DetectionCache:
+    """
+    Stores the raw detections of one model on one video, in chunks of frames.
+    The cache key is a hash of the video content, the model weights and the inference parameters, so results
+    are never reused for a different video, model or threshold. Each chunk is written once it is complete, so a
+    rerun only computes the missing chunks and an interrupted run picks up from the last complete chunk.
+    Chunks are .npy files read with memory mapping, only when one of their frames is needed
+    """
+    def __init__(self,cache_dir,video_path,model_path,params,chunk_size=256):
+        """
+        Args:
+            cache_dir (str): Directory of the cache
+            video_path (str): Path to the video
+            model_path (str): Path to the model weights (every file of the model is part of the key, see hash_model)
+            params (dict): Inference parameters (confidence threshold...)
+            chunk_size (int): Number of frames per chunk
+        """
+        self.chunk_size = chunk_size
+
+        key_content = json.dumps({
+            "video": hash_file(video_path,cache_dir),
+            "model": hash_model(model_path,cache_dir),
+            "params": params,
+            "chunk_size": chunk_size
+        },sort_keys=True)
+        self.key = hashlib.blake2b(key_content.encode(),digest_size=20).hexdigest()
+        self.directory = os.path.join(cache_dir,self.key)
+        os.makedirs(self.directory,exist_ok=True)
+
+        #Complete chunks on disk: chunk index -> (path, number of frames)
+        self.chunks = {}
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".npy"):
+                continue
+            chunk_index,frame_count = os.path.splitext(file_name)[0].split("_")
+            self.chunks[int(chunk_index)] = (os.path.join(self.directory,file_name),int(frame_count))
+
+        #Written when the whole video has been cached: number of frames and class names of the model
+        self.info_path = os.path.join(self.directory,"info.json")
+        info = {}
+        if os.path.exists(self.info_path):
+            with open(self.info_path,"r") as f:
+                info = json.load(f)
+        self.frame_count = info.get("frame_count")
+        self.names = {int(class_id):name for class_id,name in info["names"].items()} if info.get("names") is not None else None
+
+        self.loaded_chunk_index = None
+        self.loaded_chunk = None
+        self.loaded_offsets = None
+        self.pending_chunk_index = None
+        self.pending = {}
+
+    def is_complete(self):
+        """
+        Returns:
+            bool: True if every frame of the video is cached, the model does not have to be loaded at all
+        """
+        if self.frame_count is None:
+            return False
+
+        #Last frame of every chunk
+        last_frames = list(range(self.chunk_size-1,self.frame_count,self.chunk_size)) + [self.frame_count-1]
+        return all(self.has_frame(frame_num) for frame_num in last_frames)
+
+    def has_frame(self,frame_num):
+        """
+        Returns:
+            bool: True if the detections of the frame are in a complete chunk
+        """
+        chunk_index,offset = divmod(frame_num,self.chunk_size)
+        return chunk_index in self.chunks and offset < self.chunks[chunk_index][1]
+
+    def get(self,frame_num):
+        """
+        Get the cached detections of a frame
+        Args:
+            frame_num (int): Frame number
+        Returns:
+            detections (array): (n,6) array of [x1,y1,x2,y2,conf,cls], or None if the frame is not cached
+        """
+        if not self.has_frame(frame_num):
+            return None
+
+        chunk_index,offset = divmod(frame_num,self.chunk_size)
+        if chunk_index != self.loaded_chunk_index:
+            chunk_path,frame_count = self.chunks[chunk_index]
+            self.loaded_chunk = np.load(chunk_path,mmap_mode="r")
+            #Rows are sorted by frame, offsets[i]:offsets[i+1] are the rows of frame i
+            self.loaded_offsets = np.searchsorted(self.loaded_chunk[:,0],np.arange(frame_count+1))
+            self.loaded_chunk_index = chunk_index
+
+        start,end = self.loaded_offsets[offset],self.loaded_offsets[offset+1]
+        return np.array(self.loaded_chunk[start:end,1:])
+
+    def put(self,frame_num,detections):
+        """
+        Add the detections of a frame. The chunk is written to disk once all its frames are added
+        Args:
+            frame_num (int): Frame number
+            detections (array): (n,6) array of [x1,y1,x2,y2,conf,cls]
+        """
+        if self.has_frame(frame_num):
+            return
+
+        chunk_index,offset = divmod(frame_num,self.chunk_size)
+        if chunk_index != self.pending_chunk_index:
+            self.pending_chunk_index = chunk_index
+            self.pending = {}
+
+            #Last chunk of a shorter run, continue it
+            if chunk_index in self.chunks:
+                for chunk_offset in range(self.chunks[chunk_index][1]):
+                    self.pending[chunk_offset] = self.get(chunk_index*self.chunk_size+chunk_offset)
+
+        self.pending[offset] = np.asarray(detections,np.float64).reshape(-1,DETECTION_COLUMNS)
+
+        if len(self.pending) == self.chunk_size:
+            self.write_pending_chunk()
+
+    def finish(self):
+        """
+        Write the last chunk of the video (which has less than chunk_size frames). Only call at the end of the video
+        """
+        if len(self.pending) > 0 and len(self.pending) == max(self.pending)+1:
+            self.write_pending_chunk()
+
+        if len(self.chunks) > 0:
+            last_chunk_index = max(self.chunks)
+            self.frame_count = last_chunk_index*self.chunk_size + self.chunks[last_chunk_index][1]
+            self.write_info()
+
+    def write_info(self):
+        """
+        Write the number of frames and the class names (written to a temporary file first)
+        """
+        info = {
+            "frame_count": self.frame_count,
+            "names": {str(class_id):name for class_id,name in self.names.items()} if self.names is not None else None
+        }
+        temp_path = f"{self.info_path}.{os.getpid()}.tmp"
+        with open(temp_path,"w") as f:
+            json.dump(info,f)
+        os.replace(temp_path,self.info_path)
+
+    def write_pending_chunk(self):
+        """
+        Write the pending chunk to disk (written to a temporary file first so a chunk is never half written)
+        """
+        frame_count = len(self.pending)
+        rows = [np.column_stack([np.full(len(self.pending[offset]),offset),self.pending[offset]]) for offset in range(frame_count)]
+        chunk = np.concatenate(rows) if len(rows) > 0 else np.zeros((0,DETECTION_COLUMNS+1))
+
+        chunk_path = os.path.join(self.directory,f"{self.pending_chunk_index:06d}_{frame_count}.npy")
+        temp_path = f"{chunk_path}.{os.getpid()}.tmp"
+        with open(temp_path,"wb") as f:
+            np.save(f,chunk)
+        os.replace(temp_path,chunk_path)
+
+        #Remove the shorter version of this chunk (unmapped first, Windows cannot delete a mapped file)
+        if self.loaded_chunk_index == self.pending_chunk_index:
+            self.loaded_chunk_index = None
+            self.loaded_chunk = None
+        if self.pending_chunk_index in self.chunks and self.chunks[self.pending_chunk_index][0] != chunk_path:
+            os.remove(self.chunks[self.pending_chunk_index][0])
+
+        self.chunks[self.pending_chunk_index] = (chunk_path,frame_count)
+        self.pending_chunk_index = None
+        self.pending = {}
+
+    def predict_batch(self,predict,frames,frame_num):
+        """
+        Get the detections of consecutive frames, running the model only on the frames that are not cached
+        Args:
+            predict (function): Runs the model on a list of frames and returns one (n,6) array per frame
+            frames (list): List of consecutive frames as an array
+            frame_num (int): Frame number of the first frame
+        Returns:
+            detections (list): One (n,6) array of [x1,y1,x2,y2,conf,cls] per frame
+        """
+        detections = [self.get(frame_num+i) for i in range(len(frames))]
+        missing = [i for i, frame_detections in enumerate(detections) if frame_detections is None]
+
+        if len(missing) > 0:
+            predicted = predict([frames[i] for i in missing])
+            for i, frame_detections in zip(missing,predicted):
+                detections[i] = frame_detections
+                self.put(frame_num+i,frame_detections)
+
+        return detections
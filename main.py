@@ -1,68 +1,134 @@
 import cv2 as cv
+import sys
 import time
-from utils import (read_video,save_video,get_court_layout)
-from trackers import TrackPlayer,TrackBall
-from court_line_detector import LineDetector
+import argparse
+from utils import (read_video,save_video,get_court_layouts,get_frame_court_layout,start_profiling,stop_profiling,profile_frame,get_peak_rss)
+from trackers import TrackPlayer,TrackBall,RoleClassifier,ROLE_ASSIGNMENT_FRAME
+from court_line_detector import LineDetector,KeypointTracker,get_segment_keypoints
 from minimap import DrawMinimap
+from pipeline import StreamPipeline,ThreadedPipeline,LivePipeline,ShardedDetector,ModelLoader,get_model,list_jobs,run_batch
+from renderer import FrameRenderer
+from detection_cache import DetectionCache,hash_model
 
-def main():
+DETECTION_CACHE_DIR = "tracker_cache"
+KEYPOINTS_MODEL_PATH = "models/keypoints_model.pth"
+PLAYER_MODEL_PATH = "models/yolov8x.pt"
+BALL_MODEL_PATH = "models/yolov8_tennisball_best.pt"
+
+def get_court_source(keypoints_model_path,track_court,player_roi):
+    """
+    What the court crop of the player detector depends on besides the video, part of the player detection cache key
+    Args:
+        keypoints_model_path (str): Court keypoints model
+        track_court (bool): Court detected again whenever the camera moves
+        player_roi (bool): Player detection cropped to the court
+    Returns:
+        court_source (dict): Digest of the keypoints model and track_court, None without player_roi
+    """
+    if not player_roi:
+        return None
+
+    return {"keypoints_model": hash_model(keypoints_model_path,DETECTION_CACHE_DIR),"track_court": track_court}
+
+def main(batch_size=1,homography=False,track_court=False,keypoints_model_path=KEYPOINTS_MODEL_PATH,ball_roi=False,player_keyframe_interval=1,player_roi=False,shards=1,
+         player_model_path=PLAYER_MODEL_PATH,ball_model_path=BALL_MODEL_PATH,imgsz=None,detector_threads=None):
     #Start timer to count FPS
     start_time = time.time()
 
-    #Read video
     input_video_path = "input_images/input_video.mp4"
+
+    #Load and warm up the models on other threads while the video is read
+    ##The YOLO weights are only loaded when some frames are not in the detection cache
+    player_params = dict(model_path=player_model_path,keyframe_interval=player_keyframe_interval,court_roi=player_roi,court_source=get_court_source(keypoints_model_path,track_court,player_roi),person_only=player_roi,imgsz=imgsz,threads=detector_threads)
+    ball_params = dict(model_path=ball_model_path,roi_tracking=ball_roi,imgsz=imgsz,threads=detector_threads)
+    player_tracker = TrackPlayer(**player_params)
+    ball_tracker = TrackBall(**ball_params)
+
+    #Cached detections are only reused for the same video, weights and thresholds
+    player_cache = DetectionCache(DETECTION_CACHE_DIR,input_video_path,player_tracker.model_path,player_tracker.cache_params)
+    ball_cache = DetectionCache(DETECTION_CACHE_DIR,input_video_path,ball_tracker.model_path,ball_tracker.cache_params)
+
+    model_loader = ModelLoader()
+    keypoints_detector_loading = model_loader.load("keypoints",lambda: LineDetector(keypoints_model_path))
+    if shards <= 1:
+        player_tracker_loading = model_loader.load("players",lambda: player_tracker,warm_up=not player_cache.is_complete())
+        ball_tracker_loading = model_loader.load("ball",lambda: ball_tracker,warm_up=not ball_cache.is_complete())
+
+    #Read video
     video_frames = read_video(input_video_path)
 
     #Detecting keypoints in the video
-    keypoints_detector = LineDetector("models/keypoints_model.pth")
-    keypoint_detected = keypoints_detector.predict(video_frames[0])
-    court_layout = get_court_layout(keypoint_detected)
+    keypoints_detector = get_model(keypoints_detector_loading)
+    if track_court:
+        #Keypoints are detected again on the frames where the camera moved
+        court_segments = KeypointTracker(keypoints_detector).detect_video(video_frames)
+        print(f"Court detected {len(court_segments)} times")
+    else:
+        court_segments = [(0,keypoints_detector.predict(video_frames[0]))]
+    keypoint_detected = get_segment_keypoints(court_segments,ROLE_ASSIGNMENT_FRAME)
+    #Each range of frames is cropped and measured against its own court
+    court_layouts = get_court_layouts(court_segments)
+    court_layout = get_frame_court_layout(court_layouts,ROLE_ASSIGNMENT_FRAME)
     print(f"Number of keypoints detected: {len(keypoint_detected)}")
     print(f"{keypoint_detected}")
     print(f"Court layout: {court_layout}")
 
     #Detecting players and tennis ball in the video
-    player_tracker = TrackPlayer(model_path="models/yolov8x.pt")
-    ball_tracker = TrackBall(model_path="models/yolov8_tennisball_best.pt") 
     minimap = DrawMinimap(video_frames[0])
+    if shards > 1:
+        #Each worker process loads its own models and tracks its own segment of the video (no detection cache)
+        model_loader.shutdown()
+        sharded_detector = ShardedDetector(player_params,ball_params,workers=shards,batch_size=batch_size)
+        player_detections,ball_detections = sharded_detector.detect(input_video_path,court_layouts=court_layouts)
+    else:
+        player_tracker = get_model(player_tracker_loading)
+        ball_tracker = get_model(ball_tracker_loading)
+        model_loader.shutdown()
+        print(f"Model load and warm-up times: {model_loader.load_times}")
 
-    player_detections = player_tracker.detect_frames(video_frames,
-                                                     read_from_stub=True,
-                                                     stub_path="tracker_stubs/player_detection.pkl",
-                                                     court_layout=court_layout)
-    ball_detections = ball_tracker.detect_frames(video_frames,
-                                                 read_from_stub=True,
-                                                 stub_path='tracker_stubs/ball_detection.pkl')
+        player_detections = player_tracker.detect_frames(video_frames,
+                                                         cache=player_cache,
+                                                         batch_size=batch_size,
+                                                         court_layouts=court_layouts)
+        ball_detections = ball_tracker.detect_frames(video_frames,
+                                                     cache=ball_cache,
+                                                     batch_size=batch_size)
     
     ball_detections = ball_tracker.interpolate_ball_position(ball_detections)
     print(f"Number of ball detections: {len(ball_detections)}")
 
     #Choose players
-    player_detections,other_detection,role_assignments = player_tracker.assign_and_filter_roles(court_layout,player_detections)
+    player_detections,other_detection,role_assignments = player_tracker.assign_and_filter_roles(court_layout,
+                                                                                                player_detections,
+                                                                                                RoleClassifier(player_tracker),
+                                                                                                court_layouts)
 
     print(f"role assignment: {role_assignments[0]}")
     print(f"player detections: {player_detections[0]}")
     print(f"other detections: {other_detection[0]}")
 
     #Convert court positions to minimap positions
-    player_minimap_detections,ball_minimap_detections = minimap.convert_bbox_to_minimap_coor(player_detections,ball_detections,keypoint_detected)
+    player_minimap_detections,ball_minimap_detections = minimap.convert_segments_to_minimap_coor(player_detections,
+                                                                                                 ball_detections,
+                                                                                                 court_segments,
+                                                                                                 homography=homography)
 
     #Draw stuff
-    ##Draw bounding box around the players
-    output_video_frames = player_tracker.draw_player_bounding_box(video_frames,player_detections)
-    output_video_frames = player_tracker.draw_others_bounding_box(output_video_frames,other_detection,role_assignments)
-    output_video_frames = ball_tracker.draw_bounding_box(output_video_frames,ball_detections)
-                                                           
-    ##Draw keypoints on the video
-    output_video_frames = keypoints_detector.draw_keypoints_on_video(output_video_frames,
-                                                          keypoint_detected)
-    
-    ##Draw minimap on the video
-    output_video_frames = minimap.draw_minimap(output_video_frames)
-
-    #Draw points on the minimap
-    output_video_frames = minimap.draw_points_on_minimap(output_video_frames,player_minimap_detections,(0,0,255))
-    output_video_frames = minimap.draw_points_on_minimap(output_video_frames,ball_minimap_detections,(0,255,0))
+    ##Bounding boxes, keypoints, minimap and frame counter are all drawn in one pass per frame
+    renderer = FrameRenderer(court_segments[0][1],minimap)
+    output_video_frames = []
+    for frame in renderer.render_video(video_frames,
+                                       player_detections,
+                                       other_detection,
+                                       role_assignments,
+                                       ball_detections,
+                                       player_minimap_detections,
+                                       ball_minimap_detections,
+                                       court_segments):
+        if len(output_video_frames) == 0:
+            print(f"Time to first frame: {time.time()-start_time:.2f}s")
+        output_video_frames.append(frame)
+        profile_frame()
 
     #Draw fps in video (for future real time)
     end_time = time.time()
@@ -71,12 +137,183 @@ def main():
     #for frame in (output_video_frames):
         #cv.putText(frame,f"{int(fps)} fps",(10,30),cv.FONT_HERSHEY_COMPLEX,1,(160,160,0),3)
 
-    #Draw frame counter of the video
-    for i, frame in enumerate(output_video_frames):
-        cv.putText(frame,f"{i}",(10,30),cv.FONT_HERSHEY_COMPLEX,1,(0,110,110),3)
-
     #Save the video
     save_video(output_video_frames, "output videos/output_video.avi")
 
+def print_memory_report(frame_pool):
+    """
+    Print how many frame buffers were allocated and the peak memory of the process
+    Args:
+        frame_pool (FramePool): Pool of the pipeline, None if the frames were not reused
+    """
+    if frame_pool is not None:
+        stats = frame_pool.stats()
+        print(f"Frame buffers: {stats['allocations']} allocated for {stats['frames']} decoded frames ({stats['peak_in_use']} in use at most)")
+    else:
+        print("Frame buffers: one allocated for every decoded frame")
+    peak_rss = get_peak_rss()
+    if peak_rss is not None:
+        print(f"Peak RSS: {peak_rss/2**20:.0f} MB")
+
+def main_stream(batch_size=1,pipelined=False,homography=False,track_court=False,keypoints_model_path=KEYPOINTS_MODEL_PATH,ball_roi=False,player_keyframe_interval=1,player_roi=False,
+                player_model_path=PLAYER_MODEL_PATH,ball_model_path=BALL_MODEL_PATH,imgsz=None,detector_threads=None,reuse_frames=True,show_fps=False):
+    """
+    Same as main() but decodes, detects, annotates and encodes one frame at a time so that memory stays bounded
+    Args:
+        batch_size (int): Number of frames sent to the detectors in one call
+        pipelined (bool): Run decoding, detection, rendering and encoding on separate threads at the same time
+        homography (bool): Project the players and the ball onto the minimap with a homography fitted to the court keypoints
+        track_court (bool): Detect the court keypoints again whenever the camera moves
+        keypoints_model_path (str): Court keypoints model (.pth, or a .onnx/.torchscript export)
+        ball_roi (bool): Only search for the ball around its predicted position (full frame when it is lost)
+        player_keyframe_interval (int): Run the player detector every this many frames and follow the players with optical flow in between
+        player_roi (bool): Only detect people, and only on the court and its surroundings
+        player_model_path (str): Player detector (YOLO .pt, or a .onnx/OpenVINO .xml export of it)
+        ball_model_path (str): Ball detector (YOLO .pt, or a .onnx/OpenVINO .xml export of it)
+        imgsz (int): Input size of both detectors (ultralytics default if None)
+        detector_threads (int): Number of CPU threads of each detector (library default if None)
+        reuse_frames (bool): Decode into a pool of frame buffers that are annotated and encoded in place
+        show_fps (bool): Draw the current frame rate on every frame
+    """
+    start_time = time.perf_counter()
+
+    input_video_path = "input_images/input_video.mp4"
+
+    player_tracker = TrackPlayer(model_path=player_model_path,keyframe_interval=player_keyframe_interval,court_roi=player_roi,court_source=get_court_source(keypoints_model_path,track_court,player_roi),person_only=player_roi,imgsz=imgsz,threads=detector_threads)
+    ball_tracker = TrackBall(model_path=ball_model_path,roi_tracking=ball_roi,imgsz=imgsz,threads=detector_threads)
+
+    player_cache = DetectionCache(DETECTION_CACHE_DIR,input_video_path,player_tracker.model_path,player_tracker.cache_params)
+    ball_cache = DetectionCache(DETECTION_CACHE_DIR,input_video_path,ball_tracker.model_path,ball_tracker.cache_params)
+
+    #The pipeline starts decoding right away and only waits for each model when it first needs it
+    model_loader = ModelLoader()
+    keypoints_detector_loading = model_loader.load("keypoints",lambda: LineDetector(keypoints_model_path))
+    player_tracker_loading = model_loader.load("players",lambda: player_tracker,warm_up=not player_cache.is_complete())
+    ball_tracker_loading = model_loader.load("ball",lambda: ball_tracker,warm_up=not ball_cache.is_complete())
+    models = (keypoints_detector_loading,player_tracker_loading,ball_tracker_loading)
+
+    if pipelined:
+        stream_pipeline = ThreadedPipeline(*models,batch_size=batch_size,homography=homography,track_court=track_court,reuse_frames=reuse_frames,show_fps=show_fps)
+    else:
+        stream_pipeline = StreamPipeline(*models,batch_size=batch_size,homography=homography,track_court=track_court,reuse_frames=reuse_frames,show_fps=show_fps)
+    frame_count = stream_pipeline.run(input_video_path,
+                                      "output videos/output_video.avi",
+                                      player_cache=player_cache,
+                                      ball_cache=ball_cache)
+
+    model_loader.shutdown()
+    total_time = time.perf_counter()-start_time
+    print(f"Model load and warm-up times: {model_loader.load_times}")
+    if stream_pipeline.first_frame_time is not None:
+        print(f"Time to first frame: {stream_pipeline.first_frame_time-start_time:.2f}s")
+    print(f"Processed {frame_count} frames at {frame_count/total_time:.1f} fps")
+    print_memory_report(stream_pipeline.frame_pool)
+
+def main_live(source,latency_budget=0.5,display=True,output_video_path=None,homography=False,track_court=False,
+              keypoints_model_path=KEYPOINTS_MODEL_PATH,ball_roi=False,player_keyframe_interval=1,player_roi=False,
+              player_model_path=PLAYER_MODEL_PATH,ball_model_path=BALL_MODEL_PATH,imgsz=None,detector_threads=None,reuse_frames=True):
+    """
+    Annotate a live source frame by frame, dropping frames when the detectors fall behind
+    Args:
+        source (int|str): Camera index, stream URL (RTSP/HTTP), or a video file played back at its native rate
+        latency_budget (float): Max time (s) from the capture of a frame to its output, frames that would be later are dropped
+        display (bool): Show the annotated frames in a window (press q to stop)
+        output_video_path (str): Path to save the annotated video (not saved if None)
+        Other arguments: see main_stream()
+    """
+    #The models are loaded and warmed up before the source is opened, so the first frames are not already late
+    model_loader = ModelLoader()
+    models = (model_loader.load("keypoints",lambda: LineDetector(keypoints_model_path)),
+              model_loader.load("players",lambda: TrackPlayer(model_path=player_model_path,keyframe_interval=player_keyframe_interval,court_roi=player_roi,person_only=player_roi,imgsz=imgsz,threads=detector_threads)),
+              model_loader.load("ball",lambda: TrackBall(model_path=ball_model_path,roi_tracking=ball_roi,imgsz=imgsz,threads=detector_threads)))
+    models = [get_model(model) for model in models]
+    model_loader.shutdown()
+    print(f"Model load and warm-up times: {model_loader.load_times}")
+
+    live_pipeline = LivePipeline(*models,latency_budget=latency_budget,homography=homography,track_court=track_court,reuse_frames=reuse_frames)
+    start_time = time.perf_counter()
+    frame_count = live_pipeline.run(source,output_video_path,display=display)
+
+    total_time = time.perf_counter()-start_time
+    latencies = live_pipeline.latencies
+    print(f"Processed {frame_count} frames at {frame_count/total_time:.1f} fps, dropped {live_pipeline.dropped_frames}")
+    if latencies:
+        print(f"Latency: mean {1000*sum(latencies)/len(latencies):.0f} ms, max {1000*max(latencies):.0f} ms")
+    print_memory_report(live_pipeline.frame_pool)
+
+def main_batch(source,output_dir="output videos",workers=1,force=False,batch_size=1,pipelined=False,homography=False,track_court=False,
+               keypoints_model_path=KEYPOINTS_MODEL_PATH,ball_roi=False,player_keyframe_interval=1,player_roi=False,
+               player_model_path=PLAYER_MODEL_PATH,ball_model_path=BALL_MODEL_PATH,imgsz=None,detector_threads=None):
+    """
+    Annotate every video of a directory or manifest with the same options as main_stream()
+    Args:
+        source (str): Directory of videos, or a manifest file with one video path per line
+        output_dir (str): Directory of the annotated videos
+        workers (int): Number of worker processes, each loads the models once and keeps them for all its videos
+        force (bool): Process the videos even if their outputs are up to date
+    Returns:
+        exit_status (int): 1 if any video failed, 0 otherwise
+    """
+    runner_params = dict(keypoints_model_path=keypoints_model_path,
+                         player_params=dict(model_path=player_model_path,keyframe_interval=player_keyframe_interval,court_roi=player_roi,court_source=get_court_source(keypoints_model_path,track_court,player_roi),person_only=player_roi,imgsz=imgsz,threads=detector_threads),
+                         ball_params=dict(model_path=ball_model_path,roi_tracking=ball_roi,imgsz=imgsz,threads=detector_threads),
+                         cache_dir=DETECTION_CACHE_DIR,
+                         batch_size=batch_size,
+                         pipelined=pipelined,
+                         homography=homography,
+                         track_court=track_court)
+    _,summary = run_batch(list_jobs(source,output_dir),runner_params,workers=workers,force=force)
+
+    return 1 if summary["failed"] else 0
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Tennis match analysis")
+    parser.add_argument("--stream",action="store_true",help="Process the video one frame at a time with bounded memory")
+    parser.add_argument("--pipelined",action="store_true",help="Run the streaming stages on separate threads (implies --stream)")
+    parser.add_argument("--show-fps",action="store_true",help="Draw the current frame rate on every frame in --stream mode")
+    parser.add_argument("--batch-size",type=int,default=1,help="Number of frames sent to the detectors in one call")
+    parser.add_argument("--homography",action="store_true",help="Project the players and the ball onto the minimap with a homography of the court")
+    parser.add_argument("--track-court",action="store_true",help="Detect the court again whenever the camera moves (zoom, pans, replays)")
+    parser.add_argument("--keypoints-model",default=KEYPOINTS_MODEL_PATH,help="Court keypoints model (.pth, or a .onnx/.torchscript export of it)")
+    parser.add_argument("--player-model",default=PLAYER_MODEL_PATH,help="Player detector (YOLO .pt, or a .onnx/OpenVINO .xml export made with trackers.export)")
+    parser.add_argument("--ball-model",default=BALL_MODEL_PATH,help="Ball detector (YOLO .pt, or a .onnx/OpenVINO .xml export made with trackers.export)")
+    parser.add_argument("--imgsz",type=int,default=None,help="Input size of the player and ball detectors")
+    parser.add_argument("--detector-threads",type=int,default=None,help="Number of CPU threads of each player and ball detector")
+    parser.add_argument("--ball-roi",action="store_true",help="Only search for the ball in a crop around its predicted position")
+    parser.add_argument("--player-keyframes",type=int,default=1,help="Run the player detector every N frames and follow the players with optical flow in between")
+    parser.add_argument("--player-roi",action="store_true",help="Only detect people, and only on the court and its surroundings")
+    parser.add_argument("--shards",type=int,default=1,help="Detect the players and the ball on this many processes, each on a segment of the video")
+    parser.add_argument("--batch",default=None,help="Annotate every video of this directory (or manifest file, one video per line)")
+    parser.add_argument("--output-dir",default="output videos",help="Directory of the annotated videos in --batch mode")
+    parser.add_argument("--workers",type=int,default=1,help="Number of worker processes in --batch mode")
+    parser.add_argument("--force",action="store_true",help="Process the videos in --batch mode even if their outputs are up to date")
+    parser.add_argument("--no-frame-pool",action="store_true",help="Allocate a new frame for every decoded frame in --stream and --live modes (to compare memory use)")
+    parser.add_argument("--profile",default=None,help="Time each stage and frame and write the report to this file (.json, or .csv)")
+    parser.add_argument("--cprofile",default=None,help="Also dump cProfile stats of the main thread to this file (open with pstats or snakeviz)")
+    parser.add_argument("--live",default=None,help="Annotate a live source: camera index, RTSP/HTTP URL, or a video file played at its native rate")
+    parser.add_argument("--latency-budget",type=float,default=0.5,help="Max time (s) from the capture of a frame to its output in --live mode, frames that would be later are dropped")
+    parser.add_argument("--no-display",action="store_true",help="Do not show the annotated frames in --live mode")
+    parser.add_argument("--live-output",default=None,help="Also save the annotated frames of --live mode to this video")
+    args = parser.parse_args()
+
+    if args.profile is not None or args.cprofile is not None:
+        start_profiling(args.cprofile)
+
+    exit_status = 0
+    if args.live is not None:
+        source = int(args.live) if args.live.isdigit() else args.live
+        main_live(source,args.latency_budget,not args.no_display,args.live_output,homography=args.homography,track_court=args.track_court,keypoints_model_path=args.keypoints_model,ball_roi=args.ball_roi,player_keyframe_interval=args.player_keyframes,player_roi=args.player_roi,player_model_path=args.player_model,ball_model_path=args.ball_model,imgsz=args.imgsz,detector_threads=args.detector_threads,reuse_frames=not args.no_frame_pool)
+    elif args.batch is not None:
+        exit_status = main_batch(args.batch,args.output_dir,args.workers,args.force,batch_size=args.batch_size,pipelined=args.pipelined,homography=args.homography,track_court=args.track_court,keypoints_model_path=args.keypoints_model,ball_roi=args.ball_roi,player_keyframe_interval=args.player_keyframes,player_roi=args.player_roi,player_model_path=args.player_model,ball_model_path=args.ball_model,imgsz=args.imgsz,detector_threads=args.detector_threads)
+    elif args.stream or args.pipelined:
+        main_stream(batch_size=args.batch_size,pipelined=args.pipelined,homography=args.homography,track_court=args.track_court,keypoints_model_path=args.keypoints_model,ball_roi=args.ball_roi,player_keyframe_interval=args.player_keyframes,player_roi=args.player_roi,player_model_path=args.player_model,ball_model_path=args.ball_model,imgsz=args.imgsz,detector_threads=args.detector_threads,reuse_frames=not args.no_frame_pool,show_fps=args.show_fps)
+    else:
+        main(batch_size=args.batch_size,homography=args.homography,track_court=args.track_court,keypoints_model_path=args.keypoints_model,ball_roi=args.ball_roi,player_keyframe_interval=args.player_keyframes,player_roi=args.player_roi,player_model_path=args.player_model,ball_model_path=args.ball_model,imgsz=args.imgsz,detector_threads=args.detector_threads,shards=args.shards)
+
+    profiler = stop_profiling()
+    if profiler is not None:
+        profiler.print_summary()
+        if args.profile is not None:
+            profiler.write_report(args.profile)
+
+    sys.exit(exit_status)
@@ -1 +1 @@
-from .minimap import DrawMinimap
\ No newline at end of file
+from .minimap import DrawMinimap,HEIGHT_WINDOW_BEFORE,HEIGHT_WINDOW_AFTER
\ No newline at end of file
@@ -4,12 +4,45 @@ import sys
 import constants
 from utils import (convert_pixels_to_meters,
                    convert_meters_to_pixels,
-                   get_foot_position,
-                   get_closest_keypoint_index,
-                   get_height_of_bbox,
                    measure_xy_dist,
-                   centre_of_bbox,
-                   measure_dist)
+                   get_foot_positions,
+                   get_closest_keypoint_indices,
+                   measure_xy_dists,
+                   centres_of_bboxes,
+                   measure_dists,
+                   sliding_window_max,
+                   timed)
+from tracks import TrackStore
+
+#Window of frames (before,after) used to find the height of a player in pixels
+HEIGHT_WINDOW_BEFORE = 20
+HEIGHT_WINDOW_AFTER = 50
+
+#Max distance (minimap pixels) of a keypoint from the fitted homography to still count as an inlier
+HOMOGRAPHY_REPROJECTION_THRESHOLD = 10.0
+
+#Height in meters of each player, used as the scale between the frame and the court
+PLAYER_HEIGHTS = {
+    1: constants.PLAYER_1_HEIGHT,
+    2: constants.PLAYER_2_HEIGHT}
+#Height of the players whose track id is not in PLAYER_HEIGHTS (tracks that are lost and found again get a new id)
+DEFAULT_PLAYER_HEIGHT = (constants.PLAYER_1_HEIGHT+constants.PLAYER_2_HEIGHT)/2
+
+#Court keypoints the players and the ball are placed relative to, without --homography: left corners of the doubles
+#court on the top (0) and bottom (2) baselines, middles of the top (12) and bottom (13) service lines.
+#They are not used to fit a homography (fit_homography uses all 14 keypoints), the closest one is picked in y only
+#and the offset from it is scaled with the height of the player. So what matters is that they are at the four depths
+#of the court lines a player stands near, that 12 and 13 are both on the centre line does not make the placement unstable
+REFERENCE_KEYPOINTS = [0,2,12,13]
+
+def get_player_heights(track_ids):
+    """
+    Args:
+        track_ids (list): Track ids of players
+    Returns:
+        array: (N,) height in meters of each player, DEFAULT_PLAYER_HEIGHT for the ids not in PLAYER_HEIGHTS
+    """
+    return np.array([PLAYER_HEIGHTS.get(track_id,DEFAULT_PLAYER_HEIGHT) for track_id in track_ids],np.float64)
 
 class DrawMinimap():
     """
@@ -26,10 +59,13 @@ class DrawMinimap():
         self.buffer = 50
         self.padding = 20
 
+        self.alpha = 0.2 #Transparency factor of the background
+
         self.background_position(frame)
         self.minimap_position()
         self.draw_court_keypoints()
         self.define_court_lines()
+        self.build_static_layer(frame)
     
     def background_position(self,frame):
         """
@@ -137,30 +173,67 @@ class DrawMinimap():
            (12,13)
         ]
 
+    def build_static_layer(self,frame):
+        """
+        Pre-render the parts of the minimap that are the same on every frame (background, court lines, net and keypoints)
+        so that each frame only has to blend them into the minimap region
+        Args:
+            frame (array): Input frame
+        """
+        frame_h,frame_w = frame.shape[:2]
+
+        #Region of the frame covered by the background (cv.rectangle includes the end point)
+        self.roi_x_start = max(self.x_backgnd_start_pos,0)
+        self.roi_y_start = max(self.y_backgnd_start_pos,0)
+        self.roi_x_end = min(self.x_backgnd_end_pos+1,frame_w)
+        self.roi_y_end = min(self.y_backgnd_end_pos+1,frame_h)
+
+        #Draw the court lines on a black and on a white frame, pixels that end up the same in both are court lines
+        layers = []
+        for fill in (0,255):
+            canvas = np.full(frame.shape,fill,np.uint8)
+            self.draw_court_lines(canvas)
+            layers.append(canvas[self.roi_y_start:self.roi_y_end,self.roi_x_start:self.roi_x_end])
+
+        self.court_lines_layer = layers[0].copy()
+        self.court_lines_mask = np.all(layers[0] == layers[1],axis=2).astype(np.uint8)
+        self.background_layer = np.full_like(self.court_lines_layer,255)
+
+    def get_minimap_roi(self,frame):
+        """
+        Get the region of the frame covered by the minimap
+        Args:
+            frame (array): Input frame
+        Returns:
+            roi (array): View of the frame (changes to it change the frame)
+        """
+        return frame[self.roi_y_start:self.roi_y_end,self.roi_x_start:self.roi_x_end]
+
     def draw_background(self,frame):
         """
-        Draw minimap background
+        Draw minimap background, only the minimap region of the frame is changed (in place)
         Args:
             frame (array): Input frame
         Returns:
-            transparent_backgnd (array): Returns the frame with minimap background
+            frame (array): Returns the frame with minimap background
         """
-        frame_copy = frame.copy()
-        background = np.zeros_like(frame,np.uint8)
+        roi = self.get_minimap_roi(frame)
+        cv.addWeighted(roi,1-self.alpha,self.background_layer,self.alpha,0,dst=roi)
 
-        #Draw background
-        cv.rectangle(background,
-                     (self.x_backgnd_start_pos,self.y_backgnd_start_pos),
-                     (self.x_backgnd_end_pos,self.y_backgnd_end_pos),
-                     (255,255,255),
-                     -1)
-        
-        alpha = 0.2 #Transparency factor
+        return frame
 
-        transparent_backgnd = cv.addWeighted(frame_copy,1-alpha,background,alpha,0)
-        #transparent_backgnd = cv.cvtColor(transparent_backgnd,cv.COLOR_BGR2RGB)
+    def draw_static_layer(self,frame):
+        """
+        Draw the pre-rendered minimap (background, court lines, net and keypoints) on the frame in place
+        Args:
+            frame (array): Input frame
+        Returns:
+            frame (array): Returns the frame with the minimap
+        """
+        frame = self.draw_background(frame)
+        cv.copyTo(self.court_lines_layer,self.court_lines_mask,self.get_minimap_roi(frame))
 
-        return transparent_backgnd
+        return frame
     
     def draw_court_lines(self,frame):
         """
@@ -230,8 +303,7 @@ class DrawMinimap():
         output_frames = []
 
         for i, frame in enumerate(frames):
-            frame = self.draw_background(frame)
-            frame = self.draw_court_lines(frame)
+            frame = self.draw_static_layer(frame)
             output_frames.append(frame)
 
         return output_frames
@@ -270,6 +342,111 @@ class DrawMinimap():
         
         return minimap_play_pos
 
+    def get_minimap_coors(self,positions,original_court_keypoints,player_heights_pixels,player_heights_meters):
+        """
+        Batch version of get_minimap_coor, the points are placed relative to their closest reference keypoint
+        Args:
+            positions (array): (N,2) array of positions in the frame
+            original_court_keypoints (list): List of court keypoints
+            player_heights_pixels (array): (N,) height in pixels of the player used as the scale of each point
+            player_heights_meters (array): (N,) height in meters of the same players
+        Returns:
+            minimap_positions (array): (N,2) array of minimap coordinates
+        """
+        keypoint_indices = get_closest_keypoint_indices(positions,original_court_keypoints,REFERENCE_KEYPOINTS)
+        closest_keypoints = np.asarray(original_court_keypoints,np.float64).reshape(-1,2)[keypoint_indices]
+
+        #Distance to the closest keypoint in pixels, converted to meters, then to minimap pixels
+        dist_from_keypoint_pixels = measure_xy_dists(positions,closest_keypoints)
+        dist_from_keypoint_meters = convert_pixels_to_meters(dist_from_keypoint_pixels,
+                                                             player_heights_meters[:,np.newaxis],
+                                                             player_heights_pixels[:,np.newaxis])
+        minimap_dist_pixels = self.convert_meters_to_pixels(dist_from_keypoint_meters)
+        closest_minimap_keypoints = np.asarray(self.draw_keypoints,np.float64).reshape(-1,2)[keypoint_indices]
+
+        return closest_minimap_keypoints + minimap_dist_pixels
+
+    @timed("minimap")
+    def convert_frame_to_minimap_coor(self,player_bbox,ball_dict,original_court_keypoints,max_player_heights):
+        """
+        Convert player and ball bounding box of a single frame to minimap coordinates
+        Args:
+            player_bbox (dict): Dictionary with player id and bounding box coordinates
+            ball_dict (dict): Dictionary with ball id and bounding box coordinates
+            original_court_keypoints (list): List of court keypoints
+            max_player_heights (dict): Dictionary with player id and their max height in pixels around this frame
+        Returns:
+            output_player_bbox_dict (dict): Returns the dictionary with player id and minimap coordinates
+            output_ball_bbox_dict (dict): Returns the dictionary with ball id and minimap coordinates
+        """
+        if len(player_bbox) == 0:
+            return {},{}
+
+        track_ids = list(player_bbox.keys())
+        player_bboxes = np.array(list(player_bbox.values()),np.float64)
+        player_heights_pixels = np.array([max_player_heights[player_id] for player_id in track_ids],np.float64)
+        player_heights_meters = get_player_heights(track_ids)
+
+        player_positions = self.get_minimap_coors(get_foot_positions(player_bboxes),
+                                                  original_court_keypoints,
+                                                  player_heights_pixels,
+                                                  player_heights_meters)
+        output_player_bbox_dict = dict(zip(track_ids,map(tuple,player_positions.tolist())))
+
+        #The ball is scaled with the height of the player closest to it
+        output_ball_bbox_dict = {}
+        ball_box = ball_dict.get(1,[])
+        if len(ball_box) > 0:
+            ball_position = centres_of_bboxes(ball_box)
+            closest = int(np.argmin(measure_dists(ball_position,centres_of_bboxes(player_bboxes))[0]))
+            ball_positions = self.get_minimap_coors(ball_position,
+                                                    original_court_keypoints,
+                                                    player_heights_pixels[closest:closest+1],
+                                                    player_heights_meters[closest:closest+1])
+            output_ball_bbox_dict[1] = tuple(ball_positions[0].tolist())
+
+        return output_player_bbox_dict,output_ball_bbox_dict
+
+    def get_max_player_heights(self,player_boxes):
+        """
+        Get the max height in pixels of each player over the frames around each frame
+        (HEIGHT_WINDOW_BEFORE frames before to HEIGHT_WINDOW_AFTER frames after, frames where the player is missing are skipped)
+        Args:
+            player_boxes (list): List of dictionaries with player id and bounding box coordinates
+        Returns:
+            max_player_heights (list): List of dictionaries with player id and max height in pixels, one per frame
+        """
+        store = TrackStore.from_dicts(player_boxes,bbox_dtype=np.float64)
+        max_heights = self.get_max_track_heights(store)
+
+        max_player_heights = []
+        for frame_num in range(len(player_boxes)):
+            rows = store.frame_rows(frame_num)
+            max_player_heights.append(dict(zip(store.track_id[rows].tolist(),max_heights[rows].tolist())))
+
+        return max_player_heights
+
+    def get_max_track_heights(self,store):
+        """
+        Same as get_max_player_heights on a TrackStore
+        Args:
+            store (TrackStore): Detections of the players
+        Returns:
+            max_heights (array): (N,) max height in pixels for each row of the store
+        """
+        heights = store.bbox[:,3] - store.bbox[:,1] #max y - min y
+        max_heights = np.empty(len(store))
+
+        #Sliding max over each track, with the frames the track is missing in set to -inf
+        for n in range(len(store.track_ids)):
+            rows = store.track_order[store.track_offsets[n]:store.track_offsets[n+1]]
+            frames = store.frame_index[rows] - store.frame_index[rows[0]]
+            track_heights = np.full(frames[-1]+1,-np.inf)
+            track_heights[frames] = heights[rows]
+            max_heights[rows] = sliding_window_max(track_heights,HEIGHT_WINDOW_BEFORE,HEIGHT_WINDOW_AFTER-1)[frames]
+
+        return max_heights
+
     def convert_bbox_to_minimap_coor(self,player_boxes,ball_boxes,original_court_keypoints):
         """
         Convert player and ball bounding box to minimap coordinates
@@ -281,56 +458,162 @@ class DrawMinimap():
             output_player_bbox (list): Returns the list of dictionaries with player id and minimap coordinates
             output_ball_bbox (list): Returns the list of dictionaries with ball id and minimap coordinates
         """
-        player_height = {
-            1: constants.PLAYER_1_HEIGHT,
-            2: constants.PLAYER_2_HEIGHT}
+        players = TrackStore.from_dicts(player_boxes,bbox_dtype=np.float64)
+        output_player_bbox = [{} for _ in player_boxes]
+        output_ball_bbox = [{} for _ in ball_boxes]
+        if len(players) == 0:
+            return output_player_bbox,output_ball_bbox
+
+        #Get player height in pixels (around each frame) and in meters, for every detection at once
+        max_heights = self.get_max_track_heights(players)
+        track_ids,track_index = np.unique(players.track_id,return_inverse=True)
+        player_heights_meters = get_player_heights(track_ids.tolist())[track_index]
+
+        player_positions = self.get_minimap_coors(get_foot_positions(players.bbox),
+                                                  original_court_keypoints,
+                                                  max_heights,
+                                                  player_heights_meters).tolist()
+        for frame_num in range(len(player_boxes)):
+            rows = players.frame_rows(frame_num)
+            output_player_bbox[frame_num] = dict(zip(players.track_id[rows].tolist(),map(tuple,player_positions[rows])))
+
+        #Centre of the ball of the frame of each detection (nan when there is no ball)
+        ball_centres = np.full((len(player_boxes),2),np.nan)
+        ball_frames = [frame_num for frame_num,ball_dict in enumerate(ball_boxes[:len(player_boxes)]) if len(ball_dict.get(1,[])) > 0]
+        if len(ball_frames) > 0:
+            ball_centres[ball_frames] = centres_of_bboxes([ball_boxes[frame_num][1] for frame_num in ball_frames])
+        row_ball_centres = ball_centres[players.frame_index]
+        has_ball = ~np.isnan(row_ball_centres[:,0])
+
+        #Player closest to the ball in each frame (the first one on a tie), the ball is scaled with its height
+        rows = np.flatnonzero(has_ball)
+        dists = np.sum((centres_of_bboxes(players.bbox[rows]) - row_ball_centres[rows])**2,axis=1)**0.5
+        order = rows[np.lexsort((rows,dists,players.frame_index[rows]))]
+        _,first = np.unique(players.frame_index[order],return_index=True)
+        closest_rows = order[first]
+
+        ball_positions = self.get_minimap_coors(row_ball_centres[closest_rows],
+                                                original_court_keypoints,
+                                                max_heights[closest_rows],
+                                                player_heights_meters[closest_rows]).tolist()
+        for frame_num,position in zip(players.frame_index[closest_rows].tolist(),ball_positions):
+            output_ball_bbox[frame_num][1] = tuple(position)
+
+        print(f"{output_player_bbox[-1]}")
+        return output_player_bbox,output_ball_bbox
+
+    def fit_homography(self,original_court_keypoints):
+        """
+        Fit the homography that maps the court keypoints in the video to the keypoints of the minimap
+        Args:
+            original_court_keypoints (list): List of court keypoints
+        Returns:
+            homography (array): 3x3 matrix from frame coordinates to minimap coordinates
+        """
+        src_points = np.asarray(original_court_keypoints,np.float64).reshape(-1,2)
+        dst_points = np.asarray(self.draw_keypoints,np.float64).reshape(-1,2)
+
+        #RANSAC so that a single badly detected keypoint does not skew the whole court
+        homography,_ = cv.findHomography(src_points,dst_points,cv.RANSAC,HOMOGRAPHY_REPROJECTION_THRESHOLD)
+        if homography is None:
+            raise ValueError("Could not fit a homography to the court keypoints")
+
+        self.homography = homography
+        return homography
+
+    def project_points(self,points):
+        """
+        Project points of the frame onto the minimap with the fitted homography
+        Args:
+            points (array): Array of shape (N,2) with the (x,y) coordinates in the frame
+        Returns:
+            minimap_points (array): Array of shape (N,2) with the (x,y) coordinates on the minimap
+        """
+        points = np.asarray(points,np.float64).reshape(-1,1,2)
+        if len(points) == 0:
+            return np.empty((0,2))
+
+        return cv.perspectiveTransform(points,self.homography).reshape(-1,2)
+
+    @timed("minimap")
+    def project_frame_to_minimap_coor(self,player_bbox,ball_dict):
+        """
+        Convert player and ball bounding box of a single frame to minimap coordinates with the fitted homography
+        Args:
+            player_bbox (dict): Dictionary with player id and bounding box coordinates
+            ball_dict (dict): Dictionary with ball id and bounding box coordinates
+        Returns:
+            output_player_bbox_dict (dict): Returns the dictionary with player id and minimap coordinates
+            output_ball_bbox_dict (dict): Returns the dictionary with ball id and minimap coordinates
+        """
+        player_minimap,ball_minimap = self.project_bbox_to_minimap_coor([player_bbox],[ball_dict])
+
+        return player_minimap[0],ball_minimap[0]
+
+    def project_bbox_to_minimap_coor(self,player_boxes,ball_boxes):
+        """
+        Convert player and ball bounding box to minimap coordinates with the fitted homography,
+        the feet of the players and the centre of the ball for the whole video are projected in one call
+        Args:
+            player_boxes (list): List of dictionaries with player id and bounding box coordinates
+            ball_boxes (list): List of dictionaries with ball id and bounding box coordinates
+        Returns:
+            output_player_bbox (list): Returns the list of dictionaries with player id and minimap coordinates
+            output_ball_bbox (list): Returns the list of dictionaries with ball id and minimap coordinates
+        """
+        players = TrackStore.from_dicts(player_boxes,bbox_dtype=np.float64)
+        ball_frames = [frame_num for frame_num,ball_dict in enumerate(ball_boxes) if len(ball_dict.get(1,[])) > 0]
+        ball_bbox = np.array([ball_boxes[frame_num][1] for frame_num in ball_frames],np.float64).reshape(-1,4)
+
+        #Foot position of the players (centre of the bottom of the bbox) and centre of the ball
+        foot_positions = np.column_stack(((players.bbox[:,0]+players.bbox[:,2])/2,players.bbox[:,3]))
+        ball_positions = np.column_stack(((ball_bbox[:,0]+ball_bbox[:,2])/2,(ball_bbox[:,1]+ball_bbox[:,3])/2))
+
+        minimap_positions = self.project_points(np.concatenate((foot_positions,ball_positions))).tolist()
+        minimap_players = minimap_positions[:len(players)]
+        minimap_balls = minimap_positions[len(players):]
 
+        output_player_bbox = []
+        for frame_num in range(len(player_boxes)):
+            rows = players.frame_rows(frame_num)
+            output_player_bbox.append(dict(zip(players.track_id[rows].tolist(),map(tuple,minimap_players[rows]))))
+
+        output_ball_bbox = [{} for _ in ball_boxes]
+        for frame_num,position in zip(ball_frames,minimap_balls):
+            output_ball_bbox[frame_num][1] = tuple(position)
+
+        return output_player_bbox,output_ball_bbox
+
+    @timed("minimap")
+    def convert_segments_to_minimap_coor(self,player_boxes,ball_boxes,court_segments,homography=False):
+        """
+        Convert player and ball bounding box to minimap coordinates when the court moves during the video,
+        each range of frames is converted with its own court keypoints
+        Args:
+            player_boxes (list): List of dictionaries with player id and bounding box coordinates
+            ball_boxes (list): List of dictionaries with ball id and bounding box coordinates
+            court_segments (list): List of (first frame number, court keypoints), sorted by frame number
+            homography (bool): Project with a homography fitted to the keypoints of each range
+        Returns:
+            output_player_bbox (list): Returns the list of dictionaries with player id and minimap coordinates
+            output_ball_bbox (list): Returns the list of dictionaries with ball id and minimap coordinates
+        """
         output_player_bbox = []
         output_ball_bbox = []
 
-        for frame_num, player_bbox in enumerate(player_boxes):
-            ball_box = ball_boxes[frame_num][1]
-            ball_position = centre_of_bbox(ball_box)
-
-            #Measures the dist btwn center of the player bounding box and the ball position and return the key of the minimun distance calculated
-            closest_player_id_to_ball = min(player_bbox.keys(),key=lambda x:measure_dist(ball_position,centre_of_bbox(player_bbox[x])))
-
-            output_player_bbox_dict = {}
-            for player_id, bbox in player_bbox.items():
-                foot_position = get_foot_position(bbox)
-
-                #Get closest court keypoints in pixels
-                closest_keypoint_index = get_closest_keypoint_index(foot_position,original_court_keypoints,[0,2,12,13])
-                closest_keypoint = (original_court_keypoints[closest_keypoint_index*2],original_court_keypoints[closest_keypoint_index*2+1])
-
-                #Get player height in pixels
-                frame_idx_min = max(0,frame_num-20)
-                frame_idx_max = min(len(player_boxes),frame_num+50)
-                bbox_height_in_pixels = [get_height_of_bbox(player_boxes[i][player_id]) for i in range(frame_idx_min,frame_idx_max)]
-                max_player_height_pixels = max(bbox_height_in_pixels)
-                minimap_player_pos = self.get_minimap_coor(foot_position,
-                                                           closest_keypoint,
-                                                           closest_keypoint_index,
-                                                           max_player_height_pixels,
-                                                           player_height[player_id])
-                
-                output_player_bbox_dict[player_id] = minimap_player_pos
-
-                if closest_player_id_to_ball == player_id:
-                    #Get closest court keypoints in pixels
-                    closest_keypoint_index = get_closest_keypoint_index(ball_position,original_court_keypoints,[0,2,12,13])
-                    closest_keypoint = (original_court_keypoints[closest_keypoint_index*2],original_court_keypoints[closest_keypoint_index*2+1])
-
-                    minimap_ball_pos = self.get_minimap_coor(ball_position,
-                                                               closest_keypoint,
-                                                               closest_keypoint_index,
-                                                               max_player_height_pixels,
-                                                               player_height[player_id])
-                    
-                    output_ball_bbox.append({1:minimap_ball_pos})
-            output_player_bbox.append(output_player_bbox_dict)
+        segment_ends = [start_frame for start_frame,_ in court_segments[1:]] + [len(player_boxes)]
+        for (start_frame,keypoints),end_frame in zip(court_segments,segment_ends):
+            if homography:
+                self.fit_homography(keypoints)
+                player_minimap,ball_minimap = self.project_bbox_to_minimap_coor(player_boxes[start_frame:end_frame],
+                                                                                ball_boxes[start_frame:end_frame])
+            else:
+                player_minimap,ball_minimap = self.convert_bbox_to_minimap_coor(player_boxes[start_frame:end_frame],
+                                                                                ball_boxes[start_frame:end_frame],
+                                                                                keypoints)
+            output_player_bbox.extend(player_minimap)
+            output_ball_bbox.extend(ball_minimap)
 
-        print(f"{output_player_bbox_dict}")
         return output_player_bbox,output_ball_bbox
 
     def draw_points_on_minimap(self,frames,positions,colour):
@@ -0,0 +1,6 @@
+from .stream import StreamPipeline
+from .live import LivePipeline
+from .threaded import ThreadedPipeline
+from .startup import ModelLoader,get_model
+from .sharded import ShardedDetector
+from .batch import BatchRunner,list_jobs,run_batch
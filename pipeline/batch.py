@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from trackers import TrackPlayer,TrackBall
+from court_line_detector import LineDetector
+from detection_cache import DetectionCache,hash_file,hash_model
+from .stream import StreamPipeline
+from .threaded import ThreadedPipeline
+from .startup import limit_worker_threads
+
+VIDEO_EXTENSIONS = (".mp4",".avi",".mov",".mkv")
+
+def list_jobs(source,output_dir):
+    """
+    List the videos to process and where to write each one
+    Args:
+        source (str): Directory of videos, or a manifest file with one video path per line
+                      (relative to the manifest, lines starting with # are ignored)
+        output_dir (str): Directory of the annotated videos
+    Returns:
+        jobs (list): List of (input video path, output video path)
+    Raises:
+        ValueError: If two videos would be written to the same output video (same name with another extension,
+                    or in another directory of the manifest)
+    """
+    if os.path.isdir(source):
+        video_paths = [os.path.join(source,file_name) for file_name in sorted(os.listdir(source))
+                       if file_name.lower().endswith(VIDEO_EXTENSIONS)]
+    else:
+        with open(source,"r") as f:
+            lines = [line.strip() for line in f]
+        manifest_dir = os.path.dirname(os.path.abspath(source))
+        video_paths = [os.path.join(manifest_dir,line) for line in lines if line and not line.startswith("#")]
+
+    jobs = [(video_path,os.path.join(output_dir,os.path.splitext(os.path.basename(video_path))[0]+".avi"))
+            for video_path in video_paths]
+
+    #Two jobs writing the same output would overwrite each other, and each would look up to date for the other
+    videos_by_output = {}
+    for video_path,output_path in jobs:
+        videos_by_output.setdefault(output_path,[]).append(video_path)
+    collisions = [video_list for video_list in videos_by_output.values() if len(video_list) > 1]
+    if collisions:
+        raise ValueError("Videos with the same output name: " + "; ".join(", ".join(video_list) for video_list in collisions))
+
+    return jobs
+
+class BatchRunner:
+    """
+    Annotates videos one after the other with the same models, which are loaded once and stay resident
+    """
+    def __init__(self,keypoints_model_path,player_params,ball_params,cache_dir,batch_size=1,pipelined=False,homography=False,track_court=False):
+        """
+        Args:
+            keypoints_model_path (str): Court keypoints model
+            player_params (dict): Arguments of TrackPlayer
+            ball_params (dict): Arguments of TrackBall
+            cache_dir (str): Directory of the detection cache (also remembers the file digests)
+            batch_size (int): Number of frames sent to the detectors in one call
+            pipelined (bool): Run the stages of each video on separate threads
+            homography (bool): Project onto the minimap with a homography of the court
+            track_court (bool): Detect the court again whenever the camera moves
+        """
+        self.keypoints_model_path = keypoints_model_path
+        self.player_params = player_params
+        self.ball_params = ball_params
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.pipelined = pipelined
+        self.homography = homography
+        self.track_court = track_court
+
+        #The YOLO weights are only loaded by the first video that is not fully cached
+        self.keypoints_detector = LineDetector(keypoints_model_path)
+        self.player_tracker = TrackPlayer(**player_params)
+        self.ball_tracker = TrackBall(**ball_params)
+
+    def job_key(self,video_path):
+        """
+        Hash of everything the annotated video depends on: the video, the models and the options
+        Args:
+            video_path (str): Path to the input video
+        Returns:
+            key (str): Hex digest
+        """
+        key_content = json.dumps({
+            "video": hash_file(video_path,self.cache_dir),
+            "models": [hash_model(model_path,self.cache_dir) for model_path in (self.keypoints_model_path,
+                                                                                self.player_tracker.model_path,
+                                                                                self.ball_tracker.model_path)],
+            "player_params": self.player_tracker.cache_params,
+            "ball_params": self.ball_tracker.cache_params,
+            "homography": self.homography,
+            "track_court": self.track_court
+        },sort_keys=True)
+
+        return hashlib.blake2b(key_content.encode(),digest_size=20).hexdigest()
+
+    def is_up_to_date(self,output_path,key):
+        """
+        Returns:
+            bool: True if the output video exists and was made from the same video, models and options
+        """
+        info_path = output_path + ".json"
+        if not os.path.exists(output_path) or not os.path.exists(info_path):
+            return False
+        with open(info_path,"r") as f:
+            return json.load(f).get("key") == key
+
+    def run_job(self,video_path,output_path,force=False):
+        """
+        Annotate one video
+        Args:
+            video_path (str): Path to the input video
+            output_path (str): Path of the annotated video
+            force (bool): Process the video even if its output is up to date
+        Returns:
+            report (dict): Video, number of frames, time and throughput of the job
+        """
+        start_time = time.perf_counter()
+        key = self.job_key(video_path)
+        if not force and self.is_up_to_date(output_path,key):
+            return {"video": video_path,"skipped": True,"frames": 0,"seconds": time.perf_counter()-start_time,"fps": 0.0}
+
+        #Same models, new tracks
+        self.player_tracker.reset()
+        self.ball_tracker.reset()
+        player_cache = DetectionCache(self.cache_dir,video_path,self.player_tracker.model_path,self.player_tracker.cache_params)
+        ball_cache = DetectionCache(self.cache_dir,video_path,self.ball_tracker.model_path,self.ball_tracker.cache_params)
+
+        pipeline_class = ThreadedPipeline if self.pipelined else StreamPipeline
+        stream_pipeline = pipeline_class(self.keypoints_detector,
+                                         self.player_tracker,
+                                         self.ball_tracker,
+                                         batch_size=self.batch_size,
+                                         homography=self.homography,
+                                         track_court=self.track_court)
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)),exist_ok=True)
+        frame_count = stream_pipeline.run(video_path,output_path,player_cache=player_cache,ball_cache=ball_cache)
+
+        #Written last, an interrupted job is done again on the next run
+        temp_path = f"{output_path}.json.{os.getpid()}.tmp"
+        with open(temp_path,"w") as f:
+            json.dump({"key": key,"video": video_path,"frames": frame_count},f)
+        os.replace(temp_path,output_path + ".json")
+
+        total_time = time.perf_counter()-start_time
+        return {"video": video_path,"skipped": False,"frames": frame_count,"seconds": total_time,"fps": frame_count/total_time}
+
+#BatchRunner of each worker process
+_worker_runner = None
+
+def init_batch_worker(runner_params,threads):
+    """
+    Load the models of a worker process once, they are used by every job of this worker
+    """
+    global _worker_runner
+    limit_worker_threads(threads)
+    _worker_runner = BatchRunner(**runner_params)
+
+def run_worker_job(video_path,output_path,force):
+    return _worker_runner.run_job(video_path,output_path,force)
+
+def run_batch(jobs,runner_params,workers=1,force=False):
+    """
+    Annotate a list of videos on a pool of worker processes
+    Args:
+        jobs (list): List of (input video path, output video path)
+        runner_params (dict): Arguments of BatchRunner
+        workers (int): Number of worker processes, each with its own models (1 runs the jobs in this process)
+        force (bool): Process the videos even if their outputs are up to date
+    Returns:
+        reports (list): Report of each job, in the order of the jobs
+        summary (dict): Number of jobs done, skipped and failed, total frames, time and throughput
+    """
+    start_time = time.perf_counter()
+    reports = []
+
+    #A video that fails (unreadable, disk full...) is reported and the other videos are still processed
+    if workers <= 1:
+        runner = BatchRunner(**runner_params)
+        for video_path,output_path in jobs:
+            job_start = time.perf_counter()
+            try:
+                reports.append(runner.run_job(video_path,output_path,force))
+            except Exception as error:
+                reports.append(get_failed_report(video_path,error,time.perf_counter()-job_start))
+            print_report(reports[-1])
+    else:
+        threads = max(1,(os.cpu_count() or 1)//workers)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers,mp_context=context,initializer=init_batch_worker,initargs=(runner_params,threads)) as executor:
+            futures = [executor.submit(run_worker_job,video_path,output_path,force) for video_path,output_path in jobs]
+            for (video_path,output_path),future in zip(jobs,futures):
+                try:
+                    reports.append(future.result())
+                except Exception as error:
+                    ##Also a worker process that died, the jobs of the other workers go on
+                    reports.append(get_failed_report(video_path,error,time.perf_counter()-start_time))
+                print_report(reports[-1])
+
+    total_time = time.perf_counter()-start_time
+    frame_count = sum(report["frames"] for report in reports)
+    summary = {
+        "jobs": len(reports),
+        "skipped": sum(report["skipped"] for report in reports),
+        "failed": sum("error" in report for report in reports),
+        "frames": frame_count,
+        "seconds": total_time,
+        "fps": frame_count/total_time if total_time > 0 else 0.0
+    }
+    print(f"{summary['jobs']} videos ({summary['skipped']} up to date, {summary['failed']} failed), {frame_count} frames in {total_time:.1f}s, {summary['fps']:.1f} fps overall")
+
+    return reports,summary
+
+def get_failed_report(video_path,error,seconds):
+    """
+    Report of a job that raised an exception
+    Args:
+        video_path (str): Path to the input video
+        error (Exception): Exception raised by the job
+        seconds (float): Time until the job failed
+    Returns:
+        report (dict): Same keys as the report of BatchRunner.run_job, and the error
+    """
+    return {"video": video_path,"skipped": False,"frames": 0,"seconds": seconds,"fps": 0.0,"error": f"{type(error).__name__}: {error}"}
+
+def print_report(report):
+    """
+    Print the result of one job
+    """
+    if "error" in report:
+        print(f"{report['video']}: failed, {report['error']}")
+    elif report["skipped"]:
+        print(f"{report['video']}: up to date, skipped")
+    else:
+        print(f"{report['video']}: {report['frames']} frames in {report['seconds']:.1f}s ({report['fps']:.1f} fps)")
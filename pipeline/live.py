@@ -0,0 +1,214 @@
+import os
+import time
+import threading
+import cv2 as cv
+from utils import FramePool,get_frame_shape,profile_stage
+from .stream import StreamPipeline
+
+#Max time (s) from the capture of a frame to its output. A frame is dropped before it is processed when the time it
+#already waited plus the expected processing time is over the budget
+LATENCY_BUDGET = 0.5
+#Weight of the newest frame in the moving average of the processing time
+PROCESSING_TIME_SMOOTHING = 0.2
+
+class LatestFrameReader:
+    """
+    Reads a live source on its own thread and only keeps the newest frame. When the frames are not taken
+    fast enough the older ones are overwritten (and counted as dropped) instead of piling up in a queue
+    """
+    def __init__(self,source,realtime=None,frame_pool=None):
+        """
+        Args:
+            source (int|str): Camera index, stream URL (RTSP/HTTP) or video file
+            realtime (bool): Read at the native frame rate of the source, so that a file behaves like a camera
+                             (default: True for files, cameras and streams already deliver frames in real time)
+            frame_pool (FramePool): Pool the frames are read into (a new array per frame if None). Overwritten frames
+                                    are released by the reader, the frames returned by read() belong to the caller
+        """
+        self.capture = cv.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise ValueError(f"Cannot open video source {source}")
+        if realtime is None:
+            realtime = isinstance(source,str) and os.path.isfile(source)
+        self.realtime = realtime
+        self.fps = self.capture.get(cv.CAP_PROP_FPS) or 30 #Cameras and streams may not report it
+        self.frame_interval = 1/self.fps
+        self.frame_pool = frame_pool
+
+        self.condition = threading.Condition()
+        self.latest = None #(capture time, frame) not taken yet
+        self.finished = False
+        self.dropped_frames = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.read_frames,daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def read_frames(self):
+        """
+        Read the source until it ends or the reader is stopped (runs on the reader thread)
+        """
+        start_time = time.perf_counter()
+        frame_count = 0
+        shape = get_frame_shape(self.capture)
+        try:
+            while not self.stop_event.is_set():
+                if self.realtime:
+                    #Wait until the frame would have arrived from a camera
+                    delay = start_time + frame_count*self.frame_interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                buffer = self.frame_pool.acquire(shape) if self.frame_pool is not None and shape is not None else None
+                ret,frame = self.capture.read(image=buffer)
+                if self.frame_pool is not None and frame is not buffer:
+                    if buffer is not None:
+                        self.frame_pool.release(buffer)
+                    if ret:
+                        shape = frame.shape
+                if not ret:
+                    break
+                frame_count += 1
+
+                with self.condition:
+                    if self.latest is not None:
+                        self.dropped_frames += 1
+                        self.release(self.latest[1])
+                    self.latest = (time.perf_counter(),frame)
+                    self.condition.notify()
+        finally:
+            self.capture.release()
+            with self.condition:
+                self.finished = True
+                self.condition.notify()
+
+    def read(self):
+        """
+        Wait for the next frame
+        Returns:
+            item (tuple): (capture time, frame) of the newest frame, None at the end of the source
+        """
+        with self.condition:
+            while self.latest is None and not self.finished:
+                self.condition.wait()
+            item = self.latest
+            self.latest = None
+            return item
+
+    def release(self,frame):
+        """
+        Give a frame back to the pool once it is not used anymore (does nothing without a pool)
+        """
+        if self.frame_pool is not None and self.frame_pool.owns(frame):
+            self.frame_pool.release(frame)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+class LivePipeline(StreamPipeline):
+    """
+    Annotates a live source as the frames arrive. Every frame is annotated as soon as it is detected
+    (no look-ahead: the ball is held at its last position while it is not seen and the player heights only
+    come from past frames), and frames are dropped when the detectors cannot keep up with the source
+    """
+    def __init__(self,keypoints_detector,player_tracker,ball_tracker,latency_budget=LATENCY_BUDGET,**kwargs):
+        """
+        Args:
+            keypoints_detector (LineDetector): Court keypoints detector
+            player_tracker (TrackPlayer): Player tracker
+            ball_tracker (TrackBall): Ball tracker
+            latency_budget (float): Max time (s) from the capture of a frame to its output. A frame is dropped when its
+                                    wait plus the moving average of the processing time is over the budget
+                                    (unless the processing alone is over it, then the newest frame is always taken)
+            **kwargs: homography, track_court and reuse_frames, see StreamPipeline
+        """
+        super().__init__(keypoints_detector,player_tracker,ball_tracker,show_fps=True,**kwargs)
+        self.look_ahead = 0
+        self.batch_size = 1
+        self.latency_budget = latency_budget
+        self.dropped_frames = 0
+        self.latencies = []
+        self.processing_time = 0.0 #Moving average of the time (s) from the start of the processing of a frame to its output
+
+    def should_drop(self,wait):
+        """
+        Args:
+            wait (float): Time (s) the frame already waited since its capture
+        Returns:
+            bool: True if the frame would be output after the latency budget while the next frame would not
+        """
+        return wait+self.processing_time > self.latency_budget and self.processing_time <= self.latency_budget
+
+    def run(self,source,output_video_path=None,display=True,max_frames=None):
+        """
+        Annotate the source until it ends, max_frames are done, or q is pressed in the window
+        Args:
+            source (int|str): Camera index, stream URL (RTSP/HTTP) or video file (played at its native rate)
+            output_video_path (str): Path to save the annotated video at the frame rate of the source (not saved if None).
+                                     Dropped frames are not written, so the saved video is shorter when frames were dropped
+            display (bool): Show the annotated frames in a window
+            max_frames (int): Stop after this many annotated frames (no limit if None)
+        Returns:
+            frame_count (int): Number of frames annotated
+        """
+        self.frame_count = 0
+        self.first_frame_time = None
+        self.dropped_frames = 0
+        self.latencies = []
+        self.processing_time = 0.0
+
+        #A frame in the reader, one waiting to be taken and the one being annotated
+        self.frame_pool = FramePool(3) if self.reuse_frames else None
+        reader = LatestFrameReader(source,frame_pool=self.frame_pool).start()
+        writer = None
+        context = None
+        try:
+            while max_frames is None or self.frame_count < max_frames:
+                item = reader.read()
+                if item is None:
+                    break
+                capture_time,frame = item
+
+                #A frame that would be output late is dropped, the next one will be on time
+                start_time = time.perf_counter()
+                if self.should_drop(start_time-capture_time):
+                    self.dropped_frames += 1
+                    reader.release(frame)
+                    continue
+
+                if context is None:
+                    context = self.create_context(frame)
+                frame_num = context["next_frame_num"]
+                self.detect_court_changes([frame],frame_num,context)
+                player_dict = self.detect_players_on_court([frame],frame_num,context)[0]
+                ball_dict = self.detect_balls([frame],frame_num)[0]
+
+                for annotated_frame in self.push_frame(context,frame,player_dict,ball_dict):
+                    output_time = time.perf_counter()
+                    latency = output_time-capture_time
+                    self.latencies.append(latency)
+                    self.processing_time += PROCESSING_TIME_SMOOTHING*(output_time-start_time-self.processing_time)
+                    annotated_frame = context["renderer"].draw_live_stats(annotated_frame,latency,self.dropped_frames+reader.dropped_frames)
+
+                    if output_video_path is not None:
+                        if writer is None:
+                            frame_height,frame_width = annotated_frame.shape[:2]
+                            writer = cv.VideoWriter(output_video_path,cv.VideoWriter_fourcc(*'MJPG'),reader.fps,(frame_width,frame_height))
+                        with profile_stage("encode"):
+                            writer.write(annotated_frame)
+                    if display:
+                        cv.imshow("Tennis analysis",annotated_frame)
+                    reader.release(annotated_frame)
+                    if display and cv.waitKey(1) & 0xFF == ord("q"):
+                        return self.frame_count
+        finally:
+            reader.stop()
+            self.dropped_frames += reader.dropped_frames
+            if writer is not None:
+                writer.release()
+            if display:
+                cv.destroyAllWindows()
+
+        return self.frame_count
@@ -0,0 +1,218 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils import iter_video_frames,iter_batches,get_video_frame_count,get_frame_court_layout,FramePool
+from trackers import TrackPlayer,TrackBall
+from .startup import limit_worker_threads
+
+#Number of frames each segment also tracks before its start, to match its track ids with the previous segment
+SHARD_OVERLAP = 30
+#Number of frames each segment tracks before the overlap and throws away, so that its tracker state (Kalman filters,
+#keyframe and ball ROI phases) has settled by the time its tracks are linked and kept
+SHARD_WARM_UP = 30
+#Min mean IoU over the overlap for two tracks to be the same person
+MIN_LINK_IOU = 0.5
+
+def plan_shards(frame_count,shard_count,overlap=SHARD_OVERLAP,warm_up=SHARD_WARM_UP):
+    """
+    Split the video into consecutive segments
+    Args:
+        frame_count (int): Number of frames of the video
+        shard_count (int): Number of segments
+        overlap (int): Number of frames before its start each segment links to the previous segment on
+        warm_up (int): Number of frames each segment reads before the overlap (except the first one)
+    Returns:
+        shards (list): List of (first frame read, start frame, end frame) of each segment,
+                       the end frame of the last segment is None so that it reads to the end of the video
+    """
+    shard_count = max(1,min(shard_count,frame_count//max(overlap+warm_up,1)))
+    bounds = np.linspace(0,frame_count,shard_count+1).astype(int).tolist()
+
+    shards = []
+    for i in range(shard_count):
+        start,end = bounds[i],bounds[i+1]
+        shards.append((max(start-overlap-warm_up,0),start,end if i < shard_count-1 else None))
+
+    return shards
+
+def detect_shard(video_path,read_start,start,end,player_params,ball_params,court_layout=None,batch_size=1,court_layouts=None):
+    """
+    Detect and track the players and the ball on one segment of the video (runs in a worker process)
+    Args:
+        video_path (str): Path to the video
+        read_start (int): First frame read, the frames before start are only used to warm up the trackers and link the tracks
+        start (int): Start frame of the segment
+        end (int): End frame of the segment (end of the video if None)
+        player_params (dict): Arguments of TrackPlayer
+        ball_params (dict): Arguments of TrackBall
+        court_layout (dict): Dictionary of court description
+        batch_size (int): Number of frames sent to the detectors in one call
+        court_layouts (list): List of (first frame number, court layout) when the court moves during the video,
+                              used instead of court_layout
+    Returns:
+        player_detections (list): Player dictionaries of the frames from read_start, with the track ids of this segment
+        ball_detections (list): Ball dictionaries of the frames from start, not interpolated
+    """
+    player_tracker = TrackPlayer(**player_params)
+    ball_tracker = TrackBall(**ball_params)
+
+    #The segment is decoded one batch at a time into the same buffers, only its detections are kept
+    player_detections = []
+    ball_detections = []
+    frame_pool = FramePool(batch_size+1)
+    boundaries = [] if court_layouts is None else [start_frame-read_start for start_frame,_ in court_layouts if start_frame > read_start]
+    frame_num = read_start
+    for batch in iter_batches(iter_video_frames(video_path,read_start,end,frame_pool),batch_size,boundaries):
+        if court_layouts is not None:
+            court_layout = get_frame_court_layout(court_layouts,frame_num)
+        frame_num += len(batch)
+        player_detections.extend(player_tracker.detect_batch(batch,court_layout))
+        ball_detections.extend(ball_tracker.detect_batch(batch))
+        for frame in batch:
+            if frame_pool.owns(frame):
+                frame_pool.release(frame)
+
+    return player_detections,ball_detections[start-read_start:]
+
+def bbox_iou(bbox,other_bbox):
+    """
+    Returns:
+        float: Intersection over union of two [x1,y1,x2,y2] boxes
+    """
+    width = min(bbox[2],other_bbox[2]) - max(bbox[0],other_bbox[0])
+    height = min(bbox[3],other_bbox[3]) - max(bbox[1],other_bbox[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+
+    intersection = width*height
+    union = (bbox[2]-bbox[0])*(bbox[3]-bbox[1]) + (other_bbox[2]-other_bbox[0])*(other_bbox[3]-other_bbox[1]) - intersection
+    return intersection/union
+
+def link_tracks(previous_detections,detections,min_iou=MIN_LINK_IOU):
+    """
+    Match the track ids of a segment with the ids of the previous segment on the frames both have tracked
+    Args:
+        previous_detections (list): Player dictionaries of the previous segment on the overlap (final ids)
+        detections (list): Player dictionaries of the segment on the same frames (ids of the segment)
+        min_iou (float): Min mean IoU over the overlap for two tracks to be linked
+    Returns:
+        links (dict): Track id in the segment -> track id in the previous segment
+    """
+    #Mean IoU over the frames of the overlap where either track is present
+    iou_sums = {}
+    frame_counts = {}
+    previous_frame_counts = {}
+    for previous_dict,player_dict in zip(previous_detections,detections):
+        for track_id,bbox in player_dict.items():
+            frame_counts[track_id] = frame_counts.get(track_id,0) + 1
+            for previous_id,previous_bbox in previous_dict.items():
+                iou_sums[(track_id,previous_id)] = iou_sums.get((track_id,previous_id),0.0) + bbox_iou(bbox,previous_bbox)
+        for previous_id in previous_dict:
+            previous_frame_counts[previous_id] = previous_frame_counts.get(previous_id,0) + 1
+
+    scores = []
+    for (track_id,previous_id),iou_sum in iou_sums.items():
+        score = iou_sum/max(frame_counts[track_id],previous_frame_counts[previous_id])
+        if score >= min_iou:
+            scores.append((score,track_id,previous_id))
+
+    #Best pairs first, each track is linked at most once
+    links = {}
+    linked_previous_ids = set()
+    for score,track_id,previous_id in sorted(scores,key=lambda x: -x[0]):
+        if track_id in links or previous_id in linked_previous_ids:
+            continue
+        links[track_id] = previous_id
+        linked_previous_ids.add(previous_id)
+
+    return links
+
+class ShardedDetector:
+    """
+    Detects and tracks the players and the ball of a long video in time segments on several processes.
+    Each segment starts a few frames early: it warms up its trackers on the first frames, then its tracks are matched
+    to the tracks of the previous segment on the next ones (the overlap), the ids of the players then stay the same
+    over the whole video. Ball detections are stitched before interpolation so that gaps across a boundary are
+    filled the same way as in a single process.
+    The result is close to a single process but not identical: each segment starts its tracker (BoT-SORT Kalman
+    filters), keyframe schedule and ball ROI from nothing, so boxes and ball detections near a boundary can differ
+    slightly, and a track that is lost during the overlap gets a new id
+    """
+    def __init__(self,player_params,ball_params,workers=2,overlap=SHARD_OVERLAP,batch_size=1,warm_up=SHARD_WARM_UP):
+        """
+        Args:
+            player_params (dict): Arguments of TrackPlayer (each worker builds and loads its own models)
+            ball_params (dict): Arguments of TrackBall
+            workers (int): Number of worker processes, the video is split into this many segments
+            overlap (int): Number of frames tracked by two consecutive segments, the tracks are linked on them
+            batch_size (int): Number of frames sent to the detectors in one call
+            warm_up (int): Number of frames each segment tracks before the overlap, not used for anything else
+        """
+        self.player_params = player_params
+        self.ball_params = ball_params
+        self.workers = workers
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.warm_up = warm_up
+
+    def detect(self,video_path,court_layout=None,court_layouts=None):
+        """
+        Args:
+            video_path (str): Path to the video
+            court_layout (dict): Dictionary of court description
+            court_layouts (list): List of (first frame number, court layout) when the court moves during the video,
+                                  used instead of court_layout
+        Returns:
+            player_detections (list): List of dictionaries with player id and bounding box coordinates
+            ball_detections (list): List of dictionaries with ball id and bounding box coordinates, not interpolated
+        """
+        shards = plan_shards(get_video_frame_count(video_path),self.workers,self.overlap,self.warm_up)
+        threads = max(1,(os.cpu_count() or 1)//len(shards))
+
+        #Spawned workers do not inherit the threads (and locks) of this process
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=len(shards),mp_context=context,initializer=limit_worker_threads,initargs=(threads,)) as executor:
+            futures = [executor.submit(detect_shard,video_path,read_start,start,end,self.player_params,self.ball_params,court_layout,self.batch_size,court_layouts)
+                       for read_start,start,end in shards]
+            results = [future.result() for future in futures]
+
+        return self.stitch(shards,results)
+
+    def stitch(self,shards,results):
+        """
+        Join the segments, linking the track ids of each segment to the ids of the previous one
+        Args:
+            shards (list): List of (first frame read, start frame, end frame) of each segment
+            results (list): (player_detections, ball_detections) of each segment
+        Returns:
+            player_detections (list): List of dictionaries with player id and bounding box coordinates
+            ball_detections (list): List of dictionaries with ball id and bounding box coordinates
+        """
+        player_detections = []
+        ball_detections = []
+        next_id = 1
+        for (read_start,start,_),(shard_players,shard_balls) in zip(shards,results):
+            #The warm-up frames are dropped, the tracks are only linked on the overlap
+            link_start = max(start-self.overlap,read_start)
+            overlap = start-read_start
+            links = link_tracks(player_detections[link_start:start],shard_players[link_start-read_start:overlap])
+
+            #Tracks that started in this segment get ids after every id used so far
+            id_map = {}
+            for player_dict in shard_players[overlap:]:
+                for track_id in player_dict:
+                    if track_id not in id_map:
+                        if track_id in links:
+                            id_map[track_id] = links[track_id]
+                        elif start == 0:
+                            id_map[track_id] = track_id #The first segment keeps its ids
+                        else:
+                            id_map[track_id] = next_id
+                            next_id += 1
+                    next_id = max(next_id,id_map[track_id]+1)
+
+            player_detections.extend({id_map[track_id]:bbox for track_id,bbox in player_dict.items()} for player_dict in shard_players[overlap:])
+            ball_detections.extend(shard_balls)
+
+        return player_detections,ball_detections
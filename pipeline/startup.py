@@ -0,0 +1,76 @@
+import time
+import numpy as np
+from concurrent.futures import Future,ThreadPoolExecutor
+
+#Size of the frame the models are warmed up on (the video is not decoded yet when they are loaded)
+WARM_UP_FRAME_SHAPE = (1080,1920,3)
+
+def get_model(model):
+    """
+    Get a model that may still be loading
+    Args:
+        model (object|Future): Model, or the Future returned by ModelLoader.load
+    Returns:
+        model (object): The model, once loaded
+    """
+    if isinstance(model,Future):
+        return model.result()
+    return model
+
+def limit_worker_threads(threads):
+    """
+    Limit the CPU threads used by a worker process so that the workers do not compete for the same cores
+    Args:
+        threads (int): Number of threads of torch and OpenCV in this process
+    """
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    import cv2 as cv
+    cv.setNumThreads(threads)
+
+class ModelLoader:
+    """
+    Load and warm up the models on background threads, at the same time as each other and as the video decoding
+    """
+    def __init__(self,max_workers=3,frame_shape=WARM_UP_FRAME_SHAPE):
+        """
+        Args:
+            max_workers (int): Number of models loaded at the same time
+            frame_shape (tuple): Shape of the frame the models are warmed up on
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,thread_name_prefix="model_loader")
+        self.frame_shape = frame_shape
+        self.load_times = {}
+
+    def load(self,name,create,warm_up=True):
+        """
+        Start loading a model
+        Args:
+            name (str): Name of the model in load_times
+            create (function): Creates the model
+            warm_up (bool): Run the model once on a black frame after loading it (skip it when its results are cached)
+        Returns:
+            future (Future): Future of the model, see get_model
+        """
+        return self.executor.submit(self.create_model,name,create,warm_up)
+
+    def create_model(self,name,create,warm_up):
+        """
+        Create and warm up a model (runs on a background thread)
+        """
+        start_time = time.perf_counter()
+        model = create()
+        if warm_up:
+            model.warm_up(np.zeros(self.frame_shape,np.uint8))
+        self.load_times[name] = time.perf_counter()-start_time
+
+        return model
+
+    def shutdown(self):
+        """
+        Wait for the models still loading and stop the threads
+        """
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,353 @@
+import time
+import threading
+from collections import deque
+from itertools import chain
+from utils import iter_video_frames,iter_batches,save_video,get_court_layout,get_frame_court_layout,get_height_of_bbox,FpsCounter,FramePool,WindowedMax,profile_frame
+from trackers import BallInterpolator,RoleClassifier
+from minimap import DrawMinimap,HEIGHT_WINDOW_BEFORE,HEIGHT_WINDOW_AFTER
+from renderer import FrameRenderer
+from court_line_detector import KeypointTracker
+from .startup import get_model
+
+class StreamPipeline:
+    """
+    Decode, detect, annotate and encode the video in one forward pass.
+    Only a sliding window of frames is kept in memory instead of the whole video
+    """
+    def __init__(self,keypoints_detector,player_tracker,ball_tracker,look_ahead=HEIGHT_WINDOW_AFTER,batch_size=1,show_fps=False,homography=False,track_court=False,
+                 reuse_frames=True):
+        """
+        Args:
+            keypoints_detector (LineDetector): Court keypoints detector
+            player_tracker (TrackPlayer): Player tracker
+            ball_tracker (TrackBall): Ball tracker
+                (each model can also be a Future from ModelLoader, it is only waited for when first needed)
+            look_ahead (int): Number of frames buffered after the frame being annotated.
+                              Bounds how long a frame waits for the ball to be seen again and the minimap height window
+            batch_size (int): Number of frames sent to the detectors in one call
+            show_fps (bool): Draw the current frame rate on every frame
+            homography (bool): Project the players and the ball onto the minimap with a homography fitted to the court keypoints
+            track_court (bool): Detect the court keypoints again whenever the camera moves instead of only on the first frame
+            reuse_frames (bool): Decode into a FramePool and annotate and encode the frames in place, so that run() does not
+                                 allocate a new frame for every frame
+        """
+        self.keypoints_detector = keypoints_detector
+        self.player_tracker = player_tracker
+        self.ball_tracker = ball_tracker
+        self.batch_size = batch_size
+        self.show_fps = show_fps
+        self.homography = homography
+        self.track_court = track_court
+        self.look_ahead = max(look_ahead,HEIGHT_WINDOW_AFTER)
+        self.reuse_frames = reuse_frames
+        self.frame_pool = None #Pool of the last run, None if reuse_frames is off
+        self.frame_count = 0
+        self.first_frame_time = None #time.perf_counter() when the first frame was annotated
+
+    def run(self,input_video_path,output_video_path,player_cache=None,ball_cache=None):
+        """
+        Stream the video from input_video_path to output_video_path
+        Args:
+            input_video_path (str): Path to the input video
+            output_video_path (str): Path to save the annotated video
+            player_cache (DetectionCache): Cache of the player detections on this video (optional)
+            ball_cache (DetectionCache): Cache of the ball detections on this video (optional)
+        Returns:
+            frame_count (int): Number of frames written
+        """
+        self.frame_pool = FramePool(self.get_frame_pool_size()) if self.reuse_frames else None
+        frames = self.process_frames(iter_video_frames(input_video_path,frame_pool=self.frame_pool),player_cache,ball_cache)
+        save_video(frames,output_video_path,self.frame_pool)
+
+        return self.frame_count
+
+    def get_frame_pool_size(self):
+        """
+        Returns:
+            size (int): Max number of frames decoded and not encoded yet (the look-ahead window and the batch being detected)
+        """
+        return self.look_ahead + self.batch_size + 1
+
+    def process_frames(self,frames,player_cache=None,ball_cache=None):
+        """
+        Annotate the frames one by one
+        Args:
+            frames (iterable): Frames of the video (usually a generator)
+            player_cache (DetectionCache): Cache of the player detections on this video (optional)
+            ball_cache (DetectionCache): Cache of the ball detections on this video (optional)
+        Yields:
+            frame (array): Annotated frame, in the same order as the input
+        """
+        self.frame_count = 0
+        self.first_frame_time = None
+        frames = iter(frames)
+        first_frame = next(frames,None)
+        if first_frame is None:
+            return
+
+        context = self.create_context(first_frame)
+
+        frame_num = 0
+        for batch in iter_batches(chain([first_frame],frames),self.batch_size):
+            self.detect_court_changes(batch,frame_num,context)
+            player_dicts = self.detect_players_on_court(batch,frame_num,context,player_cache)
+            ball_dicts = self.detect_balls(batch,frame_num,ball_cache)
+            frame_num += len(batch)
+
+            for frame, player_dict, ball_dict in zip(batch,player_dicts,ball_dicts):
+                yield from self.push_frame(context,frame,player_dict,ball_dict)
+
+        for cache in (player_cache,ball_cache):
+            if cache is not None:
+                cache.finish()
+
+        yield from self.flush(context)
+
+    def create_context(self,first_frame):
+        """
+        Detect the court on the first frame and create the state carried between frames
+        Args:
+            first_frame (array): First frame of the video
+        Returns:
+            context (dict): State carried between frames
+        """
+        #Court keypoints and minimap come from the first frame (and are updated when the camera moves if track_court).
+        ##The court is tracked when the frames are detected so that the player crop and the roles follow it, and
+        ##applied to the drawings when the frame where it moved is annotated
+        self.keypoints_detector = get_model(self.keypoints_detector)
+        keypoint_tracker = KeypointTracker(self.keypoints_detector) if self.track_court else None
+        if keypoint_tracker is not None:
+            keypoints,_ = keypoint_tracker.update(first_frame)
+        else:
+            keypoints = self.keypoints_detector.predict(first_frame)
+        court_layout = get_court_layout(keypoints)
+        minimap = DrawMinimap(first_frame)
+        if self.homography:
+            minimap.fit_homography(keypoints)
+
+        return {
+            "keypoints": keypoints,
+            "keypoint_tracker": keypoint_tracker,
+            "court_layout": court_layout, #Court of the frame being annotated
+            "court_layouts": [(0,court_layout)], #(first frame number, court layout) of each court seen by the detectors
+            "court_changes": {}, #Frame number -> keypoints detected again on that frame, until it is annotated
+            "court_lock": threading.Lock(), #Guards court_layouts and court_changes (written and read by different threads in ThreadedPipeline)
+            "minimap": minimap,
+            "renderer": FrameRenderer(keypoints,minimap),
+            "role_classifier": None, #Created with the first detections, the player tracker may still be loading before
+            "ball_interpolator": BallInterpolator(max_latency=self.look_ahead),
+            "ball_positions": {}, #Interpolated ball dictionary of each frame, until the frame is annotated
+            "player_heights": WindowedMax(), #Height in pixels of each track over the frames around the annotated frame
+            "next_height_frame": 0, #First frame whose player heights are not in player_heights yet
+            "height_start_frame": 0, #Frame where the camera last moved, the heights from before are not used
+            "window": deque(), #Each entry is (frame_num, frame, player_dict, ball_dict)
+            "next_frame_num": 0,
+            "fps_counter": FpsCounter()
+        }
+
+    def detect_court_changes(self,batch,frame_num,context):
+        """
+        Detect the court again on the frames of a batch where the camera moved (track_court only)
+        Args:
+            batch (list): List of consecutive frames as an array
+            frame_num (int): Frame number of the first frame of the batch
+            context (dict): State carried between frames
+        """
+        keypoint_tracker = context["keypoint_tracker"]
+        if keypoint_tracker is None:
+            return
+
+        for i, frame in enumerate(batch):
+            if frame_num+i == 0:
+                continue #Already detected by create_context()
+            keypoints,redetected = keypoint_tracker.update(frame)
+            if redetected:
+                court_layout = get_court_layout(keypoints)
+                with context["court_lock"]:
+                    context["court_changes"][frame_num+i] = keypoints
+                    context["court_layouts"].append((frame_num+i,court_layout))
+
+    def detect_players_on_court(self,batch,frame_num,context,player_cache=None):
+        """
+        Detect the players in a batch of frames, each frame with the court it was tracked on
+        (the batch is split where the court changed)
+        Args:
+            batch (list): List of consecutive frames as an array
+            frame_num (int): Frame number of the first frame of the batch
+            context (dict): State carried between frames
+            player_cache (DetectionCache): Cache of the player detections (optional)
+        Returns:
+            player_dicts (list): List of dictionaries with player id and bounding box coordinates
+        """
+        with context["court_lock"]:
+            court_layouts = list(context["court_layouts"])
+        boundaries = [start_frame-frame_num for start_frame,_ in court_layouts if start_frame > frame_num]
+        player_dicts = []
+        for part in iter_batches(batch,len(batch),boundaries):
+            part_frame_num = frame_num+len(player_dicts)
+            player_dicts.extend(self.detect_players(part,part_frame_num,get_frame_court_layout(court_layouts,part_frame_num),player_cache))
+
+        return player_dicts
+
+    def detect_players(self,batch,frame_num,court_layout,player_cache=None):
+        """
+        Detect the players in a batch of frames
+        Args:
+            batch (list): List of consecutive frames as an array
+            frame_num (int): Frame number of the first frame of the batch
+            court_layout (dict): Dictionary of court description
+            player_cache (DetectionCache): Cache of the player detections (optional)
+        Returns:
+            player_dicts (list): List of dictionaries with player id and bounding box coordinates
+        """
+        self.player_tracker = get_model(self.player_tracker)
+        return self.player_tracker.detect_batch(batch,court_layout,player_cache,frame_num)
+
+    def detect_balls(self,batch,frame_num,ball_cache=None):
+        """
+        Detect the ball in a batch of frames
+        Args:
+            batch (list): List of consecutive frames as an array
+            frame_num (int): Frame number of the first frame of the batch
+            ball_cache (DetectionCache): Cache of the ball detections (optional)
+        Returns:
+            ball_dicts (list): List of dictionaries with ball id and bounding box coordinates
+        """
+        self.ball_tracker = get_model(self.ball_tracker)
+        return self.ball_tracker.detect_batch(batch,ball_cache,frame_num)
+
+    def push_frame(self,context,frame,player_dict,ball_dict):
+        """
+        Add the next detected frame to the window
+        Args:
+            context (dict): State carried between frames
+            frame (array): Next frame of the video
+            player_dict (dict): Dictionary with player id and bounding box coordinates
+            ball_dict (dict): Dictionary with ball id and bounding box coordinates
+        Returns:
+            frames (list): Frames that are now annotated (empty until the window is full)
+        """
+        window = context["window"]
+        frame_num = context["next_frame_num"]
+        window.append((frame_num,frame,player_dict,ball_dict))
+        context["next_frame_num"] += 1
+
+        #New tracks are classified when they are detected, so they usually have a role before their first frame is annotated
+        if context["role_classifier"] is None:
+            context["role_classifier"] = RoleClassifier(get_model(self.player_tracker))
+        with context["court_lock"]:
+            court_layout = get_frame_court_layout(context["court_layouts"],frame_num)
+        context["role_classifier"].update(player_dict,court_layout)
+
+        #The ball of a frame is known at the latest look_ahead frames later, when the frame is annotated
+        context["ball_positions"].update(context["ball_interpolator"].push(ball_dict))
+
+        if len(window) <= self.look_ahead:
+            return []
+
+        frame = self.annotate_oldest_frame(window,context)
+        window.popleft()
+        return [frame]
+
+    def flush(self,context):
+        """
+        Annotate the frames left in the window at the end of the video
+        Args:
+            context (dict): State carried between frames
+        Yields:
+            frame (array): Annotated frame
+        """
+        context["ball_positions"].update(context["ball_interpolator"].flush())
+        if context["role_classifier"] is not None:
+            with context["court_lock"]:
+                court_layout = context["court_layouts"][-1][1]
+            context["role_classifier"].flush(court_layout)
+
+        window = context["window"]
+        while window:
+            yield self.annotate_oldest_frame(window,context)
+            window.popleft()
+
+    def update_court(self,keypoints,context):
+        """
+        Update everything that is drawn from the keypoints when the frame where the camera moved is annotated
+        Args:
+            keypoints (list): Keypoints of the court detected again
+            context (dict): State carried between frames
+        """
+        context["keypoints"] = keypoints
+        context["court_layout"] = get_court_layout(keypoints)
+        context["renderer"].set_keypoints(keypoints)
+        if self.homography:
+            context["minimap"].fit_homography(keypoints)
+
+    def push_player_heights(self,window,context):
+        """
+        Add the player heights of the frames of the window that are now within HEIGHT_WINDOW_AFTER frames of the oldest one
+        Args:
+            window (deque): Buffered (frame_num, frame, player_dict, ball_dict) entries
+            context (dict): State carried between frames
+        """
+        frame_num = window[0][0]
+        end_frame = frame_num + min(HEIGHT_WINDOW_AFTER,len(window))
+        while context["next_height_frame"] < end_frame:
+            next_frame_num,_,player_dict,_ = window[context["next_height_frame"]-frame_num]
+            context["player_heights"].push(next_frame_num,{player_id: get_height_of_bbox(bbox) for player_id, bbox in player_dict.items()})
+            context["next_height_frame"] += 1
+
+    def annotate_oldest_frame(self,window,context):
+        """
+        Finish the oldest frame in the window using the frames after it as look-ahead
+        Args:
+            window (deque): Buffered (frame_num, frame, player_dict, ball_dict) entries
+            context (dict): State carried between frames
+        Returns:
+            frame (array): Annotated frame
+        """
+        frame_num,frame,player_dict,ball_dict = window[0]
+        minimap = context["minimap"]
+        with context["court_lock"]:
+            keypoints = context["court_changes"].pop(frame_num,None)
+        if keypoints is not None:
+            self.update_court(keypoints,context)
+            ##Player heights in pixels from before the camera moved are not comparable anymore
+            context["height_start_frame"] = frame_num
+
+        role_assignments = context["role_classifier"].roles
+        players,others = self.player_tracker.filter_players_by_role(player_dict,role_assignments)
+
+        ball_dict = context["ball_positions"].pop(frame_num)
+
+        if self.homography:
+            player_minimap,ball_minimap = minimap.project_frame_to_minimap_coor(players,ball_dict)
+        else:
+            #Max player height over the past HEIGHT_WINDOW_BEFORE frames and the first HEIGHT_WINDOW_AFTER frames of the window
+            self.push_player_heights(window,context)
+            first_frame = max(frame_num-HEIGHT_WINDOW_BEFORE,context["height_start_frame"])
+            max_player_heights = {player_id: context["player_heights"].max(player_id,first_frame) for player_id in players}
+            if frame_num % HEIGHT_WINDOW_BEFORE == 0:
+                context["player_heights"].prune(first_frame)
+
+            player_minimap,ball_minimap = minimap.convert_frame_to_minimap_coor(players,
+                                                                                ball_dict,
+                                                                                context["keypoints"],
+                                                                                max_player_heights)
+
+        fps = context["fps_counter"].tick()
+
+        #Draw stuff
+        frame = context["renderer"].render(frame,
+                                           frame_num,
+                                           players,
+                                           others,
+                                           role_assignments,
+                                           ball_dict,
+                                           player_minimap,
+                                           ball_minimap,
+                                           fps=fps if self.show_fps else None)
+
+        if self.first_frame_time is None:
+            self.first_frame_time = time.perf_counter()
+        self.frame_count += 1
+        profile_frame()
+        return frame
@@ -0,0 +1,206 @@
+import queue
+import threading
+from itertools import chain
+from utils import iter_video_frames,iter_batches,save_video,FpsCounter,FramePool
+from .stream import StreamPipeline
+
+END_OF_STREAM = None #Put on a queue after the last item
+
+class PipelineStopped(Exception):
+    """
+    Raised inside a worker when another worker failed and the pipeline is shutting down
+    """
+
+class ThreadedPipeline(StreamPipeline):
+    """
+    Same output as StreamPipeline, but decoding, player detection, ball detection, rendering and encoding
+    each run on their own thread, connected by bounded queues (a full queue blocks the stage before it).
+    OpenCV and torch release the GIL during their heavy work so the stages overlap
+    """
+    def __init__(self,keypoints_detector,player_tracker,ball_tracker,queue_size=8,**kwargs):
+        """
+        Args:
+            keypoints_detector (LineDetector): Court keypoints detector
+            player_tracker (TrackPlayer): Player tracker
+            ball_tracker (TrackBall): Ball tracker
+            queue_size (int): Max number of batches (or frames, after rendering) waiting between two stages
+            **kwargs: look_ahead, batch_size, show_fps, homography, track_court and reuse_frames, see StreamPipeline
+        """
+        super().__init__(keypoints_detector,player_tracker,ball_tracker,**kwargs)
+        self.queue_size = queue_size
+        self.encode_fps_counter = FpsCounter()
+
+    def run(self,input_video_path,output_video_path,player_cache=None,ball_cache=None):
+        """
+        Stream the video from input_video_path to output_video_path with all the stages running at the same time
+        Args:
+            input_video_path (str): Path to the input video
+            output_video_path (str): Path to save the annotated video
+            player_cache (DetectionCache): Cache of the player detections on this video (optional)
+            ball_cache (DetectionCache): Cache of the ball detections on this video (optional)
+        Returns:
+            frame_count (int): Number of frames written
+        """
+        self.frame_count = 0
+        self.first_frame_time = None
+        self.encode_fps_counter = FpsCounter()
+        self.stop_event = threading.Event()
+        self.errors = []
+
+        #The frames are released by the encode worker once they are written
+        self.frame_pool = FramePool(self.get_frame_pool_size()) if self.reuse_frames else None
+        frames = iter_video_frames(input_video_path,frame_pool=self.frame_pool)
+        first_frame = next(frames,None)
+        if first_frame is None:
+            return 0
+
+        #Court detection has to be done before the player detection can start
+        context = self.create_context(first_frame)
+
+        decoded_for_players = queue.Queue(self.queue_size)
+        decoded_for_balls = queue.Queue(self.queue_size)
+        detected_players = queue.Queue(self.queue_size)
+        detected_balls = queue.Queue(self.queue_size)
+        rendered = queue.Queue(self.queue_size*self.batch_size)
+
+        workers = [
+            (self.decode_worker,(chain([first_frame],frames),[decoded_for_players,decoded_for_balls])),
+            (self.player_worker,(decoded_for_players,detected_players,context,player_cache)),
+            (self.ball_worker,(decoded_for_balls,detected_balls,ball_cache)),
+            (self.render_worker,(detected_players,detected_balls,rendered,context)),
+            (self.encode_worker,(rendered,output_video_path))
+        ]
+        threads = [threading.Thread(target=self.run_worker,args=(target,*args),daemon=True) for target,args in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if len(self.errors) > 0:
+            raise self.errors[0]
+
+        print(f"Steady-state: {self.encode_fps_counter.steady_state_fps():.1f} fps")
+        return self.frame_count
+
+    def get_frame_pool_size(self):
+        """
+        Returns:
+            size (int): Max number of frames decoded and not encoded yet (the batches on the queues and in the workers,
+                        the look-ahead window and the rendered frames waiting to be encoded)
+        """
+        return (3*self.queue_size+3)*self.batch_size + self.look_ahead + 2
+
+    def run_worker(self,target,*args):
+        """
+        Run a stage, if it fails every other stage is stopped and the error is raised by run()
+        """
+        try:
+            target(*args)
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self.errors.append(error)
+            self.stop_event.set()
+
+    def put(self,output_queue,item):
+        """
+        Put an item on a queue, waiting while it is full (backpressure)
+        """
+        while not self.stop_event.is_set():
+            try:
+                output_queue.put(item,timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise PipelineStopped()
+
+    def get(self,input_queue):
+        """
+        Get the next item of a queue, waiting while it is empty
+        """
+        while not self.stop_event.is_set():
+            try:
+                return input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise PipelineStopped()
+
+    def decode_worker(self,frames,output_queues):
+        """
+        Decode the video and send the batches of frames to every detector
+        """
+        frame_num = 0
+        for batch in iter_batches(frames,self.batch_size):
+            for output_queue in output_queues:
+                self.put(output_queue,(frame_num,batch))
+            frame_num += len(batch)
+
+        for output_queue in output_queues:
+            self.put(output_queue,END_OF_STREAM)
+
+    def player_worker(self,input_queue,output_queue,context,player_cache):
+        """
+        Track the court and detect and track the players. One worker only so that the tracker sees the frames in order.
+        The court changes are recorded in the context before the detections are sent, so the render worker has them in time
+        """
+        while True:
+            item = self.get(input_queue)
+            if item is END_OF_STREAM:
+                break
+            frame_num,batch = item
+            self.detect_court_changes(batch,frame_num,context)
+            self.put(output_queue,(batch,self.detect_players_on_court(batch,frame_num,context,player_cache)))
+
+        if player_cache is not None:
+            player_cache.finish()
+        self.put(output_queue,END_OF_STREAM)
+
+    def ball_worker(self,input_queue,output_queue,ball_cache):
+        """
+        Detect the ball
+        """
+        while True:
+            item = self.get(input_queue)
+            if item is END_OF_STREAM:
+                break
+            frame_num,batch = item
+            self.put(output_queue,self.detect_balls(batch,frame_num,ball_cache))
+
+        if ball_cache is not None:
+            ball_cache.finish()
+        self.put(output_queue,END_OF_STREAM)
+
+    def render_worker(self,player_queue,ball_queue,output_queue,context):
+        """
+        Join the player and ball detections of each batch (both arrive in frame order) and annotate the frames
+        """
+        while True:
+            player_item = self.get(player_queue)
+            ball_dicts = self.get(ball_queue)
+            if player_item is END_OF_STREAM or ball_dicts is END_OF_STREAM:
+                break
+            batch,player_dicts = player_item
+            for frame, player_dict, ball_dict in zip(batch,player_dicts,ball_dicts):
+                for annotated_frame in self.push_frame(context,frame,player_dict,ball_dict):
+                    self.put(output_queue,annotated_frame)
+
+        for annotated_frame in self.flush(context):
+            self.put(output_queue,annotated_frame)
+        self.put(output_queue,END_OF_STREAM)
+
+    def encode_worker(self,input_queue,output_video_path):
+        """
+        Write the annotated frames to the output video
+        """
+        save_video(self.iter_queue(input_queue),output_video_path,self.frame_pool)
+
+    def iter_queue(self,input_queue):
+        """
+        Yield the items of a queue until the end of the stream, timing each one
+        """
+        while True:
+            item = self.get(input_queue)
+            if item is END_OF_STREAM:
+                return
+            self.encode_fps_counter.tick()
+            yield item
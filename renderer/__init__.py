@@ -0,0 +1,2 @@
+from .label_cache import LabelCache
+from .renderer import FrameRenderer
\ No newline at end of file
@@ -0,0 +1,83 @@
+import cv2 as cv
+import numpy as np
+from collections import OrderedDict
+
+class LabelCache:
+    """
+    Cache of pre-rendered text labels ("Player ID: 1", "Umpire ID: 3"...)
+    Each label is rasterized once into a coloured sprite and a mask, and then copied onto every frame it appears in.
+    Text is drawn without anti-aliasing, same as cv.putText with cv.LINE_8
+    """
+    def __init__(self,font=cv.FONT_HERSHEY_SIMPLEX,font_scale=0.9,thickness=2,max_labels=512):
+        """
+        Args:
+            font (int): OpenCV font face
+            font_scale (float): Font scale
+            thickness (int): Thickness of the text
+            max_labels (int): Max number of labels kept (least recently used are dropped first)
+        """
+        self.font = font
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.max_labels = max_labels
+        self.labels = OrderedDict()
+
+    def get_label(self,text,colour):
+        """
+        Get the pre-rendered sprite of a label, rasterizing it on first use
+        Args:
+            text (str): Text of the label
+            colour (tuple): Colour of the text
+        Returns:
+            label (tuple): (sprite,mask,x_offset,y_offset) coloured sprite, mask of the text pixels and
+                           position of the top left corner of the sprite relative to the text origin
+        """
+        key = (text,colour)
+        if key in self.labels:
+            self.labels.move_to_end(key)
+            return self.labels[key]
+
+        (text_w,text_h),baseline = cv.getTextSize(text,self.font,self.font_scale,self.thickness)
+        padding = self.thickness*2 + 2 #Room for the stroke thickness around the glyphs
+        canvas = np.zeros((text_h+baseline+padding*2,text_w+padding*2),np.uint8)
+        cv.putText(canvas,text,(padding,padding+text_h),self.font,self.font_scale,255,self.thickness,cv.LINE_8)
+
+        mask = (canvas >= 128).astype(np.uint8) #Pixels at least half covered if the font is anti-aliased anyway
+        sprite = np.empty((*canvas.shape,3),np.uint8)
+        sprite[:] = colour
+        label = (sprite,mask,-padding,-padding-text_h)
+
+        self.labels[key] = label
+        if len(self.labels) > self.max_labels:
+            self.labels.popitem(last=False)
+
+        return label
+
+    def draw_label(self,frame,text,origin,colour):
+        """
+        Draw a label on the frame, same as cv.putText with the cache's font settings
+        Args:
+            frame (array): Frame to draw on (modified in place)
+            text (str): Text of the label
+            origin (tuple): (x,y) bottom left corner of the text, as in cv.putText
+            colour (tuple): Colour of the text
+        Returns:
+            frame (array): Returns the frame with the label
+        """
+        sprite,mask,x_offset,y_offset = self.get_label(text,colour)
+        x_start = origin[0] + x_offset
+        y_start = origin[1] + y_offset
+        sprite_h,sprite_w = mask.shape
+
+        #Clip the label to the frame
+        frame_h,frame_w = frame.shape[:2]
+        x1,y1 = max(x_start,0),max(y_start,0)
+        x2,y2 = min(x_start+sprite_w,frame_w),min(y_start+sprite_h,frame_h)
+        if x1 >= x2 or y1 >= y2:
+            return frame
+
+        sprite_y = slice(y1-y_start,y2-y_start)
+        sprite_x = slice(x1-x_start,x2-x_start)
+        cv.copyTo(sprite[sprite_y,sprite_x],mask[sprite_y,sprite_x],frame[y1:y2,x1:x2])
+
+        return frame
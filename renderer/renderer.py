@@ -0,0 +1,139 @@
+import cv2 as cv
+from utils import profile_stage
+from .label_cache import LabelCache
+
+#Colour of the bounding box of each role (BGR)
+ROLE_COLOURS = {
+    "Player": (0,0,255),
+    "Umpire": (255,255,0),
+    "Line Judge": (0,255,165)
+}
+OTHER_ROLE_COLOUR = (128,0,128)
+BALL_COLOUR = (0,255,0)
+KEYPOINT_COLOUR = (255,0,0)
+MINIMAP_PLAYER_COLOUR = (0,0,255)
+MINIMAP_BALL_COLOUR = (0,255,0)
+FRAME_COUNTER_COLOUR = (0,110,110)
+FPS_COLOUR = (160,160,0)
+
+class FrameRenderer:
+    """
+    Draws every overlay (bounding boxes, court keypoints, minimap, frame counter) on a frame in a single pass
+    """
+    def __init__(self,keypoints,minimap,label_cache=None):
+        """
+        Args:
+            keypoints (list): Court keypoints drawn on every frame
+            minimap (DrawMinimap): Minimap of the video
+            label_cache (LabelCache): Cache of pre-rendered labels. A new one is created if None
+        """
+        self.set_keypoints(keypoints)
+        self.minimap = minimap
+        self.label_cache = label_cache if label_cache is not None else LabelCache()
+
+    def set_keypoints(self,keypoints):
+        """
+        Change the court keypoints drawn on the next frames (when the camera moved)
+        Args:
+            keypoints (list): Court keypoints
+        """
+        self.keypoints = [(int(keypoints[i]),int(keypoints[i+1])) for i in range(0,len(keypoints),2)]
+
+    def draw_box(self,frame,bbox,label,colour):
+        """
+        Draw a bounding box with its label above it
+        """
+        x1,y1,x2,y2 = bbox
+        self.label_cache.draw_label(frame,label,(int(x1),int(y1-10)),colour)
+        cv.rectangle(frame,(int(x1),int(y1)),(int(x2),int(y2)),colour,2)
+
+    def render(self,frame,frame_num,players,others,role_assignments,ball_dict,player_minimap,ball_minimap,fps=None):
+        """
+        Draw all the overlays on one frame
+        Args:
+            frame (array): Input frame
+            frame_num (int): Frame number shown in the top left corner
+            players (dict): Dictionary with player id and bounding box coordinates
+            others (dict): Dictionary with other people id and bounding box coordinates
+            role_assignments (dict): Dictionary with player id and their roles
+            ball_dict (dict): Dictionary with ball id and bounding box coordinates
+            player_minimap (dict): Dictionary with player id and minimap coordinates
+            ball_minimap (dict): Dictionary with ball id and minimap coordinates
+            fps (float): Frame rate drawn under the frame counter (not drawn if None)
+        Returns:
+            frame (array): Returns the annotated frame
+        """
+        #Bounding boxes
+        with profile_stage("draw_boxes"):
+            for track_id, bbox in players.items():
+                self.draw_box(frame,bbox,f"Player ID: {track_id}",ROLE_COLOURS["Player"])
+
+            for track_id, bbox in others.items():
+                role = role_assignments.get(track_id,"unknown")
+                self.draw_box(frame,bbox,f"{role} ID: {track_id}",ROLE_COLOURS.get(role,OTHER_ROLE_COLOUR))
+
+            for _, bbox in ball_dict.items():
+                self.draw_box(frame,bbox,"Tennis Ball",BALL_COLOUR)
+
+        #Court keypoints
+        with profile_stage("draw_keypoints"):
+            for keypoint in self.keypoints:
+                cv.circle(frame,keypoint,5,KEYPOINT_COLOUR,-1)
+
+        #Minimap and the positions on it
+        with profile_stage("draw_minimap"):
+            frame = self.minimap.draw_static_layer(frame)
+            for positions, colour in ((player_minimap,MINIMAP_PLAYER_COLOUR),(ball_minimap,MINIMAP_BALL_COLOUR)):
+                for _, position in positions.items():
+                    cv.circle(frame,(int(position[0]),int(position[1])),5,colour,-1)
+
+        #Frame counter (different on every frame so it is not worth caching)
+        with profile_stage("draw_text"):
+            cv.putText(frame,f"{frame_num}",(10,30),cv.FONT_HERSHEY_COMPLEX,1,FRAME_COUNTER_COLOUR,3)
+            if fps is not None:
+                cv.putText(frame,f"{int(fps)} fps",(10,70),cv.FONT_HERSHEY_COMPLEX,1,FPS_COLOUR,3)
+
+        return frame
+
+    def draw_live_stats(self,frame,latency,dropped_frames):
+        """
+        Draw the live mode statistics under the frame rate
+        Args:
+            frame (array): Annotated frame
+            latency (float): Time (s) from the capture of the frame to now
+            dropped_frames (int): Number of frames skipped so far to keep up with the source
+        Returns:
+            frame (array): Returns the annotated frame
+        """
+        cv.putText(frame,f"{latency*1000:.0f} ms",(10,110),cv.FONT_HERSHEY_COMPLEX,1,FPS_COLOUR,3)
+        cv.putText(frame,f"{dropped_frames} dropped",(10,150),cv.FONT_HERSHEY_COMPLEX,1,FPS_COLOUR,3)
+
+        return frame
+
+    def render_video(self,frames,player_detections,other_detections,role_assignments,ball_detections,player_minimap_detections,ball_minimap_detections,court_segments=None):
+        """
+        Draw all the overlays on the whole video, one frame at a time
+        Args:
+            frames (iterable): Frames of the video
+            player_detections (list): List of dictionaries with player id and bounding box coordinates
+            other_detections (list): List of dictionaries with other people id and bounding box coordinates
+            role_assignments (list): List of dictionaries with player id and their roles
+            ball_detections (list): List of dictionaries with ball id and bounding box coordinates
+            player_minimap_detections (list): List of dictionaries with player id and minimap coordinates
+            ball_minimap_detections (list): List of dictionaries with ball id and minimap coordinates
+            court_segments (list): List of (first frame number, court keypoints) when the court moves (optional)
+        Yields:
+            frame (array): Annotated frame
+        """
+        segment_keypoints = dict(court_segments) if court_segments is not None else {}
+        for frame_num, frame in enumerate(frames):
+            if frame_num in segment_keypoints:
+                self.set_keypoints(segment_keypoints[frame_num])
+            yield self.render(frame,
+                              frame_num,
+                              player_detections[frame_num],
+                              other_detections[frame_num],
+                              role_assignments[frame_num],
+                              ball_detections[frame_num],
+                              player_minimap_detections[frame_num] if frame_num < len(player_minimap_detections) else {},
+                              ball_minimap_detections[frame_num] if frame_num < len(ball_minimap_detections) else {})
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from utils import sliding_window_max,WindowedMax
+
+def naive_window_max(values,before,after):
+    return np.array([max(values[max(i-before,0):i+after+1]) for i in range(len(values))],np.float64)
+
+@pytest.mark.parametrize("before,after",[(0,0),(1,0),(0,3),(20,50),(7,7),(60,60)])
+def test_sliding_window_max_matches_a_naive_max(before,after):
+    rng = np.random.default_rng(before*100+after)
+    values = rng.uniform(0,200,97)
+    values[rng.random(97) < 0.3] = -np.inf #Frames where the player is not seen
+
+    np.testing.assert_array_equal(sliding_window_max(values,before,after),naive_window_max(values,before,after))
+
+def test_sliding_window_max_of_nothing_is_empty():
+    assert len(sliding_window_max([],20,50)) == 0
+
+def test_windowed_max_matches_the_sliding_window_max():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0,200,(2,97))
+    values[rng.random((2,97)) < 0.3] = -np.inf #Frames where the track is not seen
+    expected = [sliding_window_max(key_values,20,49) for key_values in values]
+
+    #Values are pushed up to 49 frames ahead, like the player heights of the look-ahead window
+    windowed_max = WindowedMax()
+    next_frame = 0
+    for frame_num in range(97):
+        while next_frame < min(frame_num+50,97):
+            windowed_max.push(next_frame,{key: values[key,next_frame] for key in range(2) if values[key,next_frame] > -np.inf})
+            next_frame += 1
+        for key in range(2):
+            if values[key,frame_num] > -np.inf:
+                assert windowed_max.max(key,frame_num-20) == expected[key][frame_num]
+        windowed_max.prune(frame_num-20)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trackers import TrackBall
+from trackers.ball_interpolator import interpolate_positions
+
+def interpolate_baseline(ball_positions):
+    """
+    Original TrackBall.interpolate_ball_position
+    """
+    ball_positions_df = pd.DataFrame([x.get(1,[]) for x in ball_positions],columns=["x1","y1","x2","y2"])
+    ball_positions_df = ball_positions_df.interpolate()
+    ball_positions_df = ball_positions_df.bfill()
+    return [{1:x} for x in ball_positions_df.to_numpy().tolist()]
+
+def get_ball_positions(frame_count,seen,seed):
+    rng = np.random.default_rng(seed)
+    ball_positions = []
+    for frame_num in range(frame_count):
+        if frame_num in seen:
+            x,y = rng.uniform(0,1900),rng.uniform(0,1060)
+            ball_positions.append({1:[x,y,x+12.5,y+12.5]})
+        else:
+            ball_positions.append({})
+    return ball_positions
+
+@pytest.mark.parametrize("seen",[set(range(0,60,3)),set(range(10,45)) - {20,21,22,30},{0,59},{25},set(range(60))])
+def test_interpolate_positions_matches_pandas_interpolate_and_bfill(seen):
+    ball_positions = get_ball_positions(60,seen,len(seen))
+
+    interpolated = interpolate_positions(ball_positions)
+    baseline = interpolate_baseline(ball_positions)
+
+    assert len(interpolated) == len(baseline)
+    for ball_dict,baseline_dict in zip(interpolated,baseline):
+        np.testing.assert_allclose(ball_dict[1],baseline_dict[1],rtol=1e-12)
+
+def test_max_latency_holds_the_last_position_on_late_frames():
+    ball_positions = get_ball_positions(12,{0,10},0)
+    ball_tracker = TrackBall(model_path="unused") #The model is only loaded to detect
+
+    interpolated = ball_tracker.interpolate_ball_position(ball_positions,max_latency=3)
+    baseline = interpolate_baseline(ball_positions)
+
+    assert len(interpolated) == 12
+    #Frames 1 to 6 waited 3 frames for the next detection, frames 7 to 9 were still held when it came
+    for frame_num in range(1,7):
+        assert interpolated[frame_num] == ball_positions[0]
+    for frame_num in (7,8,9,10,11):
+        np.testing.assert_allclose(interpolated[frame_num][1],baseline[frame_num][1],rtol=1e-12)
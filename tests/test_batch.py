@@ -0,0 +1,59 @@
+import os
+import json
+import pytest
+import pipeline.batch
+from pipeline import BatchRunner,list_jobs,run_batch
+
+@pytest.fixture
+def runner_params(tmp_path,monkeypatch):
+    #The court keypoints model is loaded by BatchRunner, the YOLO models only on first use
+    monkeypatch.setattr(pipeline.batch,"LineDetector",lambda model_path: None)
+    for name,content in (("video.mp4","video"),("keypoints.pth","keypoints"),("yolov8x.xml","graph"),("yolov8x.bin","weights"),
+                         ("metadata.yaml","names"),("ball.pt","ball")):
+        with open(tmp_path/name,"w") as f:
+            f.write(content)
+    return dict(keypoints_model_path=str(tmp_path/"keypoints.pth"),
+                player_params={"model_path": str(tmp_path/"yolov8x.xml")},
+                ball_params={"model_path": str(tmp_path/"ball.pt")},
+                cache_dir=str(tmp_path/"cache"))
+
+@pytest.mark.parametrize("file_name",["yolov8x.bin","metadata.yaml"])
+def test_job_key_changes_with_every_file_of_an_openvino_model(runner_params,tmp_path,file_name):
+    runner = BatchRunner(**runner_params)
+    video_path = str(tmp_path/"video.mp4")
+    key = runner.job_key(video_path)
+    with open(tmp_path/file_name,"w") as f:
+        f.write("re-exported")
+
+    assert runner.job_key(video_path) != key
+
+def test_failed_job_does_not_stop_the_batch(runner_params,tmp_path):
+    video_path = str(tmp_path/"video.mp4")
+    output_path = str(tmp_path/"video.avi")
+    with open(output_path,"w") as f:
+        f.write("annotated")
+    with open(output_path+".json","w") as f:
+        json.dump({"key": BatchRunner(**runner_params).job_key(video_path)},f)
+
+    reports,summary = run_batch([(str(tmp_path/"missing.mp4"),str(tmp_path/"missing.avi")),(video_path,output_path)],runner_params)
+
+    assert "FileNotFoundError" in reports[0]["error"]
+    assert reports[1]["skipped"] and "error" not in reports[1]
+    assert (summary["jobs"],summary["skipped"],summary["failed"]) == (2,1,1)
+
+@pytest.mark.parametrize("manifest",[["a.mp4","a.mov"],["first/a.mp4","second/a.mp4"]])
+def test_videos_with_the_same_output_name_are_rejected(tmp_path,manifest):
+    manifest_path = tmp_path/"videos.txt"
+    with open(manifest_path,"w") as f:
+        f.write("\n".join(manifest))
+
+    with pytest.raises(ValueError,match="a.mp4"):
+        list_jobs(str(manifest_path),str(tmp_path/"output"))
+
+def test_every_video_gets_its_own_output(tmp_path):
+    for name in ("a.mp4","b.mov","notes.txt"):
+        (tmp_path/name).write_text(name)
+
+    jobs = list_jobs(str(tmp_path),"output")
+
+    assert jobs == [(str(tmp_path/"a.mp4"),os.path.join("output","a.avi")),(str(tmp_path/"b.mov"),os.path.join("output","b.avi"))]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from detection_cache import DetectionCache
+from trackers import TrackPlayer
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {}
+    for name,content in (("video","video"),("other_video","other video"),("model","weights"),("other_model","other weights")):
+        paths[name] = str(tmp_path/name)
+        with open(paths[name],"w") as f:
+            f.write(content)
+    paths["cache"] = str(tmp_path/"cache")
+    return paths
+
+def fill_cache(cache,frame_count=3):
+    for frame_num in range(frame_count):
+        cache.put(frame_num,np.array([[frame_num,0,10,10,0.9,0]]))
+    cache.finish()
+
+def test_cache_is_reused_for_the_same_inputs(files):
+    fill_cache(DetectionCache(files["cache"],files["video"],files["model"],{"conf":0.1}))
+    cache = DetectionCache(files["cache"],files["video"],files["model"],{"conf":0.1})
+
+    assert cache.is_complete()
+    assert cache.get(2)[0,0] == 2
+
+@pytest.mark.parametrize("video,model,params",[("other_video","model",{"conf":0.1}),
+                                               ("video","other_model",{"conf":0.1}),
+                                               ("video","model",{"conf":0.2})])
+def test_cache_key_changes_with_video_model_and_params(files,video,model,params):
+    fill_cache(DetectionCache(files["cache"],files["video"],files["model"],{"conf":0.1}))
+    cache = DetectionCache(files["cache"],files[video],files[model],params)
+
+    assert not cache.is_complete()
+    assert cache.get(0) is None
+
+def test_cache_key_changes_when_the_video_content_changes(files):
+    fill_cache(DetectionCache(files["cache"],files["video"],files["model"],{"conf":0.1}))
+    with open(files["video"],"w") as f:
+        f.write("edited video")
+
+    assert not DetectionCache(files["cache"],files["video"],files["model"],{"conf":0.1}).is_complete()
+
+@pytest.mark.parametrize("changed_file",["yolov8x.bin","metadata.yaml"])
+def test_cache_key_changes_with_every_file_of_an_openvino_model(files,tmp_path,changed_file):
+    model_dir = tmp_path/"yolov8x_openvino_model"
+    model_dir.mkdir()
+    for file_name in ("yolov8x.xml","yolov8x.bin","metadata.yaml"):
+        (model_dir/file_name).write_text(f"{file_name} v1")
+    model_path = str(model_dir/"yolov8x.xml")
+    fill_cache(DetectionCache(files["cache"],files["video"],model_path,{"conf":0.1}))
+
+    (model_dir/changed_file).write_text(f"{changed_file} v2")
+
+    assert not DetectionCache(files["cache"],files["video"],model_path,{"conf":0.1}).is_complete()
+
+def test_court_roi_cache_params_depend_on_the_court_source():
+    full_frame = TrackPlayer("unused.pt")
+    cropped = TrackPlayer("unused.pt",court_roi=True,court_source={"keypoints_model":"a","track_court":False})
+    other_court = TrackPlayer("unused.pt",court_roi=True,court_source={"keypoints_model":"b","track_court":False})
+    tracked_court = TrackPlayer("unused.pt",court_roi=True,court_source={"keypoints_model":"a","track_court":True})
+
+    params = [full_frame.cache_params,cropped.cache_params,other_court.cache_params,tracked_court.cache_params]
+    assert all(params[i] != params[j] for i in range(len(params)) for j in range(i+1,len(params)))
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+import cv2 as cv
+import pytest
+from trackers.backends import ExportedBackend,postprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORED_FRAME_PATH = os.path.join(ROOT_DIR,"input_images","tennismatch.jpg")
+PLAYER_MODEL_PATH = os.path.join(ROOT_DIR,"models","yolov8x.pt")
+BLOB_BOX = [700,400,760,540] #[x1,y1,x2,y2] of the pure red box drawn on the stored frame
+ANCHORS = 8
+
+class BlobGraphBackend(ExportedBackend):
+    """
+    Stands in for an exported graph: finds the pure red pixels of the letterboxed input and predicts
+    one person box around them, the other anchors are empty
+    """
+    def run(self,batch):
+        output = np.zeros((len(batch),4+2,ANCHORS),np.float32)
+        for i, image in enumerate(batch):
+            ys,xs = np.nonzero((image[0] > 0.9) & (image[1] < 0.1) & (image[2] < 0.1))
+            x1,y1,x2,y2 = xs.min(),ys.min(),xs.max()+1,ys.max()+1
+            output[i,:4,0] = [(x1+x2)/2,(y1+y2)/2,x2-x1,y2-y1]
+            output[i,4,0] = 0.9
+            #A less confident box on the same person, removed by the NMS
+            output[i,:4,1] = [(x1+x2)/2+2,(y1+y2)/2,x2-x1,y2-y1]
+            output[i,4,1] = 0.5
+        return output
+
+def get_stored_frame():
+    frame = cv.imread(STORED_FRAME_PATH)
+    x1,y1,x2,y2 = BLOB_BOX
+    frame[y1:y2,x1:x2] = (0,0,255)
+    return frame
+
+def test_exported_backend_needs_run():
+    with pytest.raises(TypeError):
+        ExportedBackend((1,3,640,640),{0:"person"})
+
+@pytest.mark.parametrize("input_shape",[(1,3,640,640),(None,3,None,None)])
+def test_exported_backend_gives_boxes_in_frame_coordinates(input_shape):
+    frame = get_stored_frame()
+    backend = BlobGraphBackend(input_shape,{0:"person",1:"sports ball"})
+
+    detections = backend.predict([frame,frame])
+
+    for frame_detections in detections:
+        assert frame_detections.shape == (1,6)
+        np.testing.assert_allclose(frame_detections[0,:4],BLOB_BOX,atol=frame.shape[1]/640)
+        assert frame_detections[0,4] == pytest.approx(0.9)
+        assert frame_detections[0,5] == 0
+
+def get_prediction(boxes):
+    """
+    Raw (4+classes,anchors) graph output from [cx,cy,w,h,class id,confidence] boxes (2 classes)
+    """
+    prediction = np.zeros((4+2,len(boxes)),np.float32)
+    for anchor,(cx,cy,w,h,class_id,confidence) in enumerate(boxes):
+        prediction[:4,anchor] = [cx,cy,w,h]
+        prediction[4+class_id,anchor] = confidence
+    return prediction
+
+def test_postprocess_suppresses_overlapping_boxes_of_the_same_class_only():
+    prediction = get_prediction([[100,100,40,80,0,0.6], #Overlaps the next person box (IoU 0.9), less confident
+                                 [102,100,40,80,0,0.9],
+                                 [101,100,40,80,1,0.5], #Same place but another class
+                                 [300,300,40,80,0,0.8], #Far away
+                                 [500,500,40,80,0,0.2]]) #Under the confidence threshold
+
+    detections = postprocess(prediction,(640,640),1.0,(0,0),conf=0.25,iou=0.7)
+
+    np.testing.assert_allclose(detections,[[82,60,122,140,0.9,0],[280,260,320,340,0.8,0],[81,60,121,140,0.5,1]])
+
+def test_postprocess_keeps_less_overlapping_boxes_and_filters_classes():
+    prediction = get_prediction([[100,100,40,80,0,0.9],[130,100,40,80,0,0.8],[300,300,40,80,1,0.7]])
+
+    assert len(postprocess(prediction,(640,640),1.0,(0,0),iou=0.7)) == 3
+    assert postprocess(prediction,(640,640),1.0,(0,0),classes=[1])[:,5].tolist() == [1]
+    assert postprocess(prediction,(640,640),1.0,(0,0),max_det=1)[:,4].tolist() == [pytest.approx(0.9)]
+
+def test_postprocess_maps_the_boxes_back_through_the_letterbox():
+    #1280x720 frame letterboxed to 640x640: gain 0.5, 140 pixels of padding on top
+    prediction = get_prediction([[320,320,100,50,0,0.9],[10,150,40,40,0,0.9]])
+
+    detections = postprocess(prediction,(720,1280),0.5,(0,140))
+
+    np.testing.assert_allclose(detections[:,:4],[[540,310,740,410],[0,0,60,60]])
+
+def test_exported_model_matches_the_pytorch_model_on_a_stored_frame(tmp_path):
+    pytest.importorskip("ultralytics")
+    pytest.importorskip("onnxruntime")
+    if not os.path.exists(PLAYER_MODEL_PATH):
+        pytest.skip("Player weights are not available")
+    import shutil
+    from trackers.export import export_detector,check_parity
+
+    model_path = str(tmp_path/"yolov8x.pt")
+    shutil.copy(PLAYER_MODEL_PATH,model_path)
+    report = check_parity(model_path,export_detector(model_path,"onnx"),[cv.imread(STORED_FRAME_PATH)],imgsz=640)
+
+    assert report["recall"] >= 0.95
+    assert report["precision"] >= 0.95
+    assert report["mean_iou"] >= 0.95
+    assert report["mean_confidence_diff"] <= 0.02
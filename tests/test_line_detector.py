@@ -0,0 +1,86 @@
+import os
+import numpy as np
+import cv2 as cv
+import pytest
+from court_line_detector import LineDetector
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+from court_line_detector.export import export_line_detector,ParityError,EXPORT_FORMATS,CHECK_IMAGES,MAX_KEYPOINT_DISTANCE
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def predict_baseline(model_path,image):
+    """
+    Keypoints of the original LineDetector.predict
+    """
+    from torch import nn
+    import torchvision.transforms as transforms
+    import torchvision.models as models
+
+    model = models.resnet50(weights=None)
+    model.fc = nn.Linear(in_features=model.fc.in_features,out_features=14*2)
+    model.load_state_dict(torch.load(model_path,map_location="cpu"))
+    transform = transforms.Compose([
+        transforms.ToPILImage(),
+        transforms.Resize((224,224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+    img_rgb = cv.cvtColor(image,cv.COLOR_BGR2RGB)
+    with torch.no_grad():
+        keypoints = model(transform(img_rgb).unsqueeze(0)).squeeze().cpu().numpy()
+    keypoints[::2] *= image.shape[1]/225.0
+    keypoints[1::2] *= image.shape[0]/225.0
+    return keypoints
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    """
+    State dict of a random keypoints model, with batch norms that are not the identity
+    """
+    import torchvision.models as models
+
+    torch.manual_seed(0)
+    model = models.resnet50(weights=None)
+    model.fc = torch.nn.Linear(in_features=model.fc.in_features,out_features=14*2)
+    for module in model.modules():
+        if isinstance(module,torch.nn.BatchNorm2d):
+            module.weight.data.uniform_(0.5,1.5)
+            module.bias.data.uniform_(-0.2,0.2)
+            module.running_mean.uniform_(-1,1)
+            module.running_var.uniform_(0.5,2)
+    model_path = str(tmp_path_factory.mktemp("models")/"keypoints_model.pth")
+    torch.save(model.state_dict(),model_path)
+    return model_path
+
+@pytest.fixture(scope="module")
+def stored_frames():
+    return [cv.imread(os.path.join(ROOT_DIR,image_path)) for image_path in CHECK_IMAGES]
+
+def test_pth_model_predicts_the_baseline_keypoints(model_path):
+    images = [np.random.default_rng(seed).integers(0,256,(360,640,3),dtype=np.uint8) for seed in range(2)]
+
+    keypoints = LineDetector(model_path).predict_batch(images)
+
+    for image, image_keypoints in zip(images,keypoints):
+        np.testing.assert_allclose(image_keypoints,predict_baseline(model_path,image),rtol=1e-4,atol=1e-3)
+
+@pytest.mark.parametrize("export_format",EXPORT_FORMATS)
+def test_exported_model_predicts_the_pth_keypoints(model_path,stored_frames,tmp_path,export_format):
+    pytest.importorskip("onnxruntime")
+    output_path = str(tmp_path/f"keypoints_model.{export_format}")
+
+    _,report = export_line_detector(model_path,export_format,output_path=output_path,check_images=stored_frames)
+    keypoints = LineDetector(output_path).predict_batch(stored_frames)
+    reference = LineDetector(model_path).predict_batch(stored_frames)
+
+    assert report["max_distance"] <= MAX_KEYPOINT_DISTANCE
+    np.testing.assert_allclose(np.array(keypoints),np.array(reference),atol=MAX_KEYPOINT_DISTANCE)
+
+def test_export_is_deleted_when_the_keypoints_drift(model_path,stored_frames,tmp_path):
+    output_path = str(tmp_path/"keypoints_model.torchscript")
+
+    with pytest.raises(ParityError):
+        export_line_detector(model_path,"torchscript",output_path=output_path,check_images=stored_frames,max_distance=0.0)
+    assert not os.path.exists(output_path)
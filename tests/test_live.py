@@ -0,0 +1,14 @@
+from pipeline import LivePipeline
+
+def test_frames_are_dropped_when_wait_plus_processing_is_over_the_budget():
+    live_pipeline = LivePipeline(None,None,None,latency_budget=0.5)
+    live_pipeline.processing_time = 0.3
+
+    assert not live_pipeline.should_drop(0.1)
+    assert live_pipeline.should_drop(0.3)
+
+def test_newest_frame_is_kept_when_processing_alone_is_over_the_budget():
+    live_pipeline = LivePipeline(None,None,None,latency_budget=0.5)
+    live_pipeline.processing_time = 0.8
+
+    assert not live_pipeline.should_drop(0.3)
@@ -0,0 +1,54 @@
+import numpy as np
+from utils import get_court_layout,get_court_layouts,iter_batches
+from trackers import TrackPlayer,RoleClassifier
+from minimap import DrawMinimap
+
+#Court keypoints of input_images/input_video.mp4 (1920x1080)
+KEYPOINTS = [599.33,310.63,1309.3,310.45,339.4,853.02,1568.7,851.71,688.38,310.58,494.07,852.89,1220.4,310.46,
+             1414.7,851.69,659.8,90.25,1249,389.88,560.99,666.01,1348.4,665.21,954.17,389.98,954.54,665.73]
+
+def get_player_detections():
+    """
+    Players 1 (top) and 2 (bottom) on their baselines, player 1 lost on frame 30 and found again as track 3
+    """
+    player_detections = []
+    for frame_num in range(60):
+        top_id = 1 if frame_num < 30 else 3
+        player_detections.append({top_id:[900.0+frame_num,180.0,960.0+frame_num,305.0],
+                                  2:[1000.0,700.0,1100.0,850.0]})
+    return player_detections
+
+def test_late_player_track_gets_player_role():
+    player_tracker = TrackPlayer(model_path="unused.pt")
+    players,_,roles = player_tracker.assign_and_filter_roles(get_court_layout(KEYPOINTS),get_player_detections(),RoleClassifier(player_tracker))
+
+    assert roles[-1][3] == "Player"
+    assert set(players[-1]) == {2,3}
+
+def test_roles_use_the_court_of_the_frame_the_track_is_classified_on():
+    #The camera moved on frame 30: the court was 400 pixels lower before
+    moved_keypoints = [value+400 if i % 2 == 1 else value for i,value in enumerate(KEYPOINTS)]
+    court_layouts = get_court_layouts([(0,moved_keypoints),(30,KEYPOINTS)])
+    player_tracker = TrackPlayer(model_path="unused.pt")
+    _,_,roles = player_tracker.assign_and_filter_roles(court_layouts[0][1],get_player_detections(),RoleClassifier(player_tracker),court_layouts)
+
+    assert roles[-1][1] != "Player"
+    assert roles[-1][3] == "Player"
+
+def test_batches_do_not_span_two_court_segments():
+    batches = list(iter_batches(range(10),4,boundaries=[0,6]))
+
+    assert batches == [[0,1,2,3],[4,5],[6,7,8,9]]
+
+def test_minimap_accepts_player_track_ids_above_2():
+    minimap = DrawMinimap(np.zeros((1080,1920,3),np.uint8))
+    player_detections = get_player_detections()
+    ball_detections = [{1:[950.0,500.0,960.0,510.0]} for _ in player_detections]
+
+    player_minimap,ball_minimap = minimap.convert_bbox_to_minimap_coor(player_detections,ball_detections,KEYPOINTS)
+    assert set(player_minimap[-1]) == {2,3}
+    assert len(ball_minimap[-1]) == 1
+
+    frame_players,frame_ball = minimap.convert_frame_to_minimap_coor(player_detections[-1],ball_detections[-1],KEYPOINTS,{2:150.0,3:125.0})
+    assert set(frame_players) == {2,3}
+    assert len(frame_ball) == 1
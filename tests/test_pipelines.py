@@ -0,0 +1,104 @@
+import os
+import sys
+import io
+import contextlib
+import numpy as np
+import cv2 as cv
+import pytest
+
+#The synthetic video and the fake detectors of the benchmark suite stand in for the models
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"benchmarks"))
+from synthetic import get_synthetic_video
+from fakes import FakePlayerTracker,FakeBallTracker,FakeLineDetector
+from pipeline import StreamPipeline,ThreadedPipeline
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    return get_synthetic_video(str(tmp_path_factory.mktemp("videos")),1280,720,40)
+
+CUT_FRAME = 22 #First frame after the camera cut of the cut video
+CUT_SHIFT = 20 #The court is this many pixels lower after the cut
+
+class CutLineDetector(FakeLineDetector):
+    """
+    Gives the court CUT_SHIFT pixels lower on the frames after the cut (they are brighter)
+    """
+    def __init__(self,keypoints,cut_brightness):
+        super().__init__(keypoints)
+        self.cut_brightness = cut_brightness
+
+    def predict_batch(self,images):
+        return [self.keypoints+np.tile([0,CUT_SHIFT],len(self.keypoints)//2).astype(np.float32) if image.mean() > self.cut_brightness else self.keypoints.copy()
+                for image in images]
+
+class CourtRecordingPlayerTracker(FakePlayerTracker):
+    """
+    Records the top baseline of the court layout each frame was cropped with
+    """
+    def __init__(self,**kwargs):
+        super().__init__(**kwargs)
+        self.top_baselines = []
+
+    def predict_batch(self,frames,court_layout=None):
+        self.top_baselines.extend([np.array(court_layout["top_baseline"]).tolist()]*len(frames))
+        return super().predict_batch(frames,court_layout)
+
+@pytest.fixture(scope="module")
+def cut_video(video,tmp_path_factory):
+    video_path,keypoints = video
+    frames = read_frames(video_path)
+    cut_path = str(tmp_path_factory.mktemp("videos")/"cut.avi")
+    writer = cv.VideoWriter(cut_path,cv.VideoWriter_fourcc(*'MJPG'),30,(1280,720))
+    for frame_num, frame in enumerate(frames):
+        writer.write(cv.add(frame,(40,40,40,0)) if frame_num >= CUT_FRAME else frame)
+    writer.release()
+    return cut_path,keypoints,float(frames[0].mean())+20
+
+def run_pipeline(pipeline_class,video,output_path,line_detector=None,player_tracker=None,**kwargs):
+    video_path,keypoints = video[:2]
+    line_detector = FakeLineDetector(keypoints) if line_detector is None else line_detector
+    player_tracker = FakePlayerTracker() if player_tracker is None else player_tracker
+    stream_pipeline = pipeline_class(line_detector,player_tracker,FakeBallTracker(),batch_size=4,**kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        frame_count = stream_pipeline.run(video_path,str(output_path))
+    return frame_count
+
+def read_frames(video_path):
+    cap = cv.VideoCapture(str(video_path))
+    frames = []
+    while True:
+        ret,frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def test_threaded_pipeline_matches_stream_pipeline(video,tmp_path):
+    assert run_pipeline(StreamPipeline,video,tmp_path/"stream.avi") == 40
+    assert run_pipeline(ThreadedPipeline,video,tmp_path/"threaded.avi") == 40
+
+    stream_frames = read_frames(tmp_path/"stream.avi")
+    threaded_frames = read_frames(tmp_path/"threaded.avi")
+    assert len(stream_frames) == len(threaded_frames) == 40
+    assert all((stream_frame == threaded_frame).all() for stream_frame,threaded_frame in zip(stream_frames,threaded_frames))
+
+@pytest.mark.parametrize("pipeline_class",[StreamPipeline,ThreadedPipeline])
+def test_player_crop_follows_the_tracked_court(cut_video,tmp_path,pipeline_class):
+    _,keypoints,cut_brightness = cut_video
+    player_tracker = CourtRecordingPlayerTracker(court_roi=True)
+    run_pipeline(pipeline_class,cut_video,tmp_path/"cut.avi",CutLineDetector(keypoints,cut_brightness),player_tracker,track_court=True)
+
+    top_baseline = [[int(keypoints[0]),int(keypoints[1])],[int(keypoints[2]),int(keypoints[3])]]
+    cut_top_baseline = [[x,y+CUT_SHIFT] for x,y in top_baseline]
+    assert player_tracker.top_baselines == [top_baseline]*CUT_FRAME + [cut_top_baseline]*(40-CUT_FRAME)
+
+def test_threaded_pipeline_matches_stream_pipeline_on_a_moving_court(cut_video,tmp_path):
+    _,keypoints,cut_brightness = cut_video
+    for pipeline_class,output_path in ((StreamPipeline,tmp_path/"stream.avi"),(ThreadedPipeline,tmp_path/"threaded.avi")):
+        run_pipeline(pipeline_class,cut_video,output_path,CutLineDetector(keypoints,cut_brightness),FakePlayerTracker(court_roi=True),track_court=True)
+
+    stream_frames = read_frames(tmp_path/"stream.avi")
+    threaded_frames = read_frames(tmp_path/"threaded.avi")
+    assert len(stream_frames) == len(threaded_frames) == 40
+    assert all((stream_frame == threaded_frame).all() for stream_frame,threaded_frame in zip(stream_frames,threaded_frames))
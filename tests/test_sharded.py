@@ -0,0 +1,49 @@
+from pipeline import ShardedDetector
+from pipeline.sharded import plan_shards,link_tracks
+
+def get_player_detections(frame_count=200):
+    """
+    Two players across the whole video, a third person from frame 120
+    """
+    player_detections = []
+    for frame_num in range(frame_count):
+        player_dict = {1:[100.0+frame_num,100.0,160.0+frame_num,220.0],2:[600.0,400.0-frame_num,680.0,560.0-frame_num]}
+        if frame_num >= 120:
+            player_dict[3] = [1000.0,300.0,1040.0,380.0]
+        player_detections.append(player_dict)
+    return player_detections
+
+def run_shards(player_detections,shards,overlap):
+    """
+    Detections of each segment as a worker would give them: its own track ids, and boxes that are off
+    while its tracker warms up
+    """
+    results = []
+    for shard_num,(read_start,start,end) in enumerate(shards):
+        shard_players = []
+        for frame_num in range(read_start,len(player_detections) if end is None else end):
+            settling = frame_num < start-overlap
+            shard_players.append({track_id+10*shard_num:[value+500 for value in bbox] if settling else bbox
+                                  for track_id,bbox in player_detections[frame_num].items()})
+        results.append((shard_players,[{}]*((len(player_detections) if end is None else end)-start)))
+    return results
+
+def test_link_tracks_matches_the_most_overlapping_tracks():
+    previous_detections = [{1:[0,0,10,10],2:[20,0,30,10]}]*5
+    detections = [{7:[21,0,31,10],8:[0,1,10,11],9:[50,50,60,60]}]*5
+
+    assert link_tracks(previous_detections,detections) == {7:2,8:1}
+
+def test_plan_shards_reads_the_warm_up_and_overlap_before_each_segment():
+    assert plan_shards(200,4,overlap=20,warm_up=10) == [(0,0,50),(20,50,100),(70,100,150),(120,150,None)]
+    assert len(plan_shards(50,4,overlap=20,warm_up=10)) == 1
+
+def test_stitch_gives_the_ids_of_a_single_process():
+    player_detections = get_player_detections()
+    sharded_detector = ShardedDetector({},{},workers=4,overlap=20,warm_up=30)
+    shards = plan_shards(len(player_detections),4,overlap=20,warm_up=30)
+
+    stitched_players,stitched_balls = sharded_detector.stitch(shards,run_shards(player_detections,shards,overlap=20))
+
+    assert stitched_players == player_detections
+    assert len(stitched_balls) == len(player_detections)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from tracks import TrackStore,get_dicts_nbytes
+
+@pytest.fixture
+def detections():
+    #Track 1 in every frame, track 2 from the second frame, nothing in the last frame
+    return [{1: [10.0,20.0,30.0,80.0]},
+            {2: [100.5,50.0,120.0,90.0],1: [11.0,21.0,31.0,81.0]},
+            {1: [12.0,22.0,32.0,82.0],2: [101.5,51.0,121.0,91.0]},
+            {}]
+
+def test_dicts_round_trip(detections):
+    store = TrackStore.from_dicts(detections,bbox_dtype=np.float64)
+
+    assert len(store) == 5
+    assert store.frame_count == 4
+    assert store.to_dicts() == detections
+
+def test_detections_keep_their_order_inside_a_frame(detections):
+    store = TrackStore.from_dicts(detections)
+
+    assert list(store.frame(1).keys()) == [2,1]
+
+def test_frame_rows_and_track_rows(detections):
+    store = TrackStore.from_dicts(detections)
+
+    assert store.track_id[store.frame_rows(1)].tolist() == [2,1]
+    assert len(store.track_id[store.frame_rows(3)]) == 0
+    assert store.frame_index[store.track_rows(1)].tolist() == [0,1,2]
+    assert store.bbox[store.track_rows(2),0].tolist() == [100.5,101.5]
+    assert len(store.track_rows(7)) == 0
+
+def test_assign_roles(detections):
+    store = TrackStore.from_dicts(detections,{1: "Player",2: "Umpire"})
+    assert store.role_assignments() == {1: "Player",2: "Umpire"}
+
+    #Tracks that are not in the assignments are Unknown again
+    store.assign_roles({2: "Line Judge"})
+    assert store.role_assignments() == {1: "Unknown",2: "Line Judge"}
+
+def test_select_keeps_the_frames(detections):
+    store = TrackStore.from_dicts(detections,{1: "Player",2: "Umpire"},bbox_dtype=np.float64)
+    players = store.select_role("Player")
+
+    assert players.frame_count == 4
+    assert players.to_dicts() == [{track_id: bbox for track_id, bbox in detection_dict.items() if track_id == 1}
+                                  for detection_dict in detections]
+    assert players.role_assignments() == {1: "Player"}
+    assert len(store.select(np.zeros(len(store),bool))) == 0
+
+def test_store_is_smaller_than_the_dicts():
+    long_detections = [{track_id: [float(frame_num+i) for i in range(4)] for track_id in (1,2,3)} for frame_num in range(1000)]
+
+    assert TrackStore.from_dicts(long_detections).nbytes()*5 < get_dicts_nbytes(long_detections)
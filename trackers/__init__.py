@@ -1,2 +1,4 @@
-from .track_player import TrackPlayer
-from .track_ball import TrackBall
\ No newline at end of file
+from .track_player import TrackPlayer,ROLE_ASSIGNMENT_FRAME
+from .track_ball import TrackBall
+from .ball_interpolator import BallInterpolator
+from .role_classifier import RoleClassifier,ROLE_STABILITY_FRAMES
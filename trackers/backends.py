@@ -0,0 +1,260 @@
+import os
+import ast
+from abc import ABC,abstractmethod
+import numpy as np
+import cv2 as cv
+
+#Same defaults as ultralytics predict()
+DEFAULT_IMGSZ = 640
+DEFAULT_CONF = 0.25
+DEFAULT_IOU = 0.7
+MAX_DETECTIONS = 300
+STRIDE = 32
+LETTERBOX_COLOUR = (114,114,114)
+
+class UltralyticsBackend:
+    """
+    YOLO weights (.pt) run with ultralytics and PyTorch eager inference
+    """
+    def __init__(self,model_path,imgsz=None,threads=None):
+        """
+        Args:
+            model_path (str): Path of the YOLO weights
+            imgsz (int): Default input size (ultralytics default if None)
+            threads (int): Number of CPU threads used by torch (torch default if None)
+        """
+        from ultralytics import YOLO
+        if threads is not None:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+        self.imgsz = imgsz
+
+    def predict(self,frames,**params):
+        """
+        Args:
+            frames (list): List of BGR frames
+            **params: Parameters of YOLO.predict() (conf, imgsz, classes...)
+        Returns:
+            detections (list): One (n,6) array of [x1,y1,x2,y2,conf,cls] per frame
+        """
+        if self.imgsz is not None:
+            params = {"imgsz":self.imgsz,**params}
+        results = self.model.predict(frames,**params)
+
+        return [result.boxes.data.cpu().numpy() for result in results]
+
+class ExportedBackend(ABC):
+    """
+    Pre- and post-processing of a YOLOv8 graph exported by trackers.export, done with OpenCV and NumPy
+    the same way as ultralytics (letterbox, confidence threshold, per-class NMS). Subclasses run the graph
+    """
+    def __init__(self,input_shape,names,imgsz=None):
+        """
+        Args:
+            input_shape (tuple): Input shape of the graph (N,3,H,W), dimensions that are not fixed are None
+            names (dict): Class id -> name
+            imgsz (int): Input size used when the graph takes any size (DEFAULT_IMGSZ if None)
+        """
+        self.fixed_batch = input_shape[0]
+        self.fixed_size = None if input_shape[2] is None or input_shape[3] is None else (input_shape[2],input_shape[3])
+        self.names = names
+        self.imgsz = imgsz if imgsz is not None else DEFAULT_IMGSZ
+
+    @abstractmethod
+    def run(self,batch):
+        """
+        Args:
+            batch (array): (N,3,H,W) float32 RGB images in [0,1]
+        Returns:
+            output (array): (N,4+classes,anchors) raw predictions
+        """
+
+    def predict(self,frames,conf=DEFAULT_CONF,iou=DEFAULT_IOU,imgsz=None,classes=None,max_det=MAX_DETECTIONS,**params):
+        """
+        Args:
+            frames (list): List of BGR frames (all the same size)
+            conf (float): Min confidence of a detection
+            iou (float): IoU threshold of the NMS
+            imgsz (int): Input size, only used when the graph takes any size
+            classes (list): Only keep these classes (all if None)
+            max_det (int): Max number of detections per frame
+            **params: Other YOLO.predict() parameters, not used
+        Returns:
+            detections (list): One (n,6) array of [x1,y1,x2,y2,conf,cls] per frame
+        """
+        if len(frames) == 0:
+            return []
+
+        if self.fixed_size is not None:
+            new_shape,auto = self.fixed_size,False
+        else:
+            size = imgsz if imgsz is not None else self.imgsz
+            new_shape,auto = (size,size),True #Only pad to a multiple of the stride like ultralytics on .pt models
+
+        #The frames of a batch all have the same size, so the same gain and padding
+        images = []
+        for frame in frames:
+            image,gain,pad = letterbox(frame,new_shape,auto)
+            images.append(image)
+        batch = np.stack(images).transpose(0,3,1,2)[:,::-1].astype(np.float32)*(1/255) #BGR HWC -> RGB CHW
+
+        #Graphs exported with a fixed batch size are run one frame at a time
+        if self.fixed_batch is not None:
+            output = np.concatenate([self.run(np.ascontiguousarray(batch[i:i+self.fixed_batch])) for i in range(0,len(batch),self.fixed_batch)])
+        else:
+            output = self.run(np.ascontiguousarray(batch))
+
+        return [postprocess(prediction,frame.shape[:2],gain,pad,conf,iou,classes,max_det) for prediction,frame in zip(output,frames)]
+
+class OnnxBackend(ExportedBackend):
+    """
+    YOLOv8 graph exported to ONNX (.onnx), run with ONNX Runtime
+    """
+    def __init__(self,model_path,imgsz=None,threads=None):
+        """
+        Args:
+            model_path (str): Path of the ONNX graph
+            imgsz (int): Input size when the graph was exported with dynamic shapes
+            threads (int): Number of CPU threads used by ONNX Runtime (ONNX Runtime default if None)
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads is not None:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path,options,providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        #ultralytics stores the class names in the metadata of the graph
+        names = ast.literal_eval(self.session.get_modelmeta().custom_metadata_map["names"])
+        input_shape = [dim if isinstance(dim,int) else None for dim in model_input.shape]
+        super().__init__(input_shape,names,imgsz)
+
+    def run(self,batch):
+        return self.session.run(None,{self.input_name:batch})[0]
+
+class OpenVinoBackend(ExportedBackend):
+    """
+    YOLOv8 graph exported to OpenVINO IR (the .xml of <model>_openvino_model/, with its .bin and metadata.yaml)
+    """
+    def __init__(self,model_path,imgsz=None,threads=None):
+        """
+        Args:
+            model_path (str): Path of the .xml file
+            imgsz (int): Input size when the graph was exported with dynamic shapes
+            threads (int): Number of CPU threads used by OpenVINO (OpenVINO default if None)
+        """
+        import yaml
+        import openvino as ov
+
+        core = ov.Core()
+        config = {"PERFORMANCE_HINT":"LATENCY"}
+        if threads is not None:
+            config["INFERENCE_NUM_THREADS"] = threads
+        model = core.read_model(model_path)
+        self.compiled_model = core.compile_model(model,"CPU",config)
+        self.output = self.compiled_model.output(0)
+
+        with open(os.path.join(os.path.dirname(model_path),"metadata.yaml"),"r") as f:
+            names = yaml.safe_load(f)["names"]
+        partial_shape = model.input(0).get_partial_shape()
+        input_shape = [dim.get_length() if dim.is_static else None for dim in partial_shape]
+        super().__init__(input_shape,names,imgsz)
+
+    def run(self,batch):
+        return self.compiled_model(batch)[self.output]
+
+def letterbox(image,new_shape,auto=False):
+    """
+    Resize keeping the aspect ratio and pad with grey, same as ultralytics LetterBox
+    Args:
+        image (array): BGR frame
+        new_shape (tuple): (height,width) of the input
+        auto (bool): Only pad up to a multiple of the stride instead of the full new_shape
+    Returns:
+        image (array): Letterboxed frame
+        gain (float): Resize factor
+        pad (tuple): (left,top) padding in pixels
+    """
+    height,width = image.shape[:2]
+    gain = min(new_shape[0]/height,new_shape[1]/width)
+    new_width,new_height = int(round(width*gain)),int(round(height*gain))
+    pad_width,pad_height = new_shape[1]-new_width,new_shape[0]-new_height
+    if auto:
+        pad_width,pad_height = pad_width%STRIDE,pad_height%STRIDE
+
+    if (width,height) != (new_width,new_height):
+        image = cv.resize(image,(new_width,new_height),interpolation=cv.INTER_LINEAR)
+    top,bottom = int(round(pad_height/2-0.1)),int(round(pad_height/2+0.1))
+    left,right = int(round(pad_width/2-0.1)),int(round(pad_width/2+0.1))
+    image = cv.copyMakeBorder(image,top,bottom,left,right,cv.BORDER_CONSTANT,value=LETTERBOX_COLOUR)
+
+    return image,gain,(left,top)
+
+def postprocess(prediction,frame_shape,gain,pad,conf=DEFAULT_CONF,iou=DEFAULT_IOU,classes=None,max_det=MAX_DETECTIONS):
+    """
+    Turn the raw predictions of one frame into detections in frame coordinates
+    Args:
+        prediction (array): (4+classes,anchors) array of [cx,cy,w,h,class scores...]
+        frame_shape (tuple): (height,width) of the frame
+        gain (float): Resize factor of the letterbox
+        pad (tuple): (left,top) padding of the letterbox
+        conf (float): Min confidence
+        iou (float): IoU threshold of the NMS (classes are suppressed separately)
+        classes (list): Only keep these classes (all if None)
+        max_det (int): Max number of detections
+    Returns:
+        detections (array): (n,6) float32 array of [x1,y1,x2,y2,conf,cls], the most confident first
+    """
+    prediction = prediction.T
+    scores = prediction[:,4:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)),class_ids]
+    keep = confidences > conf
+    if classes is not None:
+        keep &= np.isin(class_ids,classes)
+    boxes,class_ids,confidences = prediction[keep,:4],class_ids[keep],confidences[keep]
+    if len(boxes) == 0:
+        return np.zeros((0,6),np.float32)
+
+    #Boxes of different classes never overlap once each class is shifted by its own offset
+    xyxy = np.column_stack([boxes[:,0]-boxes[:,2]/2,boxes[:,1]-boxes[:,3]/2,boxes[:,0]+boxes[:,2]/2,boxes[:,1]+boxes[:,3]/2])
+    offset_boxes = xyxy + (class_ids*7680.0)[:,None]
+    kept = cv.dnn.NMSBoxes(np.column_stack([offset_boxes[:,:2],offset_boxes[:,2:]-offset_boxes[:,:2]]).tolist(),
+                           confidences.tolist(),conf,iou)
+    kept = np.array(kept,int).reshape(-1)
+    kept = kept[np.argsort(-confidences[kept],kind="stable")][:max_det]
+
+    #Back to frame coordinates
+    xyxy = (xyxy[kept] - [pad[0],pad[1],pad[0],pad[1]])/gain
+    xyxy[:,[0,2]] = xyxy[:,[0,2]].clip(0,frame_shape[1])
+    xyxy[:,[1,3]] = xyxy[:,[1,3]].clip(0,frame_shape[0])
+
+    return np.column_stack([xyxy,confidences[kept],class_ids[kept]]).astype(np.float32)
+
+#Backend used for each model file extension
+BACKENDS = {
+    ".pt": UltralyticsBackend,
+    ".onnx": OnnxBackend,
+    ".xml": OpenVinoBackend
+}
+
+def load_detector(model_path,imgsz=None,threads=None):
+    """
+    Load a YOLO detector with the backend that matches its file extension
+    Args:
+        model_path (str): Path of the model (.pt, .onnx, or the .xml of an OpenVINO export)
+        imgsz (int): Input size (the export size is used for graphs exported with a fixed size)
+        threads (int): Number of CPU threads used by the model (library default if None)
+    Returns:
+        backend: Has .names (class id -> name) and .predict(frames,**params) giving (n,6) arrays of [x1,y1,x2,y2,conf,cls]
+    """
+    extension = os.path.splitext(model_path)[1].lower()
+    if extension not in BACKENDS:
+        raise ValueError(f"Unsupported detector model format '{extension}', expected one of {list(BACKENDS)}")
+
+    return BACKENDS[extension](model_path,imgsz,threads)
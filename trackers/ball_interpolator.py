@@ -0,0 +1,165 @@
+import numpy as np
+from utils import timed
+
+class BallInterpolator:
+    """
+    Fills in the frames where the ball is not detected, one frame at a time and without pandas.
+    Frames without the ball are held back until the ball is seen again, then interpolated linearly between
+    the two detections and given back at once. With no limits set the output is the same as
+    DataFrame.interpolate() followed by bfill() over the whole video
+    """
+    def __init__(self,max_gap=None,max_latency=None,max_jump=None):
+        """
+        Args:
+            max_gap (int): Longest run of frames without the ball that is interpolated.
+                           On longer gaps the ball is considered lost and those frames get no ball (no limit if None)
+            max_latency (int): Max number of frames a frame is held back. After that it gets the last known position,
+                               like the end of the video (no limit if None)
+            max_jump (float): Max distance (pixels per frame) the ball centre can move from the last detection,
+                              detections further away are ignored as outliers (no limit if None)
+        """
+        self.max_gap = max_gap
+        self.max_latency = max_latency
+        self.max_jump = max_jump
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new video
+        """
+        self.next_frame_num = 0
+        self.last_position = None #Last accepted detection [x1,y1,x2,y2]
+        self.last_frame_num = None
+        self.pending = [] #Frame numbers held back since the last detection
+        self.lost = False
+
+    @timed("ball_interpolation")
+    def push(self,ball_dict):
+        """
+        Add the detections of the next frame
+        Args:
+            ball_dict (dict): Dictionary with ball id and bounding box coordinates
+        Returns:
+            ready (list): List of (frame number, ball dictionary) of the frames that are done, in frame order
+        """
+        frame_num = self.next_frame_num
+        self.next_frame_num += 1
+
+        position = ball_dict.get(1,[])
+        if len(position) > 0 and not self.is_outlier(position,frame_num):
+            return self.close_gap(frame_num,np.asarray(position,np.float64))
+
+        if self.lost:
+            return [(frame_num,{})]
+
+        self.pending.append(frame_num)
+        if self.max_gap is not None and len(self.pending) > self.max_gap:
+            #Gap too long to interpolate over, the ball left the frame
+            ready = [(pending_frame_num,{}) for pending_frame_num in self.pending]
+            self.pending = []
+            self.last_position = None
+            self.last_frame_num = None
+            self.lost = True
+            return ready
+
+        if self.max_latency is not None:
+            return self.release_late_frames(frame_num)
+
+        return []
+
+    @timed("ball_interpolation")
+    def flush(self):
+        """
+        Give back the frames still held at the end of the video, with the last known position
+        Returns:
+            ready (list): List of (frame number, ball dictionary) in frame order
+        """
+        ready = [(frame_num,self.held_position()) for frame_num in self.pending]
+        self.pending = []
+
+        return ready
+
+    def is_outlier(self,position,frame_num):
+        """
+        Returns:
+            bool: True if the ball centre moved more than max_jump pixels per frame since the last detection
+        """
+        if self.max_jump is None or self.last_position is None:
+            return False
+
+        x1,y1,x2,y2 = position
+        last_x1,last_y1,last_x2,last_y2 = self.last_position
+        distance = np.hypot((x1+x2-last_x1-last_x2)/2,(y1+y2-last_y1-last_y2)/2)
+
+        return distance > self.max_jump*(frame_num-self.last_frame_num)
+
+    def close_gap(self,frame_num,position):
+        """
+        The ball is seen again, interpolate the frames held back since the last detection
+        Args:
+            frame_num (int): Frame number of the detection
+            position (array): Detected bounding box [x1,y1,x2,y2]
+        Returns:
+            ready (list): List of (frame number, ball dictionary) in frame order
+        """
+        ready = []
+        if len(self.pending) > 0:
+            if self.last_position is None:
+                #Start of the video, same as bfill()
+                positions = np.tile(position,(len(self.pending),1))
+            else:
+                #Same formula as DataFrame.interpolate() (np.interp between the two detections)
+                positions = np.column_stack([np.interp(self.pending,[self.last_frame_num,frame_num],[start,end])
+                                             for start,end in zip(self.last_position,position)])
+            ready = [(pending_frame_num,{1:pending_position}) for pending_frame_num,pending_position in zip(self.pending,positions.tolist())]
+
+        ready.append((frame_num,{1:position.tolist()}))
+        self.pending = []
+        self.last_position = position
+        self.last_frame_num = frame_num
+        self.lost = False
+
+        return ready
+
+    def release_late_frames(self,frame_num):
+        """
+        Give back the frames held back for max_latency frames, with the last known position
+        """
+        late_count = 0
+        while late_count < len(self.pending) and frame_num-self.pending[late_count] >= self.max_latency:
+            late_count += 1
+
+        ready = [(pending_frame_num,self.held_position()) for pending_frame_num in self.pending[:late_count]]
+        del self.pending[:late_count]
+
+        return ready
+
+    def held_position(self):
+        """
+        Returns:
+            ball_dict (dict): Last known position ({} if the ball has not been seen yet)
+        """
+        if self.last_position is None:
+            return {}
+        return {1:self.last_position.tolist()}
+
+@timed("ball_interpolation")
+def interpolate_positions(ball_positions):
+    """
+    Interpolate a whole video at once, same output as BallInterpolator with no limits but vectorised
+    Args:
+        ball_positions (list): List of ball dictionaries of the video
+    Returns:
+        ball_positions (list): List of ball dictionaries after interpolation ({} everywhere if the ball is never seen)
+    """
+    frame_nums = [frame_num for frame_num, ball_dict in enumerate(ball_positions) if len(ball_dict.get(1,[])) > 0]
+    if len(frame_nums) == 0:
+        return [{} for _ in ball_positions]
+
+    positions = np.array([ball_positions[frame_num][1] for frame_num in frame_nums],np.float64)
+
+    #np.interp holds the first and last values outside the detections, same as bfill() and interpolate()
+    all_frame_nums = np.arange(len(ball_positions))
+    interpolated = np.column_stack([np.interp(all_frame_nums,frame_nums,positions[:,column]) for column in range(positions.shape[1])])
+
+    return [{1:position} for position in interpolated.tolist()]
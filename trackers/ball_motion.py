@@ -0,0 +1,78 @@
+import cv2 as cv
+import numpy as np
+
+class BallMotionModel:
+    """
+    Constant velocity Kalman filter on the centre of the ball, used to predict where to look for it in the next frame
+    """
+    def __init__(self,max_misses=5,process_noise=4.0,measurement_noise=1.0):
+        """
+        Args:
+            max_misses (int): Number of frames in a row without the ball after which the track is lost
+            process_noise (float): Variance of the change of velocity between two frames (pixels)
+            measurement_noise (float): Variance of the detected centre (pixels)
+        """
+        self.max_misses = max_misses
+
+        #State is [x,y,vx,vy], the detector measures [x,y]
+        self.kalman = cv.KalmanFilter(4,2)
+        self.kalman.transitionMatrix = np.array([[1,0,1,0],
+                                                 [0,1,0,1],
+                                                 [0,0,1,0],
+                                                 [0,0,0,1]],np.float32)
+        self.kalman.measurementMatrix = np.array([[1,0,0,0],
+                                                  [0,1,0,0]],np.float32)
+        self.kalman.processNoiseCov = np.diag([1,1,process_noise,process_noise]).astype(np.float32)
+        self.kalman.measurementNoiseCov = np.eye(2,dtype=np.float32)*measurement_noise
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the track (new video, or the ball was lost)
+        """
+        self.initialised = False
+        self.misses = 0
+        self.predicted_centre = None
+
+    def is_tracking(self):
+        """
+        Returns:
+            bool: True if the position of the ball can be predicted
+        """
+        return self.initialised and self.misses < self.max_misses
+
+    def predict(self):
+        """
+        Move the track to the next frame
+        Returns:
+            predicted_centre (tuple): Predicted (x,y) of the ball, None if the ball is not tracked
+        """
+        if not self.is_tracking():
+            self.predicted_centre = None
+            return None
+
+        state = self.kalman.predict()
+        self.predicted_centre = (float(state[0,0]),float(state[1,0]))
+        return self.predicted_centre
+
+    def update(self,centre):
+        """
+        Update the track with the detection of the current frame
+        Args:
+            centre (tuple): Detected (x,y) of the ball, None if the ball was not detected
+        """
+        if centre is None:
+            self.misses += 1
+            if self.misses >= self.max_misses:
+                self.reset()
+            return
+
+        measurement = np.array([[centre[0]],[centre[1]]],np.float32)
+        if not self.initialised:
+            #Start a new track at the detection, with no velocity and a large velocity uncertainty
+            self.kalman.statePost = np.array([[centre[0]],[centre[1]],[0],[0]],np.float32)
+            self.kalman.errorCovPost = np.diag([1,1,1000,1000]).astype(np.float32)
+            self.initialised = True
+        else:
+            self.kalman.correct(measurement)
+        self.misses = 0
@@ -0,0 +1,85 @@
+import cv2 as cv
+import numpy as np
+from utils import timed
+
+#Lucas-Kanade settings, 3 pyramid levels handle the motion of a player between two frames
+LK_PARAMS = dict(winSize=(15,15),maxLevel=2,criteria=(cv.TERM_CRITERIA_EPS|cv.TERM_CRITERIA_COUNT,20,0.03))
+
+class BoxFlow:
+    """
+    Moves bounding boxes from one frame to the next with sparse optical flow (Lucas-Kanade), used to skip
+    the detector between keyframes
+    """
+    def __init__(self,min_points=8,max_residual=1.0,points_per_box=20):
+        """
+        Args:
+            min_points (int): Min number of points that must be tracked reliably inside each box
+            max_residual (float): Max forward-backward error (pixels) of a point for it to be reliable
+            points_per_box (int): Number of corners tracked in each box
+        """
+        self.min_points = min_points
+        self.max_residual = max_residual
+        self.points_per_box = points_per_box
+
+    def get_points(self,gray,boxes):
+        """
+        Find the corners to track inside each box
+        Args:
+            gray (array): Grayscale frame the boxes are in
+            boxes (array): (n,4) array of [x1,y1,x2,y2]
+        Returns:
+            points (array): (m,1,2) float32 array of corners
+            box_index (array): Index of the box of each corner
+        """
+        frame_h,frame_w = gray.shape
+        points = []
+        box_index = []
+        for i, (x1,y1,x2,y2) in enumerate(boxes):
+            x1,y1 = max(int(x1),0),max(int(y1),0)
+            x2,y2 = min(int(x2),frame_w),min(int(y2),frame_h)
+            if x2-x1 < 2 or y2-y1 < 2:
+                continue
+            corners = cv.goodFeaturesToTrack(gray[y1:y2,x1:x2],self.points_per_box,0.01,3)
+            if corners is None:
+                continue
+            points.append(corners+np.array([x1,y1],np.float32))
+            box_index.append(np.full(len(corners),i))
+
+        if len(points) == 0:
+            return np.zeros((0,1,2),np.float32),np.zeros(0,int)
+        return np.concatenate(points),np.concatenate(box_index)
+
+    @timed("player_flow")
+    def propagate(self,previous_gray,gray,boxes):
+        """
+        Move the boxes of the previous frame to the current frame by the median motion of their points
+        Args:
+            previous_gray (array): Grayscale previous frame
+            gray (array): Grayscale current frame
+            boxes (array): (n,4) array of [x1,y1,x2,y2] in the previous frame
+        Returns:
+            boxes (array): (n,4) array of the moved boxes, None if any box could not be followed reliably
+        """
+        if len(boxes) == 0:
+            return boxes
+
+        points,box_index = self.get_points(previous_gray,boxes)
+        if len(points) == 0:
+            return None
+
+        #Track the points forward then back, points that do not come back to where they started are unreliable
+        next_points,status,_ = cv.calcOpticalFlowPyrLK(previous_gray,gray,points,None,**LK_PARAMS)
+        back_points,back_status,_ = cv.calcOpticalFlowPyrLK(gray,previous_gray,next_points,None,**LK_PARAMS)
+        residual = np.linalg.norm((back_points-points).reshape(-1,2),axis=1)
+        reliable = (status.ravel() == 1) & (back_status.ravel() == 1) & (residual < self.max_residual)
+
+        motion = (next_points-points).reshape(-1,2)
+        moved_boxes = np.array(boxes,np.float64)
+        for i in range(len(boxes)):
+            box_motion = motion[reliable & (box_index == i)]
+            if len(box_motion) < self.min_points:
+                return None
+            dx,dy = np.median(box_motion,axis=0)
+            moved_boxes[i] += [dx,dy,dx,dy]
+
+        return moved_boxes
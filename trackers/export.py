@@ -0,0 +1,161 @@
+"""
+Export the YOLO player and ball models for faster CPU inference and check that they find the same boxes
+
+Usage:
+    python -m trackers.export models/yolov8x.pt models/yolov8_tennisball_best.pt --format openvino --int8 --check input_images/input_video.mp4
+"""
+import os
+import glob
+import argparse
+import time
+import numpy as np
+from utils import iter_video_frames,iter_batches,get_ious
+from .backends import UltralyticsBackend,load_detector,DEFAULT_IMGSZ
+
+EXPORT_FORMATS = ["onnx","openvino"]
+MIN_MATCH_IOU = 0.5
+
+def export_detector(model_path,export_format="onnx",int8=False,imgsz=DEFAULT_IMGSZ,dynamic=False,data=None):
+    """
+    Export YOLO weights to a graph that TrackPlayer and TrackBall can load
+    Args:
+        model_path (str): Path of the YOLO weights (.pt)
+        export_format (str): "onnx" or "openvino"
+        int8 (bool): Quantize to int8 (weights only for ONNX, weights and activations calibrated on data for OpenVINO)
+        imgsz (int): Input size of the graph
+        dynamic (bool): Let the graph take any batch size and input size (imgsz is then chosen when predicting)
+        data (str): Dataset yaml used to calibrate the OpenVINO int8 model (ultralytics default if None)
+    Returns:
+        output_path (str): Path of the exported model (.onnx, or the .xml of the OpenVINO model)
+    """
+    from ultralytics import YOLO
+
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}', expected one of {EXPORT_FORMATS}")
+
+    params = dict(format=export_format,imgsz=imgsz,dynamic=dynamic)
+    if export_format == "openvino" and int8:
+        params["int8"] = True
+        if data is not None:
+            params["data"] = data
+    output_path = YOLO(model_path).export(**params)
+
+    if export_format == "openvino":
+        #ultralytics gives the directory of the model, the backend loads its .xml
+        return glob.glob(os.path.join(output_path,"*.xml"))[0]
+
+    if int8:
+        from onnxruntime.quantization import quantize_dynamic,QuantType
+        quantized_path = os.path.splitext(output_path)[0] + "_int8.onnx"
+        #ONNX Runtime only has CPU kernels for convolutions with uint8 weights
+        quantize_dynamic(output_path,quantized_path,weight_type=QuantType.QUInt8)
+        output_path = quantized_path
+
+    return output_path
+
+def match_detections(reference,detections,min_iou=MIN_MATCH_IOU):
+    """
+    Pair the boxes of two models on one frame, the most overlapping pairs of the same class first
+    Args:
+        reference (array): (n,6) array of [x1,y1,x2,y2,conf,cls] of the reference model
+        detections (array): (m,6) array of [x1,y1,x2,y2,conf,cls] of the checked model
+        min_iou (float): Min IoU of a pair
+    Returns:
+        matches (list): (reference index, detection index, IoU) of each pair
+    """
+    ious = get_ious(reference[:,:4],detections[:,:4])
+    ious[reference[:,5:6] != detections[:,5][np.newaxis,:]] = 0
+
+    matches = []
+    for i,j in zip(*np.unravel_index(np.argsort(-ious,axis=None),ious.shape)):
+        if ious[i,j] < min_iou:
+            break
+        if not np.isnan(ious[i,j]):
+            matches.append((i,j,float(ious[i,j])))
+            ious[i,:] = np.nan
+            ious[:,j] = np.nan
+
+    return matches
+
+def time_predictions(backend,frames,batch_size,params):
+    """
+    Returns:
+        detections (list): Detections of each frame
+        ms_per_frame (float): Time per frame (ms), after a warm-up batch
+    """
+    backend.predict(frames[:batch_size],**params)
+    detections = []
+    start_time = time.perf_counter()
+    for batch in iter_batches(frames,batch_size):
+        detections.extend(backend.predict(batch,**params))
+
+    return detections,(time.perf_counter()-start_time)/len(frames)*1000
+
+def check_parity(model_path,detector_path,frames,imgsz=None,threads=None,batch_size=1,conf=None,min_iou=MIN_MATCH_IOU):
+    """
+    Compare the boxes of an exported model with the PyTorch model on the same frames
+    Args:
+        model_path (str): Path of the YOLO weights (.pt)
+        detector_path (str): Path of the model being checked (any backend)
+        frames (list): List of BGR frames
+        imgsz (int): Input size given to both models (ultralytics default if None)
+        threads (int): Number of CPU threads used by both models
+        batch_size (int): Number of frames sent to the models in one call
+        conf (float): Min confidence of the boxes (ultralytics default if None)
+        min_iou (float): Min IoU of two boxes of the same class to count as the same detection
+    Returns:
+        report (dict): Number of boxes of each model, share of the PyTorch boxes found by the exported model (recall) and of the
+                       exported boxes found by PyTorch (precision), mean IoU and confidence difference of the pairs, time per frame of both
+    """
+    params = {} if conf is None else {"conf":conf}
+    if imgsz is not None:
+        params["imgsz"] = imgsz
+    reference,reference_time = time_predictions(UltralyticsBackend(model_path,threads=threads),frames,batch_size,{**params,"verbose":False})
+    detections,detector_time = time_predictions(load_detector(detector_path,imgsz,threads),frames,batch_size,params)
+
+    reference_count = sum(len(boxes) for boxes in reference)
+    detection_count = sum(len(boxes) for boxes in detections)
+    ious,confidence_diffs = [],[]
+    for reference_boxes,detection_boxes in zip(reference,detections):
+        for i,j,iou in match_detections(reference_boxes,detection_boxes,min_iou):
+            ious.append(iou)
+            confidence_diffs.append(abs(float(reference_boxes[i,4]-detection_boxes[j,4])))
+
+    return {
+        "reference_boxes": reference_count,
+        "detector_boxes": detection_count,
+        "matched_boxes": len(ious),
+        "recall": len(ious)/reference_count if reference_count > 0 else 1.0,
+        "precision": len(ious)/detection_count if detection_count > 0 else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+        "mean_confidence_diff": float(np.mean(confidence_diffs)) if confidence_diffs else 0.0,
+        "reference_ms_per_frame": reference_time,
+        "detector_ms_per_frame": detector_time
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the YOLO player and ball models")
+    parser.add_argument("model_paths",nargs="+",help="YOLO weights (.pt)")
+    parser.add_argument("--format",choices=EXPORT_FORMATS,default="onnx",help="Format of the exported models")
+    parser.add_argument("--int8",action="store_true",help="Quantize the models to int8")
+    parser.add_argument("--data",default=None,help="Dataset yaml used to calibrate the OpenVINO int8 models")
+    parser.add_argument("--imgsz",type=int,default=DEFAULT_IMGSZ,help="Input size of the models")
+    parser.add_argument("--dynamic",action="store_true",help="Export with a dynamic batch and input size")
+    parser.add_argument("--threads",type=int,default=None,help="Number of CPU threads used for the parity check")
+    parser.add_argument("--check",default=None,help="Video to compare the exported models with the PyTorch models on")
+    parser.add_argument("--check-frames",type=int,default=50,help="Number of frames of the video used for the parity check")
+    parser.add_argument("--batch-size",type=int,default=1,help="Batch size of the parity check")
+    args = parser.parse_args()
+
+    frames = list(iter_video_frames(args.check,end_frame=args.check_frames)) if args.check is not None else []
+    for model_path in args.model_paths:
+        output_path = export_detector(model_path,args.format,args.int8,args.imgsz,args.dynamic,args.data)
+        print(f"Exported {output_path}")
+
+        if len(frames) > 0:
+            #Graphs of a fixed size were exported at imgsz, the PyTorch model gets the same size
+            report = check_parity(model_path,output_path,frames,args.imgsz,args.threads,args.batch_size)
+            print(f"Boxes: {report['reference_boxes']} PyTorch, {report['detector_boxes']} exported, {report['matched_boxes']} matched "
+                  f"(recall {report['recall']:.1%}, precision {report['precision']:.1%})")
+            print(f"Matched boxes: mean IoU {report['mean_iou']:.3f}, mean confidence difference {report['mean_confidence_diff']:.3f}")
+            print(f"PyTorch: {report['reference_ms_per_frame']:.1f} ms/frame, exported: {report['detector_ms_per_frame']:.1f} ms/frame")
@@ -0,0 +1,86 @@
+from utils import timed
+
+ROLE_STABILITY_FRAMES = 10 #A new track is classified once it has been followed for this many frames
+
+class RoleClassifier:
+    """
+    Assigns a role to each track id once, a few frames after it first appears, so that people who walk in later
+    in the video (or in a live stream) get a role too. Roles are kept in a single dictionary that grows as new
+    tracks are classified, only the new tracks are measured against the court
+    """
+    def __init__(self,player_tracker,stability_frames=ROLE_STABILITY_FRAMES):
+        """
+        Args:
+            player_tracker (TrackPlayer): Player tracker, its calculate_player_dist_from_court() gives the roles
+            stability_frames (int): Number of frames a new track is followed before it is classified,
+                                    short-lived false detections are not classified at all if they are gone by then
+        """
+        self.player_tracker = player_tracker
+        self.stability_frames = stability_frames
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the tracks before starting a new video
+        """
+        self.roles = {} #Track id -> role, the same dictionary is returned for every frame
+        self.pending = {} #Track id -> [first frame number, last bbox], in the order the tracks appeared
+        self.next_frame_num = 0
+
+    @timed("role_assignment")
+    def update(self,player_dict,court_layout):
+        """
+        Add the tracks of the next frame and classify the ones that have been followed long enough
+        Args:
+            player_dict (dict): Dictionary with player id and bounding box coordinates
+            court_layout (dict): Dictionary of court description
+        Returns:
+            role_assignments (dict): Dictionary with player id and their roles (shared, updated in place)
+        """
+        frame_num = self.next_frame_num
+        self.next_frame_num += 1
+
+        for track_id,bbox in player_dict.items():
+            if track_id in self.roles:
+                continue
+            if track_id in self.pending:
+                self.pending[track_id][1] = bbox
+            else:
+                self.pending[track_id] = [frame_num,bbox]
+
+        #Pending tracks are in order of first appearance, stop at the first one that is too recent
+        ready = {}
+        for track_id,(first_frame_num,bbox) in self.pending.items():
+            if frame_num-first_frame_num+1 < self.stability_frames:
+                break
+            ready[track_id] = bbox
+        self.classify(ready,court_layout)
+
+        return self.roles
+
+    @timed("role_assignment")
+    def flush(self,court_layout):
+        """
+        Classify the tracks still waiting at the end of the video
+        Args:
+            court_layout (dict): Dictionary of court description
+        Returns:
+            role_assignments (dict): Dictionary with player id and their roles
+        """
+        self.classify({track_id:bbox for track_id,(_,bbox) in self.pending.items()},court_layout)
+
+        return self.roles
+
+    def classify(self,player_dict,court_layout):
+        """
+        Measure the given tracks against the court and cache their roles
+        Args:
+            player_dict (dict): Dictionary with track id and the last bounding box of the tracks to classify
+            court_layout (dict): Dictionary of court description
+        """
+        if len(player_dict) == 0:
+            return
+
+        self.roles.update(self.player_tracker.calculate_player_dist_from_court(court_layout,player_dict))
+        for track_id in player_dict:
+            del self.pending[track_id]
@@ -1,59 +1,111 @@
-from ultralytics import YOLO
 import cv2 as cv
-import pickle
-import pandas as pd
+import numpy as np
+from utils import iter_batches,timed
+from .ball_interpolator import BallInterpolator,interpolate_positions
+from .ball_motion import BallMotionModel
+from .backends import load_detector
 
 class TrackBall:
-    def __init__(self,model_path):
-        self.model = YOLO(model_path)
+    def __init__(self,model_path,roi_tracking=False,roi_size=320,max_misses=5,imgsz=None,threads=None):
+        """
+        Args:
+            model_path (str): Path to the YOLO weights (.pt), or to a model exported by trackers.export (.onnx, OpenVINO .xml),
+                              loaded on first use
+            roi_tracking (bool): Predict where the ball is with a motion model and only run the detector on a crop
+                                 around it, at native resolution. The full frame is searched when the ball is lost
+            roi_size (int): Size (pixels) of the square crop, multiple of 32
+            max_misses (int): Number of frames in a row without the ball in the crop before searching the full frame
+            imgsz (int): Input size of the detector on full frames (640 if None, exported models with a fixed size use their own)
+            threads (int): Number of CPU threads used by the detector (library default if None)
+        """
+        self.model_path = model_path
+        self.predict_params = {"conf":0.2}
+        if imgsz is not None:
+            self.predict_params["imgsz"] = imgsz
+        self.threads = threads
+        self.roi_tracking = roi_tracking
+        self.roi_size = roi_size
+        self.ball_motion = BallMotionModel(max_misses=max_misses)
+        self._model = None
 
-    def interpolate_ball_position(self,ball_positions):
+    @property
+    def cache_params(self):
+        """
+        Everything that changes the raw detections, used in the detection cache key
+        """
+        if not self.roi_tracking:
+            return dict(self.predict_params)
+        return {**self.predict_params,"roi_size":self.roi_size,"max_misses":self.ball_motion.max_misses}
+
+    def reset(self):
+        """
+        Forget the ball track before starting a new video
         """
-        Interpolates missing ball positions by usinng pd.DataFrame
+        self.ball_motion.reset()
+
+    @property
+    def model(self):
+        """
+        Detector backend, only loaded when a frame has to be detected so that cached detections do not need it
+        """
+        if self._model is None:
+            self._model = load_detector(self.model_path,threads=self.threads)
+        return self._model
+
+    def warm_up(self,frame):
+        """
+        Load the model and run it once so that the first real frames are not slowed down
+        Args:
+            frame (array): Frame of the same size as the video
+        """
+        self.predict_batch([frame])
+
+    def interpolate_ball_position(self,ball_positions,max_gap=None,max_jump=None,max_latency=None):
+        """
+        Interpolates missing ball positions (linearly, the start of the video gets the first position seen)
         Args:
             ball_positions (list): List of ball positions in the video
+            max_gap (int): Longest run of frames without the ball that is interpolated (no limit if None)
+            max_jump (float): Max distance (pixels per frame) the ball can move, further detections are ignored (no limit if None)
+            max_latency (int): Max number of frames a frame waits for the next detection, after that it keeps the last
+                               known position, same output as the streaming pipeline with this look-ahead (no limit if None)
         Returns
             ball_positions (list): List of updated ball positions in the video after interpolation
         """
-        ball_positions = [x.get(1,[]) for x in ball_positions]
-        ball_positions_df = pd.DataFrame(ball_positions,columns=["x1","y1","x2","y2"])
+        if max_gap is None and max_jump is None and max_latency is None:
+            return interpolate_positions(ball_positions)
 
-        #Interpolate missing values
-        ball_positions_df = ball_positions_df.interpolate()
-        ball_positions_df = ball_positions_df.bfill()
-        print(f"\nBall Position:\n{ball_positions_df}")
+        ball_interpolator = BallInterpolator(max_gap=max_gap,max_latency=max_latency,max_jump=max_jump)
+
+        interpolated = []
+        for ball_dict in ball_positions:
+            interpolated.extend(ball_interpolator.push(ball_dict))
+        interpolated.extend(ball_interpolator.flush())
+
+        return [ball_dict for _, ball_dict in interpolated]
 
-        #Convert back to list form from dataframe
-        ball_positions = [{1:x} for x in ball_positions_df.to_numpy().tolist()]
-    
-        return ball_positions
-    
     #Detect and track the ball in the video
-    def detect_frames(self,frames,read_from_stub=False,stub_path=None):
+    def detect_frames(self,frames,cache=None,batch_size=1):
         """
         Detects and tracks ball in the video
         Args:
             frames (list): List of frames as an array
-            read_from_stub (bool): If True, put data into a stub. Default = False
-            stub_path (str): path to save the output so that we dont have to run the detector again
+            cache (DetectionCache): Cache of the raw detections of this model on this video. Only the frames
+                                    that are not cached are sent to the model
+            batch_size (int): Number of frames sent to the model in one call
 
         Returns:
             ball_detection (list): List of dictionaries with ball id and bounding box coordinates
         """
         ball_detections = []
 
-        if read_from_stub and stub_path is not None:
-            with open(stub_path, 'rb') as f:
-                ball_detections = pickle.load(f)
-            return ball_detections
- 
-        for frame in frames:
-            player_dict = self.detect_frame(frame)
-            ball_detections.append(player_dict)
-
-        if stub_path is not None:
-            with open(stub_path,'wb') as f:
-                pickle.dump(ball_detections,f)
+        frame_num = 0
+        for batch in iter_batches(frames,batch_size):
+            ball_detections.extend(self.detect_batch(batch,cache,frame_num))
+            frame_num += len(batch)
+
+        if cache is not None:
+            cache.finish()
         
         return ball_detections
 
@@ -66,14 +118,106 @@ class TrackBall:
         Returns:
             ball_dict (dict): Dictionary with ball id and bounding box coordinates
         """
-        results = self.model.predict(frame,conf=0.2)[0] #Runs tracking on the input frame
+        return self.detect_batch([frame])[0]
+
+    #Detect the ball in a batch of frames
+    def detect_batch(self,frames,cache=None,frame_num=0):
+        """
+        Detects ball in a batch of frames with one model call
+        Args:
+            frames (list): List of frames as an array
+            cache (DetectionCache): Cache of the raw detections (model is only run on the frames not cached)
+            frame_num (int): Frame number of the first frame of the batch (used by the cache)
+        Returns:
+            ball_dicts (list): List of dictionaries with ball id and bounding box coordinates, one per frame
+        """
+        if self.roi_tracking:
+            detections = self.detect_tracked(frames,cache,frame_num)
+        elif cache is not None:
+            detections = cache.predict_batch(self.predict_batch,frames,frame_num)
+        else:
+            detections = self.predict_batch(frames)
 
-        ball_dict = {} #Dictionary to store ball id and bounding box coordinates
-        for box in results.boxes:
-            result = box.xyxy.tolist()[0] #Add bounding box coordinates to the dictionary
-            ball_dict[1] = result
+        ball_dicts = []
+        for frame_detections in detections:
+            ball_dict = {} #Dictionary to store ball id and bounding box coordinates
+            for detection in frame_detections:
+                ball_dict[1] = detection[:4].tolist() #Add bounding box coordinates to the dictionary
+            ball_dicts.append(ball_dict)
         
-        return ball_dict
+        return ball_dicts
+
+    @timed("ball_inference")
+    def predict_batch(self,frames,**params):
+        """
+        Runs the model on a batch of frames
+        Args:
+            frames (list): List of frames as an array
+            **params: Inference parameters added to predict_params (imgsz...)
+        Returns:
+            detections (list): One (n,6) array of [x1,y1,x2,y2,conf,cls] per frame
+        """
+        return self.model.predict(frames,**{**self.predict_params,**params}) #Runs detection on all the frames at once
+
+    def detect_tracked(self,frames,cache=None,frame_num=0):
+        """
+        Detects the ball frame by frame around its predicted position (roi_tracking mode).
+        Each crop depends on the previous frame so the frames of a batch are not sent to the model together
+        Args:
+            frames (list): List of consecutive frames as an array
+            cache (DetectionCache): Cache of the raw detections (model is only run on the frames not cached)
+            frame_num (int): Frame number of the first frame of the batch (used by the cache)
+        Returns:
+            detections (list): One (n,6) array of [x1,y1,x2,y2,conf,cls] per frame, in full frame coordinates
+        """
+        detections = []
+        for i, frame in enumerate(frames):
+            self.ball_motion.predict()
+            if cache is not None:
+                frame_detections = cache.predict_batch(lambda x: [self.predict_tracked(x[0])],[frame],frame_num+i)[0]
+            else:
+                frame_detections = self.predict_tracked(frame)
+
+            if len(frame_detections) > 0:
+                x1,y1,x2,y2 = frame_detections[-1][:4]
+                self.ball_motion.update(((x1+x2)/2,(y1+y2)/2))
+            else:
+                self.ball_motion.update(None)
+            detections.append(frame_detections)
+
+        return detections
+
+    def predict_tracked(self,frame):
+        """
+        Runs the model on the crop around the predicted ball position, or on the full frame if the ball is not tracked
+        Args:
+            frame (array): Input frame
+        Returns:
+            detections (array): (n,6) array of [x1,y1,x2,y2,conf,cls] in full frame coordinates,
+                                only the detection closest to the prediction when the crop is used
+        """
+        predicted_centre = self.ball_motion.predicted_centre
+        if predicted_centre is None:
+            return self.predict_batch([frame])[0]
+
+        #Square crop around the prediction, moved inside the frame
+        frame_h,frame_w = frame.shape[:2]
+        size = min(self.roi_size,frame_w,frame_h)
+        x_start = int(np.clip(predicted_centre[0]-size/2,0,frame_w-size))
+        y_start = int(np.clip(predicted_centre[1]-size/2,0,frame_h-size))
+        crop = frame[y_start:y_start+size,x_start:x_start+size]
+
+        detections = np.array(self.predict_batch([crop],imgsz=self.roi_size)[0],np.float32).reshape(-1,6)
+        detections[:,[0,2]] += x_start
+        detections[:,[1,3]] += y_start
+        if len(detections) == 0:
+            return detections
+
+        centres_x = (detections[:,0]+detections[:,2])/2
+        centres_y = (detections[:,1]+detections[:,3])/2
+        closest = np.argmin(np.hypot(centres_x-predicted_centre[0],centres_y-predicted_centre[1]))
+
+        return detections[closest:closest+1]
     
     def draw_bounding_box(self,video_frames,ball_detections):
         """
@@ -1,49 +1,190 @@
-from ultralytics import YOLO
 import cv2 as cv
-import pickle
-from utils import centre_of_bbox,measure_dist,get_foot_position,measure_xy_dist,distance_point_to_segment
+import numpy as np
+from utils import get_foot_positions,measure_dists,distances_points_to_segments,get_frame_court_layout,iter_batches,profile_stage,timed
+from .box_flow import BoxFlow
+from .backends import load_detector
+
+ROLE_ASSIGNMENT_FRAME = 18 #Roles are assigned on the 18th frame since ball kid is only present in the 17th frame
 
 class TrackPlayer:
-    def __init__(self,model_path):
-        self.model = YOLO(model_path)
+    def __init__(self,model_path,tracker_config="botsort.yaml",keyframe_interval=1,min_confidence=0.3,min_flow_points=8,max_flow_residual=1.0,
+                 court_roi=False,court_margin=0.3,court_source=None,person_only=False,imgsz=None,threads=None):
+        """
+        Args:
+            model_path (str): Path to the YOLO weights (.pt), or to a model exported by trackers.export (.onnx, OpenVINO .xml),
+                              loaded on first use
+            tracker_config (str): Tracker config, same default as model.track()
+            keyframe_interval (int): Run the detector every keyframe_interval frames and move the boxes with optical
+                                     flow in between (1 runs the detector on every frame)
+            min_confidence (float): The detector is run again on the next frame when the mean confidence of the
+                                    people detected on a keyframe is lower than this (no check if None)
+            min_flow_points (int): The detector is run when a box has fewer points followed reliably by the optical flow
+            max_flow_residual (float): Max forward-backward error (pixels) of a point followed by the optical flow
+            court_roi (bool): Only run the detector on the court and its surroundings (needs the court layout),
+                              at the same scale as the full frame
+            court_margin (float): Margin added around the court, as a fraction of the height of the court in the frame
+            court_source (dict): What the court layouts given for the crop come from (e.g. digest of the keypoints model
+                                 and track_court). Part of the cache key with court_roi, so cached detections of crops
+                                 of another court are not reused
+            person_only (bool): Only detect the person class (the other classes are not kept anyway)
+            imgsz (int): Input size of the detector (640 if None, exported models with a fixed size use their own)
+            threads (int): Number of CPU threads used by the detector (library default if None)
+        """
+        self.model_path = model_path
+        self.predict_params = {"conf":0.1} #Same confidence threshold as model.track()
+        if imgsz is not None:
+            self.predict_params["imgsz"] = imgsz
+        self.threads = threads
+        self.tracker_config = tracker_config
+        self.tracker = None #Created on the first frame with detections
+        self._model = None
+        self._class_names = None
+
+        self.keyframe_interval = keyframe_interval
+        self.min_confidence = min_confidence
+        self.box_flow = BoxFlow(min_points=min_flow_points,max_residual=max_flow_residual)
+        self.previous_gray = None #Last frame and the detections given to the tracker on it (keyframe mode)
+        self.previous_detections = None
+        self.frames_since_keyframe = 0
+        self.keyframe_count = 0
+
+        self.court_roi = court_roi
+        self.court_margin = court_margin
+        self.court_source = court_source
+        self.person_only = person_only
+
+    def reset(self):
+        """
+        Forget the tracks before starting a new video (the model stays loaded)
+        """
+        self.tracker = None
+        self.previous_gray = None
+        self.previous_detections = None
+        self.frames_since_keyframe = 0
+        self.keyframe_count = 0
+
+    @property
+    def model(self):
+        """
+        Detector backend, only loaded when a frame has to be detected so that cached detections do not need it
+        """
+        if self._model is None:
+            self._model = load_detector(self.model_path,threads=self.threads)
+        return self._model
+
+    @property
+    def cache_params(self):
+        """
+        Everything that changes the raw detections, used in the detection cache key
+        """
+        params = dict(self.predict_params)
+        if self.keyframe_interval > 1:
+            params.update({"keyframe_interval":self.keyframe_interval,
+                           "min_confidence":self.min_confidence,
+                           "min_flow_points":self.box_flow.min_points,
+                           "max_flow_residual":self.box_flow.max_residual})
+        if self.court_roi:
+            params["court_margin"] = self.court_margin
+            params["court_source"] = self.court_source
+        if self.person_only:
+            params["person_only"] = True
+        return params
+
+    @property
+    def class_names(self):
+        """
+        Names of the classes of the model (class id -> name)
+        """
+        if self._class_names is None:
+            self._class_names = self.model.names
+        return self._class_names
+
+    def warm_up(self,frame):
+        """
+        Load the model and run it once so that the first real frames are not slowed down (the tracker is not updated)
+        Args:
+            frame (array): Frame of the same size as the video
+        """
+        self.predict_batch([frame])
+
+    def create_tracker(self,tracker_config):
+        """
+        Create the same tracker model.track() would use. The tracker is owned by this class so that the
+        track state persists across batches and frames are always fed to it one by one, in order
+        Args:
+            tracker_config (str): Tracker config (botsort.yaml or bytetrack.yaml)
+        Returns:
+            tracker (BOTSORT|BYTETracker): Tracker object
+        """
+        from ultralytics.trackers.track import TRACKER_MAP
+        from ultralytics.utils import IterableSimpleNamespace,yaml_load
+        from ultralytics.utils.checks import check_yaml
+
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_config)))
+        return TRACKER_MAP[cfg.tracker_type](args=cfg,frame_rate=30)
 
     #Assign roles in the video based on proximity of the keypoints
-    def assign_and_filter_roles(self,court_layout,player_detections):
+    def assign_and_filter_roles(self,court_layout,player_detections,role_classifier=None,court_layouts=None):
         """
         Assigns roles to players based on their proximity to the court lines
         Args:
             court_layout (dict): Dictionary of court description
             player_detections (list): List of dictionaries with player id and bounding box coordinates
+            role_classifier (RoleClassifier): Classify every track a few frames after it appears instead of
+                                              only the tracks of the role assignment frame
+            court_layouts (list): List of (first frame number, court layout) when the court moves during the video,
+                                  each track is then measured against the court of the frame it is classified on
         Returns:
             filtered_players_detection (list): List of dictionaries with player id and bounding box coordinates
             filtered_others_detection (list): List of dictionaries with other people id and bounding box coordinates
             assign_roles_per_frame (list): List of dictionaries with player id and their roles
         """
-        detections_first_frame = player_detections[18] #Detect the 17th frame since ball kid is only present in the 17th frame
         filtered_players_detection = [] #Filter only the players
         filtered_others_detection = [] #Filter ball kids, judges...
         assign_roles_per_frame = []
 
         #Assign roles
-        role_assignments = self.calculate_player_dist_from_court(court_layout,detections_first_frame)
+        get_layout = (lambda frame_num: court_layout) if court_layouts is None else (lambda frame_num: get_frame_court_layout(court_layouts,frame_num))
+        if role_classifier is None:
+            detections_first_frame = player_detections[ROLE_ASSIGNMENT_FRAME]
+            with profile_stage("role_assignment"):
+                role_assignments = self.calculate_player_dist_from_court(get_layout(ROLE_ASSIGNMENT_FRAME),detections_first_frame)
+        else:
+            for frame_num, player_dict in enumerate(player_detections):
+                role_assignments = role_classifier.update(player_dict,get_layout(frame_num))
+            role_assignments = role_classifier.flush(get_layout(len(player_detections)-1))
 
         #Create dictionary to seperate players and other people
         for player_dict in player_detections:
-            players = {}
-            others = {}
-
-            for track_id in player_dict:
-                role = role_assignments.get(track_id, "Unknown")
-                if role == "Player":
-                    players[track_id] = player_dict[track_id]
-                else:
-                    others[track_id] = player_dict[track_id]
+            players,others = self.filter_players_by_role(player_dict,role_assignments)
             
             assign_roles_per_frame.append(role_assignments)
             filtered_others_detection.append(others)
             filtered_players_detection.append(players)
         
         return filtered_players_detection,filtered_others_detection,assign_roles_per_frame
+
+    def filter_players_by_role(self,player_dict,role_assignments):
+        """
+        Seperates the players from the other people in a single frame
+        Args:
+            player_dict (dict): Dictionary of player id and bounding box coordinates
+            role_assignments (dict): Dictionary of player id and their roles
+        Returns:
+            players (dict): Dictionary of player id and bounding box coordinates of the players
+            others (dict): Dictionary of other people id and bounding box coordinates
+        """
+        players = {}
+        others = {}
+
+        for track_id in player_dict:
+            role = role_assignments.get(track_id, "Unknown")
+            if role == "Player":
+                players[track_id] = player_dict[track_id]
+            else:
+                others[track_id] = player_dict[track_id]
+
+        return players,others
             
     def calculate_player_dist_from_court(self,court_layout,player_dict):
         """
@@ -54,72 +195,62 @@ class TrackPlayer:
         Returns:
             role_assignemnts (dict): Dictionary of player id and their roles
         """
-        role_assignemnts = {}
+        if len(player_dict) == 0:
+            return {}
 
+        track_ids = list(player_dict.keys())
         top_baseline_length = court_layout["top_baseline"]
         btm_baseline_length = court_layout["bottom_baseline"]
         net_left = court_layout["net_left"]
         net_right = court_layout["net_right"]
-        
-        for track_id,bbox in player_dict.items():
-            #get the middle of the bounding box
-            x_middle_bbox = get_foot_position(bbox=bbox)
-            x_foot,y_foot = x_middle_bbox
-
-            dist_from_top_baseline = distance_point_to_segment(x_middle_bbox,*top_baseline_length) #* means unpack the tuple
-            dist_from_btm_baseline = distance_point_to_segment(x_middle_bbox,*btm_baseline_length)
-            dist_from_net_left = measure_dist(x_middle_bbox,net_left)
-            dist_from_net_right = measure_dist(x_middle_bbox,net_right)
-            net_middle_x = (net_left[0] + net_right[0]) / 2
-            print(f"Track ID {track_id}")
-            print(f"Foot Position: {x_middle_bbox}")
-            print(f"dist_from_top_baseline: {dist_from_top_baseline}")
-            print(f"dist_from_btm_baseline: {dist_from_btm_baseline}")
-            print(f"dist_from_net_left: {dist_from_net_left}")
-            print(f"dist_from_net_right: {dist_from_net_right}")
-            print(f"net_mid_x: {net_middle_x}, foot_x: {x_foot}")
-
-            if dist_from_top_baseline < 80 or dist_from_btm_baseline < 80:
-                role = "Player"
-            elif 0 < dist_from_top_baseline < 250  or  0 < dist_from_btm_baseline < 250:
-                role = "Line Judge"
-            elif dist_from_net_right < 300:
-                role = "Umpire"
-            elif dist_from_net_left < 300:
-                role = "Ball kid"
-            else:
-                role = "Unknown"
 
-            role_assignemnts[track_id] = role
+        #Distances of every person at once: (N,2) to the two baselines and (N,2) to the two ends of the net
+        foot_positions = get_foot_positions(np.array(list(player_dict.values()),np.float64))
+        baseline_dists = distances_points_to_segments(foot_positions,[top_baseline_length,btm_baseline_length])
+        net_dists = measure_dists(foot_positions,[net_left,net_right])
+        dist_from_top_baseline,dist_from_btm_baseline = baseline_dists.T
+        dist_from_net_left,dist_from_net_right = net_dists.T
+
+        #First matching rule wins
+        roles = np.select([(dist_from_top_baseline < 80) | (dist_from_btm_baseline < 80),
+                           ((0 < dist_from_top_baseline) & (dist_from_top_baseline < 250)) | ((0 < dist_from_btm_baseline) & (dist_from_btm_baseline < 250)),
+                           dist_from_net_right < 300,
+                           dist_from_net_left < 300],
+                          ["Player","Line Judge","Umpire","Ball kid"],
+                          default="Unknown")
+
+        role_assignemnts = dict(zip(track_ids,roles.tolist()))
 
         return role_assignemnts
     
     #Detect and track the players in the video
-    def detect_frames(self,frames,read_from_stub=False,stub_path=None,court_layout=None):
+    def detect_frames(self,frames,cache=None,court_layout=None,batch_size=1,court_layouts=None):
         """
         Detects and tracks players in the video
         Args:
             frames (list): List of frames as an array
-            read_from_stub (bool): If True, put data into a stub. Default = False
-            stub_path (str): path to save the output so that we dont have to run the detector again
+            cache (DetectionCache): Cache of the raw detections of this model on this video. Only the frames
+                                    that are not cached are sent to the model
+            court_layout (dict): Dictionary of court description
+            batch_size (int): Number of frames sent to the model in one call
+            court_layouts (list): List of (first frame number, court layout) when the court moves during the video,
+                                  used instead of court_layout (a batch never spans two courts)
 
         Returns:
             player_detection (list): List of dictionaries with player id and bounding box coordinates
         """
         player_detections = []
 
-        if read_from_stub and stub_path is not None:
-            with open(stub_path, 'rb') as f:
-                player_detections = pickle.load(f)
-            return player_detections
-     
-        for frame in frames:
-            player_dict = self.detect_frame(frame,court_layout)
-            player_detections.append(player_dict)
-
-        if stub_path is not None:
-            with open(stub_path,'wb') as f:
-                pickle.dump(player_detections,f)
+        boundaries = [] if court_layouts is None else [start_frame for start_frame,_ in court_layouts]
+        frame_num = 0
+        for batch in iter_batches(frames,batch_size,boundaries):
+            if court_layouts is not None:
+                court_layout = get_frame_court_layout(court_layouts,frame_num)
+            player_detections.extend(self.detect_batch(batch,court_layout,cache,frame_num))
+            frame_num += len(batch)
+
+        if cache is not None:
+            cache.finish()
         
         return player_detections
 
@@ -134,18 +265,191 @@ class TrackPlayer:
         Returns:
             player_dict (dict): Dictionary with player id and bounding box coordinates
         """
-        results = self.model.track(frame,persist=True)[0] #Runs tracking on the first frame
-        id_name_dict = results.names
+        return self.detect_batch([frame],court_layout)[0]
+
+    #Detect and track the players in a batch of frames
+    def detect_batch(self,frames,court_layout=None,cache=None,frame_num=0):
+        """
+        Detects players in a batch of frames with one model call, then tracks them frame by frame
+        Args:
+            frames (list): List of consecutive frames as an array
+            court_layout (dict): Dictionary of court description
+            cache (DetectionCache): Cache of the raw detections (model is only run on the frames not cached)
+            frame_num (int): Frame number of the first frame of the batch (used by the cache)
+
+        Returns:
+            player_dicts (list): List of dictionaries with player id and bounding box coordinates, one per frame
+        """
+        if cache is not None:
+            #Class names are kept with the cached detections so that the model is not loaded when every frame is cached
+            if self._class_names is None and cache.names is not None:
+                self._class_names = cache.names
+            if self.keyframe_interval > 1:
+                detections = self.detect_keyframes(frames,cache,frame_num,court_layout)
+            else:
+                detections = cache.predict_batch(lambda x: self.predict_batch(x,court_layout),frames,frame_num)
+            if cache.names is None:
+                cache.names = self.class_names
+        elif self.keyframe_interval > 1:
+            detections = self.detect_keyframes(frames,court_layout=court_layout)
+        else:
+            detections = self.predict_batch(frames,court_layout)
+
+        return [self.update_tracks(frame_detections,frame) for frame_detections, frame in zip(detections,frames)]
+
+    @timed("player_inference")
+    def predict_batch(self,frames,court_layout=None):
+        """
+        Runs the model on a batch of frames
+        Args:
+            frames (list): List of frames as an array
+            court_layout (dict): Dictionary of court description, the model only sees the court when court_roi is set
+
+        Returns:
+            detections (list): One (n,6) array of [x1,y1,x2,y2,conf,cls] per frame, in full frame coordinates
+        """
+        params = dict(self.predict_params)
+        if self.person_only:
+            #Filtered inside the model so NMS and post-processing skip the other classes
+            params["classes"] = [class_id for class_id,name in self.class_names.items() if name == "person"]
+
+        if not self.court_roi or court_layout is None:
+            return self.model.predict(frames,**params)
+
+        frame_h,frame_w = frames[0].shape[:2]
+        x1,y1,x2,y2 = self.get_court_roi(court_layout,(frame_h,frame_w))
+        #The crop is resized by the same factor as the full frame would be, so people are detected at the same scale
+        full_imgsz = params.get("imgsz",640)
+        params["imgsz"] = int(np.ceil(max(x2-x1,y2-y1)*full_imgsz/max(frame_h,frame_w)/32))*32
+        crop_detections = self.model.predict([frame[y1:y2,x1:x2] for frame in frames],**params)
+
+        detections = []
+        for frame_detections in crop_detections:
+            frame_detections = frame_detections.copy()
+            frame_detections[:,[0,2]] += x1
+            frame_detections[:,[1,3]] += y1
+            detections.append(frame_detections)
+
+        return detections
+
+    def get_court_roi(self,court_layout,frame_shape):
+        """
+        Region of the frame where the players, line judges, umpire and ball kids are: the court plus a margin
+        Args:
+            court_layout (dict): Dictionary of court description
+            frame_shape (tuple): (height,width) of the frame
+        Returns:
+            roi (tuple): (x1,y1,x2,y2) of the region, clipped to the frame
+        """
+        corners = np.array([*court_layout["top_baseline"],*court_layout["bottom_baseline"]],np.float64)
+        x_min,y_min = corners.min(axis=0)
+        x_max,y_max = corners.max(axis=0)
+        #Same margin on every side, relative to the height of the court so that it does not grow with its (much larger) width
+        margin = (y_max-y_min)*self.court_margin
+
+        frame_h,frame_w = frame_shape
+        x1 = int(max(x_min-margin,0))
+        y1 = int(max(y_min-margin,0))
+        x2 = int(min(x_max+margin,frame_w))
+        y2 = int(min(y_max+margin,frame_h))
+
+        return x1,y1,x2,y2
+
+    def detect_keyframes(self,frames,cache=None,frame_num=0,court_layout=None):
+        """
+        Gets the detections frame by frame, running the model only on keyframes and moving the people of the previous
+        frame with optical flow on the other frames (keyframe mode). The moved boxes are given to the tracker as
+        detections so that it follows the players every frame and keeps their track ids
+        Args:
+            frames (list): List of consecutive frames as an array
+            cache (DetectionCache): Cache of the detections given to the tracker (model and optical flow are only run on the frames not cached)
+            frame_num (int): Frame number of the first frame of the batch (used by the cache)
+            court_layout (dict): Dictionary of court description
+        Returns:
+            detections (list): One (n,6) array of [x1,y1,x2,y2,conf,cls] per frame
+        """
+        detections = []
+        for i, frame in enumerate(frames):
+            if cache is not None and cache.has_frame(frame_num+i):
+                #The optical flow state is not known on cached frames, the next frame not cached is a keyframe
+                frame_detections = cache.get(frame_num+i)
+                self.previous_detections = None
+            elif cache is not None:
+                frame_detections = cache.predict_batch(lambda x: [self.predict_keyframe(x[0],court_layout)],[frame],frame_num+i)[0]
+            else:
+                frame_detections = self.predict_keyframe(frame,court_layout)
+            detections.append(frame_detections)
+
+        return detections
+
+    def predict_keyframe(self,frame,court_layout=None):
+        """
+        Runs the model if the frame is a keyframe, otherwise moves the people of the previous frame with optical flow
+        Args:
+            frame (array): Input frame
+            court_layout (dict): Dictionary of court description
+        Returns:
+            detections (array): (n,6) array of [x1,y1,x2,y2,conf,cls]
+        """
+        gray = cv.cvtColor(frame,cv.COLOR_BGR2GRAY)
+
+        person_ids = [class_id for class_id,name in self.class_names.items() if name == "person"]
+
+        detections = None
+        if self.previous_detections is not None and self.frames_since_keyframe < self.keyframe_interval:
+            #Only the people are moved, the tracks of other classes are not used
+            people = self.previous_detections[np.isin(self.previous_detections[:,5],person_ids)]
+            boxes = self.box_flow.propagate(self.previous_gray,gray,people[:,:4])
+            if boxes is not None:
+                detections = np.column_stack([boxes,people[:,4:]]).astype(people.dtype)
+                self.frames_since_keyframe += 1
+
+        if detections is None:
+            detections = self.predict_batch([frame],court_layout)[0]
+            self.keyframe_count += 1
+            self.frames_since_keyframe = 1
+            confidences = detections[np.isin(detections[:,5],person_ids),4]
+            if self.min_confidence is not None and len(confidences) > 0 and confidences.mean() < self.min_confidence:
+                #The detector is unsure, check again on the next frame
+                self.frames_since_keyframe = self.keyframe_interval
+
+        self.previous_gray = gray
+        self.previous_detections = detections
+
+        return detections
+
+    @timed("player_tracking")
+    def update_tracks(self,detections,frame):
+        """
+        Updates the tracker with the detections of one frame
+        Args:
+            detections (array): (n,6) array of [x1,y1,x2,y2,conf,cls]
+            frame (array): Input frame
+
+        Returns:
+            player_dict (dict): Dictionary with player id and bounding box coordinates
+        """
+        from ultralytics.engine.results import Boxes
+
+        id_name_dict = self.class_names
         player_dict = {} #Dictionary to store player id and bounding box coordinates
 
-        for box in results.boxes:
-            track_id = int(box.id.tolist()[0]) #Add track id of each box to the dictionary
-            result = box.xyxy.tolist()[0] #Add bounding box coordinates to the dictionary
-            object_cls_id = box.cls.tolist()[0] #Add object class id to the dictionary
+        if len(detections) == 0:
+            return player_dict #model.track() does not update the tracker on empty frames either
+
+        if self.tracker is None:
+            self.tracker = self.create_tracker(self.tracker_config)
+
+        #Each track is [x1,y1,x2,y2,track_id,score,cls,idx]
+        tracks = self.tracker.update(Boxes(detections,frame.shape[:2]),frame)
+        for track in tracks:
+            track_id = int(track[4]) #Add track id of each box to the dictionary
+            result_bbox = track[:4].tolist() #Add bounding box coordinates to the dictionary
+            object_cls_id = int(track[6]) #Add object class id to the dictionary
             object_cls_name = id_name_dict[object_cls_id] #Get the object class name
 
             if object_cls_name == "person":
-                player_dict[track_id] = result
+                player_dict[track_id] = result_bbox
 
         return player_dict
     
@@ -0,0 +1 @@
+from .track_store import TrackStore,ROLE_NAMES,get_dicts_nbytes
\ No newline at end of file
@@ -0,0 +1,183 @@
+import sys
+import numpy as np
+
+#Role of each track, stored as the index in this list
+ROLE_NAMES = ["Unknown","Player","Line Judge","Umpire","Ball kid"]
+
+class TrackStore:
+    """
+    Columnar store of all the detections of a video: one row per detection with its frame index, track id,
+    role and bounding box. Rows are sorted by frame, and an index by track is kept as well,
+    so both "everything in frame i" and "the whole path of track t" are slices of NumPy arrays
+    """
+    def __init__(self,frame_index,track_id,bbox,role=None,frame_count=None,bbox_dtype=np.float32):
+        """
+        Args:
+            frame_index (array): (N,) frame of each detection
+            track_id (array): (N,) track id of each detection
+            bbox (array): (N,4) bounding box [x1,y1,x2,y2] of each detection
+            role (array): (N,) role of each detection as an index in ROLE_NAMES (Unknown if None)
+            frame_count (int): Number of frames of the video (last frame with a detection + 1 if None)
+            bbox_dtype (type): Type of the bounding box coordinates, float64 keeps them exactly as the trackers give them
+        """
+        frame_index = np.asarray(frame_index,np.int32)
+        count = len(frame_index)
+        if role is None:
+            role = np.zeros(count,np.int8)
+        if frame_count is None:
+            frame_count = int(frame_index.max())+1 if count > 0 else 0
+
+        #Sort by frame, keeping the order of the detections inside a frame
+        order = np.argsort(frame_index,kind="stable")
+        self.frame_index = frame_index[order]
+        self.track_id = np.asarray(track_id,np.int32)[order]
+        self.bbox = np.asarray(bbox,bbox_dtype).reshape(-1,4)[order]
+        self.role = np.asarray(role,np.int8)[order]
+        self.frame_count = frame_count
+
+        #Rows of frame i are frame_offsets[i]:frame_offsets[i+1]
+        self.frame_offsets = np.searchsorted(self.frame_index,np.arange(frame_count+1))
+
+        #Rows of the n-th track (track_ids[n]) are track_order[track_offsets[n]:track_offsets[n+1]], sorted by frame
+        self.track_order = np.lexsort((self.frame_index,self.track_id)).astype(np.int32)
+        self.track_ids,track_starts = np.unique(self.track_id[self.track_order],return_index=True)
+        self.track_offsets = np.append(track_starts,count)
+
+    def __len__(self):
+        return len(self.frame_index)
+
+    @classmethod
+    def from_dicts(cls,detections,role_assignments=None,bbox_dtype=np.float32):
+        """
+        Build the store from the list of dictionaries used by the trackers
+        Args:
+            detections (list): List of dictionaries with track id and bounding box coordinates, one per frame
+            role_assignments (dict): Dictionary with track id and their roles (optional)
+            bbox_dtype (type): Type of the bounding box coordinates
+        Returns:
+            TrackStore: Store with the same detections
+        """
+        frame_index = []
+        track_id = []
+        bbox = []
+        for frame_num, detection_dict in enumerate(detections):
+            for detection_id, detection_bbox in detection_dict.items():
+                frame_index.append(frame_num)
+                track_id.append(detection_id)
+                bbox.append(detection_bbox)
+
+        store = cls(frame_index,track_id,bbox,frame_count=len(detections),bbox_dtype=bbox_dtype)
+        if role_assignments is not None:
+            store.assign_roles(role_assignments)
+
+        return store
+
+    def to_dicts(self):
+        """
+        Convert back to the list of dictionaries used by the trackers
+        Returns:
+            detections (list): List of dictionaries with track id and bounding box coordinates, one per frame
+        """
+        return [self.frame(frame_num) for frame_num in range(self.frame_count)]
+
+    def frame_rows(self,frame_num):
+        """
+        Returns:
+            rows (slice): Rows of the detections of a frame
+        """
+        return slice(self.frame_offsets[frame_num],self.frame_offsets[frame_num+1])
+
+    def frame(self,frame_num):
+        """
+        Get the detections of a frame in the trackers' format
+        Args:
+            frame_num (int): Frame number
+        Returns:
+            detection_dict (dict): Dictionary with track id and bounding box coordinates
+        """
+        rows = self.frame_rows(frame_num)
+
+        return dict(zip(self.track_id[rows].tolist(),self.bbox[rows].tolist()))
+
+    def track_rows(self,track_id):
+        """
+        Args:
+            track_id (int): Track id
+        Returns:
+            rows (array): Rows of the detections of the track, sorted by frame (empty if the id is unknown)
+        """
+        n = np.searchsorted(self.track_ids,track_id)
+        if n == len(self.track_ids) or self.track_ids[n] != track_id:
+            return np.zeros(0,np.int32)
+
+        return self.track_order[self.track_offsets[n]:self.track_offsets[n+1]]
+
+    def assign_roles(self,role_assignments):
+        """
+        Set the role of every detection from a dictionary of track id and role (tracks not in it are Unknown)
+        Args:
+            role_assignments (dict): Dictionary with track id and their roles
+        """
+        self.role[:] = ROLE_NAMES.index("Unknown")
+        for track_id, role in role_assignments.items():
+            self.role[self.track_rows(track_id)] = ROLE_NAMES.index(role) if role in ROLE_NAMES else 0
+
+    def role_assignments(self):
+        """
+        Returns:
+            role_assignments (dict): Dictionary with track id and their roles
+        """
+        return {int(track_id): ROLE_NAMES[self.role[self.track_rows(track_id)[0]]] for track_id in self.track_ids}
+
+    def select(self,mask):
+        """
+        Keep only some of the detections
+        Args:
+            mask (array): (N,) boolean array, True for the detections to keep
+        Returns:
+            TrackStore: New store with the selected detections (same number of frames)
+        """
+        return TrackStore(self.frame_index[mask],
+                          self.track_id[mask],
+                          self.bbox[mask],
+                          self.role[mask],
+                          self.frame_count,
+                          self.bbox.dtype)
+
+    def select_role(self,role):
+        """
+        Args:
+            role (str): Name of the role
+        Returns:
+            TrackStore: New store with only the detections with this role
+        """
+        return self.select(self.role == ROLE_NAMES.index(role))
+
+    def nbytes(self):
+        """
+        Returns:
+            int: Memory used by the arrays in bytes
+        """
+        arrays = [self.frame_index,self.track_id,self.bbox,self.role,
+                  self.frame_offsets,self.track_order,self.track_ids,self.track_offsets]
+
+        return sum(array.nbytes for array in arrays)
+
+def get_dicts_nbytes(detections):
+    """
+    Memory used by the list of dictionaries of the trackers that a TrackStore replaces: the list, the dictionaries,
+    the track ids and the bounding box lists with their coordinates
+    Args:
+        detections (list): List of dictionaries with track id and bounding box coordinates, one per frame
+    Returns:
+        int: Memory in bytes
+    """
+    #By id, so that the small ints and the boxes shared between frames are only counted once
+    objects = {id(detections): detections}
+    for detection_dict in detections:
+        objects[id(detection_dict)] = detection_dict
+        for track_id, bbox in detection_dict.items():
+            for obj in (track_id,bbox,*bbox):
+                objects[id(obj)] = obj
+
+    return sum(sys.getsizeof(obj) for obj in objects.values())
@@ -1,4 +1,9 @@
-from .video_utils import read_video, save_video
-from .court_utils import get_court_layout
+from .video_utils import read_video, iter_video_frames, get_video_frame_count, iter_batches, save_video, get_frame_shape
+from .court_utils import get_court_layout,get_court_layouts,get_frame_court_layout
 from .conversions import convert_meters_to_pixels,convert_pixels_to_meters
-from .bbox_utils import get_foot_position,get_closest_keypoint_index,get_height_of_bbox,measure_xy_dist,centre_of_bbox,measure_dist,distance_point_to_segment
\ No newline at end of file
+from .bbox_utils import get_foot_position,get_closest_keypoint_index,get_height_of_bbox,measure_xy_dist,centre_of_bbox,measure_dist,distance_point_to_segment
+from .bbox_utils import centres_of_bboxes,get_foot_positions,measure_dists,measure_xy_dists,get_closest_keypoint_indices,distances_points_to_segments,get_ious
+from .fps_counter import FpsCounter
+from .profiler import Profiler,start_profiling,stop_profiling,profile_stage,profile_frame,timed
+from .array_utils import sliding_window_max,WindowedMax
+from .frame_pool import FramePool,get_peak_rss
\ No newline at end of file
@@ -0,0 +1,77 @@
+import numpy as np
+from collections import deque
+
+def sliding_window_max(values,before,after):
+    """
+    Max of the values around each index, from index-before to index+after (van Herk/Gil-Werman, O(n) for any window size)
+    Args:
+        values (array): 1D array, use -inf for missing values
+        before (int): Number of values before the index in the window
+        after (int): Number of values after the index in the window
+    Returns:
+        window_max (array): Array of the same length as values
+    """
+    values = np.asarray(values,np.float64)
+    count = len(values)
+    window = before+after+1
+    if count == 0:
+        return values.copy()
+
+    #Pad with -inf so that every window is complete, to a multiple of the window size
+    block_count = -(-(count+before+after)//window)
+    padded = np.full(block_count*window,-np.inf)
+    padded[before:before+count] = values
+
+    #Max from the start of each block, and to the end of each block
+    blocks = padded.reshape(block_count,window)
+    prefix_max = np.maximum.accumulate(blocks,axis=1).ravel()
+    suffix_max = np.maximum.accumulate(blocks[:,::-1],axis=1)[:,::-1].ravel()
+
+    #Any window is the end of one block plus the start of the next
+    index = np.arange(count)
+    return np.maximum(suffix_max[index],prefix_max[index+window-1])
+
+class WindowedMax:
+    """
+    Streaming version of sliding_window_max for several keys (e.g. the tracks of a video): the values of each key
+    are pushed frame by frame and the max is read over the frames from a given first frame to the last frame pushed.
+    A monotonic deque per key (frame numbers increasing, values decreasing) makes it amortised O(1) per value
+    """
+    def __init__(self):
+        self.deques = {} #Key -> deque of (frame number, value)
+
+    def push(self,frame_num,values):
+        """
+        Add the values of a frame, frames have to be pushed in increasing order
+        Args:
+            frame_num (int): Frame number
+            values (dict): Dictionary with key and value in this frame
+        """
+        for key, value in values.items():
+            key_deque = self.deques.setdefault(key,deque())
+            #A value that is not larger than a newer one can never be the max again
+            while key_deque and key_deque[-1][1] <= value:
+                key_deque.pop()
+            key_deque.append((frame_num,value))
+
+    def max(self,key,first_frame):
+        """
+        Args:
+            key: Key of the values
+            first_frame (int): First frame of the window, it can only increase from one call to the next
+        Returns:
+            float: Max value of the key from first_frame to the last frame pushed (None if it has no value there)
+        """
+        key_deque = self.deques.get(key)
+        if key_deque is None:
+            return None
+        while key_deque and key_deque[0][0] < first_frame:
+            key_deque.popleft()
+
+        return key_deque[0][1] if key_deque else None
+
+    def prune(self,first_frame):
+        """
+        Forget the keys without any value from first_frame on (tracks that are gone)
+        """
+        self.deques = {key: key_deque for key, key_deque in self.deques.items() if key_deque[-1][0] >= first_frame}
@@ -1,6 +1,13 @@
 import numpy as np
 
 def centre_of_bbox(bbox):
+    """
+    Get the centre of a bounding box, rounded towards zero
+    Args:
+        bbox (tuple): Tuple containing the bounding box coordinates (x1, y1, x2, y2).
+    Returns:
+        tuple: Tuple containing the centre (x, y).
+    """
     x1,y1,x2,y2 = bbox
     cX = int((x1+x2)/2)
     cY = int((y1+y2)/2)
@@ -66,9 +73,6 @@ def measure_xy_dist(p1,p2):
     """
     return abs(p2[0]-p1[0]),abs(p2[1]-p1[1]) 
 
-def centre_of_bbox(bbox):
-    return (int((bbox[0]+bbox[2])/2),int((bbox[1]+bbox[3])/2))
-
 def distance_point_to_segment(p0, p1, p2):
     """
     Calculates the distance from point p0 to the line segment (p1-p2).
@@ -100,4 +104,114 @@ def distance_point_to_segment(p0, p1, p2):
 
     return np.linalg.norm(p0 - closest)
 
+def centres_of_bboxes(bboxes):
+    """
+    Batch version of centre_of_bbox
+    Args:
+        bboxes (array): (N,4) array of bounding boxes [x1,y1,x2,y2]
+    Returns:
+        array: (N,2) array of centres (x, y), rounded towards zero like centre_of_bbox
+    """
+    bboxes = np.asarray(bboxes,np.float64).reshape(-1,4)
+
+    return np.trunc(np.column_stack(((bboxes[:,0]+bboxes[:,2])/2,(bboxes[:,1]+bboxes[:,3])/2)))
+
+def get_foot_positions(bboxes):
+    """
+    Batch version of get_foot_position
+    Args:
+        bboxes (array): (N,4) array of bounding boxes [x1,y1,x2,y2]
+    Returns:
+        array: (N,2) array of foot positions (x, y), x rounded towards zero like get_foot_position
+    """
+    bboxes = np.asarray(bboxes,np.float64).reshape(-1,4)
+
+    return np.column_stack((np.trunc((bboxes[:,0]+bboxes[:,2])/2),bboxes[:,3]))
+
+def measure_dists(points,other_points):
+    """
+    Euclidean distance between every pair of points
+    Args:
+        points (array): (N,2) array of points
+        other_points (array): (M,2) array of points
+    Returns:
+        array: (N,M) array of distances
+    """
+    points = np.asarray(points,np.float64).reshape(-1,1,2)
+    other_points = np.asarray(other_points,np.float64).reshape(1,-1,2)
+    diff = other_points - points
+
+    return (diff[...,1]**2 + diff[...,0]**2)**0.5
 
+def measure_xy_dists(points,other_points):
+    """
+    Batch version of measure_xy_dist, point i is measured to other point i
+    Args:
+        points (array): (N,2) array of points
+        other_points (array): (N,2) array of points
+    Returns:
+        array: (N,2) array of x and y distances
+    """
+    return np.abs(np.asarray(other_points,np.float64) - np.asarray(points,np.float64))
+
+def get_closest_keypoint_indices(points,keypoints,keypoint_index):
+    """
+    Batch version of get_closest_keypoint_index (closest in y, the first one wins a tie)
+    Args:
+        points (array): (N,2) array of points
+        keypoints (list): List of keypoints coordinates [x1,y1,x2,y2,...]
+        keypoint_index (list): List of indices of keypoints to choose from
+    Returns:
+        array: (N,) array of the index of the closest keypoint of each point
+    """
+    keypoint_index = np.asarray(keypoint_index)
+    keypoints_y = np.asarray(keypoints,np.float64)[keypoint_index*2+1]
+    points = np.asarray(points,np.float64).reshape(-1,2)
+    distances = np.abs(points[:,1:2] - keypoints_y[np.newaxis,:])
+
+    return keypoint_index[np.argmin(distances,axis=1)]
+
+def distances_points_to_segments(points,segments):
+    """
+    Batch version of distance_point_to_segment
+    Args:
+        points (array): (N,2) array of points
+        segments (array): (M,2,2) array of segments, each as its two end points
+    Returns:
+        array: (N,M) array of the distance of each point to each segment
+    """
+    points = np.asarray(points,np.float64).reshape(-1,1,2)
+    segments = np.asarray(segments,np.float64).reshape(1,-1,2,2)
+    p1 = segments[:,:,0]
+    p2 = segments[:,:,1]
+
+    line_vec = p2 - p1
+    point_vec = points - p1
+    line_len_squared = np.sum(line_vec*line_vec,axis=-1)
+
+    #Scalar projection of each point on each line, 0 for segments that are a single point
+    t = np.sum(point_vec*line_vec,axis=-1) / np.where(line_len_squared == 0,1,line_len_squared)
+    t = t[...,np.newaxis]
+    closest = np.where(t < 0,p1,np.where(t > 1,p2,p1 + t*line_vec))
+
+    return np.linalg.norm(points - closest,axis=-1)
+
+def get_ious(bboxes,other_bboxes):
+    """
+    Intersection over union of every pair of bounding boxes
+    Args:
+        bboxes (array): (N,4) array of bounding boxes [x1,y1,x2,y2]
+        other_bboxes (array): (M,4) array of bounding boxes [x1,y1,x2,y2]
+    Returns:
+        array: (N,M) array of IoUs
+    """
+    bboxes = np.asarray(bboxes,np.float64).reshape(-1,1,4)
+    other_bboxes = np.asarray(other_bboxes,np.float64).reshape(1,-1,4)
+    width = (np.minimum(bboxes[...,2],other_bboxes[...,2]) - np.maximum(bboxes[...,0],other_bboxes[...,0])).clip(0)
+    height = (np.minimum(bboxes[...,3],other_bboxes[...,3]) - np.maximum(bboxes[...,1],other_bboxes[...,1])).clip(0)
+    intersection = width*height
+    areas = (bboxes[...,2]-bboxes[...,0])*(bboxes[...,3]-bboxes[...,1])
+    other_areas = (other_bboxes[...,2]-other_bboxes[...,0])*(other_bboxes[...,3]-other_bboxes[...,1])
+    union = areas + other_areas - intersection
+
+    return np.where(union > 0,intersection/np.where(union > 0,union,1),0.0)
@@ -23,4 +23,31 @@ def get_court_layout(keypoints):
         "net_right": ((kps[1][0] + kps[3][0]) / 2, (kps[1][1] + kps[3][1]) / 2) #midpoint formula
     }
 
-    return layout
\ No newline at end of file
+    return layout
+
+def get_court_layouts(court_segments):
+    """
+    Court layout of each court segment (the court moves when the camera does)
+    Args:
+        court_segments (list): List of (first frame number, keypoints), sorted by frame number
+    Returns:
+        court_layouts (list): List of (first frame number, court layout)
+    """
+    return [(start_frame,get_court_layout(keypoints)) for start_frame,keypoints in court_segments]
+
+def get_frame_court_layout(court_layouts,frame_num):
+    """
+    Get the court layout of a frame
+    Args:
+        court_layouts (list): List of (first frame number, court layout), sorted by frame number
+        frame_num (int): Frame number
+    Returns:
+        court_layout (dict): Dictionary of court layout info of the segment the frame is in
+    """
+    court_layout = court_layouts[0][1]
+    for start_frame,segment_layout in court_layouts:
+        if start_frame > frame_num:
+            break
+        court_layout = segment_layout
+
+    return court_layout
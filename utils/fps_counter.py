@@ -0,0 +1,51 @@
+import time
+from collections import deque
+
+class FpsCounter:
+    """
+    Measures the frame rate over the last few frames, so that the start-up time does not count
+    """
+    def __init__(self,window=30):
+        """
+        Args:
+            window (int): Number of frames the frame rate is averaged over
+        """
+        self.timestamps = deque(maxlen=window)
+        self.first_time = None
+        self.last_time = None
+        self.frame_count = 0
+
+    def tick(self):
+        """
+        Record that one more frame is done
+        Returns:
+            fps (float): Frame rate over the last frames (0 until there are 2 frames)
+        """
+        now = time.perf_counter()
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+        self.frame_count += 1
+        self.timestamps.append(now)
+
+        return self.current_fps()
+
+    def current_fps(self):
+        """
+        Returns:
+            fps (float): Frame rate over the last frames
+        """
+        if len(self.timestamps) < 2 or self.timestamps[-1] == self.timestamps[0]:
+            return 0.0
+
+        return (len(self.timestamps)-1)/(self.timestamps[-1]-self.timestamps[0])
+
+    def steady_state_fps(self):
+        """
+        Returns:
+            fps (float): Frame rate from the first frame done to the last one (pipeline fill-up time excluded)
+        """
+        if self.frame_count < 2 or self.last_time == self.first_time:
+            return 0.0
+
+        return (self.frame_count-1)/(self.last_time-self.first_time)
@@ -0,0 +1,88 @@
+import sys
+import threading
+import numpy as np
+
+class FramePool:
+    """
+    Frame buffers that the video is decoded into (cap.read(image=buffer)) and that are annotated and encoded in place,
+    so that streaming a video does not allocate a new frame for every frame.
+    A buffer belongs to whoever acquired it until it is given back with release(). When all the buffers are in use
+    a new one is allocated and kept in the pool, so a pool that is too small allocates more but never blocks
+    """
+    def __init__(self,size=1):
+        """
+        Args:
+            size (int): Number of buffers allocated up front, when the size of the frames is known (first acquire)
+        """
+        self.size = size
+        self.shape = None
+        self.free = []
+        self.in_use = {} #id() -> buffer, for the buffers acquired and not released yet
+        self.lock = threading.Lock() #Buffers can be acquired and released on different threads
+        self.allocations = 0
+        self.acquisitions = 0
+        self.peak_in_use = 0
+
+    def acquire(self,shape):
+        """
+        Take a free buffer
+        Args:
+            shape (tuple): (height,width,3) of the frame
+        Returns:
+            buffer (array): Uninitialized uint8 frame owned by the caller until it is released
+        """
+        with self.lock:
+            if shape != self.shape:
+                #Buffers of another size cannot be reused, the pool is allocated again at the new size
+                self.shape = shape
+                self.free = [np.empty(shape,np.uint8) for _ in range(max(self.size-len(self.in_use),0))]
+                self.allocations += len(self.free)
+            if self.free:
+                buffer = self.free.pop()
+            else:
+                buffer = np.empty(shape,np.uint8)
+                self.allocations += 1
+            self.in_use[id(buffer)] = buffer
+            self.acquisitions += 1
+            self.peak_in_use = max(self.peak_in_use,len(self.in_use))
+
+            return buffer
+
+    def owns(self,frame):
+        """
+        Returns:
+            bool: True if the frame is a buffer of the pool that is not released yet
+        """
+        return id(frame) in self.in_use
+
+    def release(self,frame):
+        """
+        Give a buffer back to the pool, it must not be used after this
+        Args:
+            frame (array): Buffer returned by acquire()
+        """
+        with self.lock:
+            if self.in_use.pop(id(frame),None) is None:
+                raise ValueError("Frame is not a buffer of the pool or was already released")
+            if frame.shape == self.shape:
+                self.free.append(frame)
+
+    def stats(self):
+        """
+        Returns:
+            stats (dict): Number of buffers allocated, frames read into a buffer, and max number of buffers in use at once
+        """
+        return {"allocations": self.allocations,"frames": self.acquisitions,"peak_in_use": self.peak_in_use}
+
+def get_peak_rss():
+    """
+    Returns:
+        peak_rss (int): Peak resident memory of this process (bytes), None where it is not available (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss*1024 #Bytes on macOS, kilobytes on Linux
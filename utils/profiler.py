@@ -0,0 +1,240 @@
+import os
+import csv
+import json
+import time
+import functools
+import numpy as np
+
+PERCENTILES = (50,90,95,99)
+
+class NullStage:
+    """
+    Stage timer used while profiling is off, entering and leaving it does nothing
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        return False
+
+NULL_STAGE = NullStage()
+
+class StageTimer:
+    """
+    Times one call of a stage and gives the duration to the profiler
+    """
+    __slots__ = ("profiler","name","start_time")
+
+    def __init__(self,profiler,name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc_info):
+        self.profiler.record(self.name,time.perf_counter()-self.start_time)
+        return False
+
+class Profiler:
+    """
+    Records how long each stage of the pipeline takes (decode, inference, interpolation, roles, minimap, drawing,
+    encode) and how long each frame takes, to find what to optimize first.
+    Stage times include everything called inside them, a stage may be timed on several threads at once
+    """
+    def __init__(self,cprofile_path=None):
+        """
+        Args:
+            cprofile_path (str): Also run cProfile on the calling thread and dump its stats (pstats format) to this file
+        """
+        self.cprofile_path = cprofile_path
+        self.cprofiler = None
+        self.durations = {} #Stage name -> list of durations (s), one per call
+        self.frame_times = [] #time.perf_counter() when each frame was done
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        if self.cprofile_path is not None:
+            import cProfile
+            self.cprofiler = cProfile.Profile()
+            self.cprofiler.enable()
+
+    def stop(self):
+        if self.cprofiler is not None:
+            self.cprofiler.disable()
+            self.cprofiler.dump_stats(self.cprofile_path)
+            self.cprofiler = None
+        self.end_time = time.perf_counter()
+
+    def stage(self,name):
+        return StageTimer(self,name)
+
+    def record(self,name,duration):
+        """
+        Add one call of a stage
+        Args:
+            name (str): Name of the stage
+            duration (float): Duration of the call (s)
+        """
+        self.durations.setdefault(name,[]).append(duration)
+
+    def frame_done(self):
+        """
+        Record that one more frame is annotated
+        """
+        self.frame_times.append(time.perf_counter())
+
+    def summary(self):
+        """
+        Returns:
+            summary (dict): Wall time, frame rate, per-frame latency stats and stats of each stage
+                            (the stages are sorted by total time, the slowest first)
+        """
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        wall_time = end_time-self.start_time
+
+        #Latency of a frame = time since the previous frame was done (since the start for the first frame)
+        frame_latencies = np.diff(np.array([self.start_time]+self.frame_times))
+
+        frame_stats = get_stats(frame_latencies)
+        frame_stats["share"] = frame_stats["total_s"]/wall_time if wall_time > 0 else 0.0
+
+        #Share of the wall time spent in each stage (stages on other threads overlap, so the shares can add up to more than 1)
+        stages = {}
+        for name,durations in sorted(self.durations.items(),key=lambda x: -sum(x[1])):
+            stages[name] = get_stats(np.array(durations))
+            stages[name]["share"] = stages[name]["total_s"]/wall_time if wall_time > 0 else 0.0
+
+        return {
+            "wall_s": wall_time,
+            "frames": len(self.frame_times),
+            "fps": len(self.frame_times)/wall_time if wall_time > 0 else 0.0,
+            "frame_latency": frame_stats,
+            "stages": stages,
+            "frame_latencies_ms": (frame_latencies*1000).round(3).tolist()
+        }
+
+    def write_report(self,path):
+        """
+        Write the summary as JSON (.json) or as CSV with one row per stage and a "frame" row (any other extension)
+        Args:
+            path (str): Path of the report
+        """
+        summary = self.summary()
+        os.makedirs(os.path.dirname(os.path.abspath(path)),exist_ok=True)
+
+        if path.endswith(".json"):
+            with open(path,"w") as f:
+                json.dump(summary,f,indent=2)
+            return
+
+        rows = [("frame",summary["frame_latency"])] + list(summary["stages"].items())
+        fields = ["calls","total_s","share","mean_ms"] + [f"p{p}_ms" for p in PERCENTILES] + ["max_ms"]
+        with open(path,"w",newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["stage"]+fields)
+            for name,stats in rows:
+                writer.writerow([name]+[round(stats[field],6) for field in fields])
+
+    def print_summary(self):
+        """
+        Print the stages from the slowest to the fastest
+        """
+        summary = self.summary()
+        print(f"{summary['frames']} frames in {summary['wall_s']:.2f}s ({summary['fps']:.1f} fps)")
+        print(f"{'stage':<20}{'calls':>8}{'total s':>10}{'share':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name,stats in [("frame",summary["frame_latency"])] + list(summary["stages"].items()):
+            print(f"{name:<20}{stats['calls']:>8}{stats['total_s']:>10.2f}{stats['share']:>8.1%}"
+                  f"{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+def get_stats(durations):
+    """
+    Args:
+        durations (array): Durations (s)
+    Returns:
+        stats (dict): Number of calls, total (s), mean, percentiles and max (ms)
+    """
+    if len(durations) == 0:
+        return {"calls": 0,"total_s": 0.0,"mean_ms": 0.0,**{f"p{p}_ms": 0.0 for p in PERCENTILES},"max_ms": 0.0}
+
+    percentiles = np.percentile(durations,PERCENTILES)*1000
+    return {
+        "calls": len(durations),
+        "total_s": float(durations.sum()),
+        "mean_ms": float(durations.mean()*1000),
+        **{f"p{p}_ms": float(value) for p,value in zip(PERCENTILES,percentiles)},
+        "max_ms": float(durations.max()*1000)
+    }
+
+#Profiler the stages report to, None while profiling is off
+_active_profiler = None
+
+def start_profiling(cprofile_path=None):
+    """
+    Start recording the stage times of everything that runs until stop_profiling()
+    Args:
+        cprofile_path (str): Also dump cProfile stats of the calling thread to this file
+    Returns:
+        profiler (Profiler): The profiler the stages report to
+    """
+    global _active_profiler
+    _active_profiler = Profiler(cprofile_path)
+    _active_profiler.start()
+
+    return _active_profiler
+
+def stop_profiling():
+    """
+    Returns:
+        profiler (Profiler): The stopped profiler, None if profiling was off
+    """
+    global _active_profiler
+    profiler = _active_profiler
+    _active_profiler = None
+    if profiler is not None:
+        profiler.stop()
+
+    return profiler
+
+def profile_stage(name):
+    """
+    Time a block of code: with profile_stage("decode"): ...
+    Args:
+        name (str): Name of the stage in the report
+    Returns:
+        timer: Context manager, a shared one that does nothing while profiling is off
+    """
+    profiler = _active_profiler
+    if profiler is None:
+        return NULL_STAGE
+    return profiler.stage(name)
+
+def profile_frame():
+    """
+    Record that one more frame is annotated (does nothing while profiling is off)
+    """
+    profiler = _active_profiler
+    if profiler is not None:
+        profiler.frame_done()
+
+def timed(name):
+    """
+    Decorator that times every call of a function as a stage
+    Args:
+        name (str): Name of the stage in the report
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args,**kwargs):
+            profiler = _active_profiler
+            if profiler is None:
+                return function(*args,**kwargs)
+            with profiler.stage(name):
+                return function(*args,**kwargs)
+        return wrapper
+    return decorator
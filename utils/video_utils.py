@@ -1,4 +1,5 @@
 import cv2 as cv
+from .profiler import profile_stage
 
 #Function to read the video
 def read_video(video_path):
@@ -9,42 +10,132 @@ def read_video(video_path):
     Returns:
         frames (list): List of frames as an array
     """
-    frames = []
+    return list(iter_video_frames(video_path))
+
+#Function to read the video one frame at a time
+def iter_video_frames(video_path,start_frame=0,end_frame=None,frame_pool=None):
+    """
+    Reads MP4 video file and yields the frames one by one so that the whole video is never held in memory
+    Args:
+        video_path (str): Path to video
+        start_frame (int): Frame number of the first frame to read
+        end_frame (int): Frame number after the last frame to read (end of the video if None)
+        frame_pool (FramePool): Pool the frames are decoded into (a new array per frame if None). The caller owns
+                                every frame it gets and gives it back with frame_pool.release() when done with it
+    Yields:
+        frame (array): Next frame of the video
+    """
     cap = cv.VideoCapture(video_path)
 
     if(cap.isOpened()==False):
         print("Cannot open video file")
-    
-    while True:
-        #Capture frame by frame
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
-
-    #Release the video capture object
+
+    if start_frame > 0:
+        cap.set(cv.CAP_PROP_POS_FRAMES,start_frame)
+    shape = get_frame_shape(cap)
+
+    try:
+        frame_num = start_frame
+        while end_frame is None or frame_num < end_frame:
+            frame_num += 1
+            #Capture frame by frame
+            with profile_stage("decode"):
+                buffer = frame_pool.acquire(shape) if frame_pool is not None and shape is not None else None
+                ret, frame = cap.read(image=buffer)
+            if frame_pool is not None and frame is not buffer:
+                #OpenCV allocates the frames that do not have the size of the buffer, the next buffers get their size
+                if buffer is not None:
+                    frame_pool.release(buffer)
+                if ret:
+                    shape = frame.shape
+            if not ret:
+                break
+            yield frame
+    finally:
+        #Release the video capture object
+        cap.release()
+
+#Function to get the size of the frames
+def get_frame_shape(cap):
+    """
+    Reads the size of the frames from the header of the video
+    Args:
+        cap (VideoCapture): Opened video
+    Returns:
+        shape (tuple): (height,width,3) of the frames, None if the header does not give it
+    """
+    height,width = int(cap.get(cv.CAP_PROP_FRAME_HEIGHT)),int(cap.get(cv.CAP_PROP_FRAME_WIDTH))
+    if height <= 0 or width <= 0:
+        return None
+
+    return (height,width,3)
+
+#Function to get the number of frames of the video
+def get_video_frame_count(video_path):
+    """
+    Reads the number of frames from the header of the video (can be approximate for some containers)
+    Args:
+        video_path (str): Path to video
+    Returns:
+        frame_count (int): Number of frames
+    """
+    cap = cv.VideoCapture(video_path)
+    frame_count = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
     cap.release()
-        
-    return frames
+
+    return frame_count
+
+#Function to group frames into batches
+def iter_batches(frames,batch_size,boundaries=()):
+    """
+    Groups frames into lists of batch_size frames (the last batch may be smaller)
+    Args:
+        frames (iterable): Frames of the video
+        batch_size (int): Number of frames per batch
+        boundaries (iterable): Indices of frames that start a new batch even if the previous one is not full
+                               (e.g. first frames of the court segments, so that a batch never spans two courts)
+    Yields:
+        batch (list): List of frames as an array
+    """
+    boundaries = set(boundaries)
+    batch = []
+    for frame_num, frame in enumerate(frames):
+        if frame_num in boundaries and len(batch) > 0:
+            yield batch
+            batch = []
+        batch.append(frame)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+
+    if len(batch) > 0:
+        yield batch
 
 #Function to save video
-def save_video(output_video_frames,output_video_path):
+def save_video(output_video_frames,output_video_path,frame_pool=None):
     """
     Saves frames as a video fie
     Args:
         output_video_path (str): Path to save video
-        output_video_frames (list): List of frames as an array
+        output_video_frames (iterable): List (or generator) of frames as an array
+        frame_pool (FramePool): Pool the frames were decoded into, each frame of the pool is released once written
     Returns:
         None
     """
-    #Get dimensions of the frames
-    frame_height,frame_width,_ = output_video_frames[0].shape
-
-    #Define coedc and create video writer object
-    fourcc = cv.VideoWriter_fourcc(*'MJPG')
-    out = cv.VideoWriter(output_video_path,fourcc,30,(frame_width,frame_height))
+    out = None
     for frame in output_video_frames:
-        out.write(frame)
+        if out is None:
+            #Get dimensions of the frames
+            frame_height,frame_width,_ = frame.shape
+
+            #Define coedc and create video writer object
+            fourcc = cv.VideoWriter_fourcc(*'MJPG')
+            out = cv.VideoWriter(output_video_path,fourcc,30,(frame_width,frame_height))
+        with profile_stage("encode"):
+            out.write(frame)
+        if frame_pool is not None and frame_pool.owns(frame):
+            frame_pool.release(frame)
 
-    out.release()
+    if out is not None:
+        out.release()
 